@@ -0,0 +1,170 @@
+"""
+Build Index Module
+
+This module keeps a full-text index of every build log record in a SQLite
+database, using the FTS5 extension. Each record holds the build ID, stage,
+status, time and details of a log entry. The repository, branch and commit
+of each build are stored alongside. Searches such as "which builds failed
+with this error since Tuesday" are answered from the index instead of by
+reading every build log. When the log store deletes a build's archived
+logs, the build is removed from the index as well. A plain table maps each
+record to its build, so a build's records are deleted by rowid rather than
+by scanning the full-text table.
+
+Classes:
+    BuildIndex: Full-text index of build log records
+
+Functions:
+    None (all functionality is encapsulated in the BuildIndex class)
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sqlite3
+import threading
+import time
+from src import config
+
+
+class BuildIndex:
+    def __init__(self, db_path=config.BUILD_INDEX_DB):
+        """
+        Args:
+            db_path (str): Path to the SQLite database holding the index.
+        """
+        self.db_path = db_path
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS builds (
+                    build_id TEXT PRIMARY KEY,
+                    repo_url TEXT NOT NULL,
+                    branch_name TEXT NOT NULL,
+                    commit_id TEXT,
+                    started_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS records USING fts5 (
+                    build_id UNINDEXED, stage, status, details, logged_at UNINDEXED
+                )
+            """)
+            has_record_builds = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'record_builds'"
+            ).fetchone() is not None
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS record_builds (
+                    record_id INTEGER PRIMARY KEY,
+                    build_id TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_record_builds_build ON record_builds (build_id)")
+            if not has_record_builds:
+                # Indexes created before records were mapped to their builds
+                self._conn.execute("INSERT INTO record_builds (record_id, build_id) SELECT rowid, build_id FROM records")
+
+    def add_build(self, build_id, repo_url, branch_name, commit_id):
+        """
+        Stores the repository, branch and commit of a build.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO builds (build_id, repo_url, branch_name, commit_id, started_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (build_id, repo_url, branch_name, commit_id, time.time())
+            )
+
+    def add_records(self, records):
+        """
+        Indexes build log records.
+
+        Args:
+            records (list): Tuples of the build ID, stage, status, details and time (a Unix timestamp) of each record.
+        """
+        if not records:
+            return
+        with self._lock, self._conn:
+            for record in records:
+                cursor = self._conn.execute(
+                    "INSERT INTO records (build_id, stage, status, details, logged_at) VALUES (?, ?, ?, ?, ?)",
+                    record
+                )
+                self._conn.execute("INSERT INTO record_builds (record_id, build_id) VALUES (?, ?)",
+                                   (cursor.lastrowid, record[0]))
+
+    def remove_builds(self, build_ids):
+        """
+        Removes builds and all their records from the index.
+
+        Args:
+            build_ids (list): IDs of the builds to remove.
+        """
+        if not build_ids:
+            return
+        with self._lock, self._conn:
+            for build_id in build_ids:
+                self._conn.execute(
+                    "DELETE FROM records WHERE rowid IN (SELECT record_id FROM record_builds WHERE build_id = ?)",
+                    (build_id,)
+                )
+                self._conn.execute("DELETE FROM record_builds WHERE build_id = ?", (build_id,))
+                self._conn.execute("DELETE FROM builds WHERE build_id = ?", (build_id,))
+
+    def search(self, text, status=None, stage=None, branch_name=None, since=None, limit=50):
+        """
+        Finds the log records containing every word of text, newest first.
+
+        Args:
+            text (str): Words to look for in the details, stage and status of the records.
+            status (str): Only records with this status, such as "failure".
+            stage (str): Only records of this stage, such as "tests".
+            branch_name (str): Only records of builds of this branch.
+            since (float): Only records logged at or after this Unix timestamp.
+            limit (int): Maximum number of records returned.
+
+        Returns:
+            list: Dicts with the "build_id", "repo_url", "branch_name", "commit_id", "stage", "status",
+                  "logged_at" and a "snippet" of the details around the match for each record.
+        """
+        query = (
+            "SELECT records.build_id, b.repo_url, b.branch_name, b.commit_id, records.stage, records.status, "
+            "records.logged_at, snippet(records, 3, '[', ']', '...', 16) "
+            "FROM records LEFT JOIN builds b ON b.build_id = records.build_id WHERE records MATCH ?"
+        )
+        params = [self._match_expression(text)]
+        if status:
+            query += " AND records.status = ?"
+            params.append(status)
+        if stage:
+            query += " AND records.stage = ?"
+            params.append(stage)
+        if branch_name:
+            query += " AND b.branch_name = ?"
+            params.append(branch_name)
+        if since is not None:
+            query += " AND records.logged_at >= ?"
+            params.append(since)
+        query += " ORDER BY records.logged_at DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        keys = ("build_id", "repo_url", "branch_name", "commit_id", "stage", "status", "logged_at", "snippet")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def _match_expression(self, text):
+        """
+        Turns free text, such as an error message, into an FTS5 query matching records that
+        contain all of its words, so quotes and operators in the text are not parsed as syntax.
+        """
+        terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+        if not terms:
+            raise ValueError("Empty search text")
+        return " ".join(terms)
@@ -0,0 +1,265 @@
+"""
+Build Queue Module
+
+This module provides a persistent build queue that sits in front of the CI
+pipeline. Builds are stored in a SQLite database so queued builds survive a
+server restart, and a fixed number of worker threads take builds from the
+queue one at a time. In superseding mode a new push to a branch drops the
+queued builds of that branch and cancels the ones already running.
+A build can be limited to some of the pipeline stages. A build that
+supersedes others also runs every stage they would have run, so a narrow
+push never hides an untested change of the push before it.
+
+Classes:
+    BuildQueue: Persistent build queue with a bounded pool of worker threads
+
+Functions:
+    None (all functionality is encapsulated in the BuildQueue class)
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sqlite3
+import threading
+import time
+import logging
+from src import config
+from src.path_rules import STAGES
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,  # Use logging.DEBUG for more verbosity
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+
+class BuildQueue:
+    def __init__(self, handler, db_path=config.QUEUE_DB_PATH, workers=config.BUILD_WORKERS,
+                 supersede=config.SUPERSEDE_BUILDS):
+        """
+        Args:
+            handler (callable): Called with a job dict for every build taken from the queue.
+                The job's "cancel_event" is set if the build is superseded while running.
+            db_path (str): Path to the SQLite database holding the queue.
+            workers (int): Number of builds that may run at the same time.
+            supersede (bool): Whether a new push cancels older builds of the same branch.
+        """
+        self.handler = handler
+        self.db_path = db_path
+        self.workers = max(1, int(workers))
+        self.supersede = supersede
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._threads = []
+        self._running = {}
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS builds (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    repo_url TEXT NOT NULL,
+                    branch_name TEXT NOT NULL,
+                    commit_id TEXT NOT NULL,
+                    author_email TEXT,
+                    author_username TEXT,
+                    stages TEXT,
+                    status TEXT NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_builds_status ON builds (status, id)")
+            # Queues created before builds could be limited to some stages
+            columns = [row["name"] for row in self._conn.execute("PRAGMA table_info(builds)")]
+            if "stages" not in columns:
+                self._conn.execute("ALTER TABLE builds ADD COLUMN stages TEXT")
+
+    def start(self):
+        """
+        Starts the worker threads. Builds left in the queue from a previous run are picked up first,
+        and builds that were running when the server stopped are run again, so only the process
+        serving the builds may start the queue.
+        """
+        if self._threads:
+            return
+
+        with self._lock, self._conn:
+            requeued = self._conn.execute(
+                "UPDATE builds SET status = 'queued', started_at = NULL WHERE status = 'running'"
+            ).rowcount
+        if requeued:
+            logging.info(f"Re-queued {requeued} build(s) interrupted by a restart.")
+
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"ci-worker-{i}")
+            thread.daemon = True  # Ensures the workers do not block Flask shutdown
+            thread.start()
+            self._threads.append(thread)
+
+        logging.info(f"Build queue started with {self.workers} worker(s), {self.stats()['queued']} build(s) waiting.")
+
+    def stop(self, timeout=None):
+        """
+        Stops the worker threads after their current build. Queued builds stay in the database.
+        """
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue(self, repo_url, branch_name, commit_id, author_email, author_username, stages=None):
+        """
+        Adds a build to the queue. In superseding mode, older builds of the same
+        branch are dropped from the queue and running ones are cancelled, and the new
+        build takes over the stages they would have run.
+        The job's "stages" is the list of stages to run, or None for all of them.
+
+        Returns:
+            int: The id of the queued build.
+        """
+        with self._wakeup:
+            with self._conn:
+                if self.supersede:
+                    stages = self._supersede_branch(repo_url, branch_name, stages)
+                cursor = self._conn.execute(
+                    "INSERT INTO builds (repo_url, branch_name, commit_id, author_email, author_username, stages, status, enqueued_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 'queued', ?)",
+                    (repo_url, branch_name, commit_id, author_email, author_username,
+                     ",".join(stages) if stages is not None else None, time.time())
+                )
+            self._wakeup.notify()
+
+        logging.info(f"Queued build {cursor.lastrowid} for commit {commit_id} on branch {branch_name}.")
+        return cursor.lastrowid
+
+    def stats(self):
+        """
+        Reports the current queue depth and wait times.
+
+        Returns:
+            dict: Number of queued and running builds, the age of the oldest queued build
+                  and the average wait of the last 100 started builds (in seconds).
+        """
+        now = time.time()
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM builds WHERE status IN ('queued', 'running') GROUP BY status"
+            ).fetchall())
+            oldest = self._conn.execute(
+                "SELECT MIN(enqueued_at) FROM builds WHERE status = 'queued'"
+            ).fetchone()[0]
+            avg_wait = self._conn.execute(
+                "SELECT AVG(started_at - enqueued_at) FROM "
+                "(SELECT started_at, enqueued_at FROM builds WHERE started_at IS NOT NULL ORDER BY started_at DESC LIMIT 100)"
+            ).fetchone()[0]
+
+        return {
+            "workers": self.workers,
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "oldest_wait_seconds": round(now - oldest, 3) if oldest is not None else 0.0,
+            "avg_wait_seconds": round(avg_wait, 3) if avg_wait is not None else 0.0
+        }
+
+    def _supersede_branch(self, repo_url, branch_name, stages):
+        """
+        Drops queued builds and cancels running builds of a branch. Must be called with the lock held.
+
+        Returns:
+            list: The stages the new build must run to cover the builds it replaces, or None for all of them.
+        """
+        superseded = [
+            row["stages"].split(",") if row["stages"] is not None else None
+            for row in self._conn.execute(
+                "SELECT stages FROM builds WHERE status = 'queued' AND repo_url = ? AND branch_name = ?",
+                (repo_url, branch_name)
+            )
+        ]
+        dropped = self._conn.execute(
+            "UPDATE builds SET status = 'superseded', finished_at = ? "
+            "WHERE status = 'queued' AND repo_url = ? AND branch_name = ?",
+            (time.time(), repo_url, branch_name)
+        ).rowcount
+        if dropped:
+            logging.info(f"Dropped {dropped} queued build(s) of branch {branch_name} superseded by a newer push.")
+
+        for job in self._running.values():
+            if job["repo_url"] == repo_url and job["branch_name"] == branch_name and not job["cancel_event"].is_set():
+                job["cancel_event"].set()
+                superseded.append(job["stages"])
+                logging.info(f"Cancelling running build {job['id']} of branch {branch_name} superseded by a newer push.")
+
+        for old_stages in superseded:
+            if stages is None or old_stages is None:
+                return None
+            stages = [stage for stage in STAGES if stage in stages or stage in old_stages]
+        return stages
+
+    def _claim_next(self):
+        """
+        Marks the oldest queued build as running and returns it, or None if the queue is empty.
+        Must be called with the lock held. The claim only succeeds if the build is still queued,
+        so another process on the same database cannot claim it as well.
+        """
+        while True:
+            row = self._conn.execute(
+                "SELECT * FROM builds WHERE status = 'queued' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+
+            job = dict(row)
+            job["started_at"] = time.time()
+            with self._conn:
+                claimed = self._conn.execute(
+                    "UPDATE builds SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'",
+                    (job["started_at"], job["id"])
+                ).rowcount == 1
+            if claimed:
+                break
+
+        job["stages"] = job["stages"].split(",") if job["stages"] is not None else None
+        job["status"] = "running"
+        job["cancel_event"] = threading.Event()
+        self._running[job["id"]] = job
+        return job
+
+    def _finish(self, job_id, status):
+        with self._lock, self._conn:
+            self._running.pop(job_id, None)
+            self._conn.execute(
+                "UPDATE builds SET status = ?, finished_at = ? WHERE id = ?",
+                (status, time.time(), job_id)
+            )
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            with self._wakeup:
+                job = self._claim_next()
+                if job is None:
+                    self._wakeup.wait(timeout=1.0)
+                    continue
+
+            wait = job["started_at"] - job["enqueued_at"]
+            logging.info(f"Starting queued build {job['id']} for commit {job['commit_id']} after waiting {wait:.1f}s.")
+
+            try:
+                self.handler(job)
+                self._finish(job["id"], "superseded" if job["cancel_event"].is_set() else "done")
+            except Exception as e:
+                logging.error(f"Queued build {job['id']} raised an error: {e}")
+                self._finish(job["id"], "error")
@@ -11,16 +11,39 @@ Functions:
     None (all functionality is encapsulated in the CIPipeline class)
 """
 import ast
+import collections
+import fnmatch
+import glob
+import hashlib
+import heapq
+import json
+import re
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import git
+import multiprocessing
 import subprocess
+from concurrent.futures import ProcessPoolExecutor
 import shutil
+import signal
+import statistics
+import tempfile
+import threading
+import time
 import logging
+from src import config
+from src.env_cache import EnvironmentCache
+from src.impact_analysis import build_import_graph, impacted_files
 from src.logger import BuildLogger
+from src.run_history import TestHistory
+from src.warm_runner import WarmRunner
+from src.syntax_cache import SyntaxCache, blob_sha
 
 
+# Directory of the pytest plugin loaded into sharded test runs
+PYTEST_PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plugins")
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,  # Use logging.DEBUG for more verbosity
@@ -28,29 +51,91 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
-class CIPipeline:
-    def __init__(self):
-        self.logger = BuildLogger()
+def _parse_python_files(file_paths):
+    """
+    Parses a list of Python files and returns one result per file, in file order:
+    None if the file parsed, otherwise the (message, line number) of the syntax error.
+    Runs in the syntax check worker processes, so it must stay a module-level function.
+    """
+    results = []
+    for file_path in file_paths:
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                source = f.read()
+            ast.parse(source, file_path)
+            results.append(None)
+        except SyntaxError as e:
+            results.append((e.msg, e.lineno))
+    return results
+
+
+def _format_syntax_error(file_path, error_msg, lineno):
+    return f"Syntax error in {file_path}: {error_msg} ({file_path}, line {lineno})"
 
 
-    def clone_pull_repo(self, repo_url, repo_dir, branch_name="main"):
+def _syntax_pool_context():
+    """
+    Returns the multiprocessing context of the syntax check pool. It never forks, as another server
+    thread may hold a lock the child would inherit locked. The fork server preloads only this module,
+    whose imports do not include the server, instead of re-running the main script.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["src.ci_pipeline"])
+    return context
+
+
+class CIPipeline:
+    def __init__(self, mirror_dir=config.MIRROR_DIR, syntax_cache_db=config.SYNTAX_CACHE_DB,
+                 test_history_db=config.TEST_HISTORY_DB, env_cache_dir=config.ENV_CACHE_DIR, logger=None):
+        self.logger = logger or BuildLogger()
+        self.mirror_dir = mirror_dir
+        self.syntax_cache = SyntaxCache(syntax_cache_db) if syntax_cache_db else None
+        self.test_history = TestHistory(test_history_db) if test_history_db else None
+        self.env_cache = EnvironmentCache(env_cache_dir) if env_cache_dir and config.USE_ENV_CACHE else None
+        # Forking needs a POSIX system
+        self.warm_runner = WarmRunner() if config.WARM_RUNNER and hasattr(os, "fork") else None
+        self._mirror_locks = {}
+        self._mirror_locks_guard = threading.Lock()
+
+
+    def clone_pull_repo(self, repo_url, repo_dir, branch_name="main", commit_id=None, strategy=None, build_id=None):
         """
-        Clones or pulls a GitHub repository and checks out the correct branch.
+        Clones or pulls a GitHub repository and checks out the pushed commit, or the branch if no commit is given.
+        An existing checkout given a commit_id, such as a reused workspace, is reset to exactly
+        that commit. The strategy used and the bytes fetched are recorded in the build log.
         
         Args:
             repo_url (str): The Git repository URL.
             repo_dir (str): The directory where the repository should be cloned.
             branch_name (str): The branch to check out.
+            commit_id (str): The pushed commit, checked out detached whatever the strategy.
+            strategy (str): "full", "shallow" (depth 1), "blobless" (--filter=blob:none)
+                or "sparse" (blobless, limited to config.SPARSE_PATHS). Defaults to config.CLONE_STRATEGY.
+            build_id (str): The build whose log gets the results. Defaults to the branch name.
         
         Returns:
             bool: True if successful, False otherwise.
         """
 
-        logging.info(f"Cloning repository: {repo_url} into {repo_dir} (branch: {branch_name})...")
+        strategy = strategy or config.CLONE_STRATEGY
+        build_id = build_id or branch_name
+        logging.info(f"[Build {build_id}] Cloning repository: {repo_url} into {repo_dir} (branch: {branch_name})...")
 
         try:
-            if os.path.exists(repo_dir):
+            if os.path.exists(repo_dir) and commit_id:
                 repo = git.Repo(repo_dir)
+                bytes_before = self._object_bytes(repo)
+                repo.git.fetch("origin", kill_after_timeout=config.GIT_TIMEOUT)
+                self._checkout_commit(repo, commit_id)
+                fetched = self._object_bytes(repo) - bytes_before
+                logging.info(f"[Build {build_id}] Reset existing checkout at {repo_dir} to {commit_id}.")
+                self.logger.log_build_result(build_id, "git", "success",
+                                             f"Reset checkout at {repo_dir} to {commit_id} (strategy: reuse, {fetched} bytes fetched).")
+            elif os.path.exists(repo_dir):
+                repo = git.Repo(repo_dir)
+                bytes_before = self._object_bytes(repo)
                 repo.git.reset("--hard")
                 repo.git.clean("-fd")
                 repo.git.fetch()
@@ -62,47 +147,271 @@ class CIPipeline:
                     repo.git.checkout('-b', branch_name)
 
                 repo.remotes.origin.pull()
-                logging.info(f"Successfully pulled latest changes for branch {branch_name}.")
-                self.logger.log_build_result(branch_name, "git", "success", f"Checked out and pulled branch {branch_name}.")
+                fetched = self._object_bytes(repo) - bytes_before
+                logging.info(f"[Build {build_id}] Successfully pulled latest changes for branch {branch_name}.")
+                self.logger.log_build_result(build_id, "git", "success",
+                                             f"Checked out and pulled branch {branch_name} (strategy: pull, {fetched} bytes fetched).")
             else:
-                git.Repo.clone_from(repo_url, repo_dir, branch=branch_name)
-                self.logger.log_build_result(branch_name, "git", "success", f"Cloned repository at {repo_dir} with branch {branch_name}.")
-                logging.info(f"Repository cloned successfully at {repo_dir}.")
+                repo = self._clone_with_strategy(repo_url, repo_dir, branch_name, commit_id, strategy)
+                fetched = self._object_bytes(repo)
+                target = commit_id or branch_name
+                self.logger.log_build_result(build_id, "git", "success",
+                                             f"Cloned repository at {repo_dir} at {target} (strategy: {strategy}, {fetched} bytes fetched).")
+                logging.info(f"[Build {build_id}] Repository cloned successfully at {repo_dir} using {strategy} strategy ({fetched} bytes).")
 
             return True
 
         except Exception as e:
-            self.logger.log_build_result(branch_name, "git", "failure", f"Error cloning/pulling repo: {e}")
-            logging.error(f"Error cloning repository: {e}")
+            self.logger.log_build_result(build_id, "git", "failure", f"Error cloning/pulling repo ({strategy}): {e}")
+            logging.error(f"[Build {build_id}] Error cloning repository: {e}")
             return False
-    
-    def check_python_syntax(self, build_id, repo_path):
+
+    def _clone_with_strategy(self, repo_url, repo_dir, branch_name, commit_id, strategy):
+        """
+        Makes a fresh clone of a repository using one of the fetch strategies of clone_pull_repo,
+        and checks out commit_id if given, since the branch may already have moved past it.
+
+        Returns:
+            git.Repo: The new clone.
+        """
+        if strategy == "full":
+            repo = git.Repo.clone_from(repo_url, repo_dir, branch=branch_name)
+
+        elif strategy == "shallow":
+            repo = git.Repo.clone_from(repo_url, repo_dir, branch=branch_name, depth=1)
+
+        elif strategy == "blobless":
+            repo = git.Repo.clone_from(repo_url, repo_dir, branch=branch_name, filter="blob:none")
+
+        elif strategy == "sparse":
+            repo = git.Repo.clone_from(repo_url, repo_dir, branch=branch_name, filter="blob:none", no_checkout=True)
+            repo.git.sparse_checkout("set", *config.SPARSE_PATHS)
+            if not commit_id:
+                repo.git.checkout(branch_name)
+
+        else:
+            raise ValueError(f"Unknown clone strategy: {strategy}")
+
+        if commit_id and (strategy == "sparse" or repo.head.commit.hexsha != commit_id):
+            self._checkout_commit(repo, commit_id, shallow=strategy == "shallow", clean=False)
+        return repo
+
+    def _checkout_commit(self, repo, commit_id, shallow=False, clean=True):
+        """
+        Checks out commit_id detached, fetching it first if the clone does not have it:
+        it may not be on a branch any more, or be beyond the depth of a shallow clone.
+        With clean set, the checkout is reset as for a reused workspace.
+        """
+        try:
+            repo.git.cat_file("-e", f"{commit_id}^{{commit}}")
+        except git.GitCommandError:
+            depth = ["--depth", "1"] if shallow else []
+            repo.git.fetch(*depth, "origin", commit_id, kill_after_timeout=config.GIT_TIMEOUT)
+        if clean:
+            self._reset_checkout(repo, commit_id)
+        else:
+            repo.git.checkout("--detach", commit_id, kill_after_timeout=config.GIT_TIMEOUT)
+
+    def _reset_checkout(self, repo, target):
+        """
+        Checks out target in an existing checkout and removes every file git does not track,
+        ignored ones included. Bytecode and pytest caches survive if config.WORKSPACE_KEEP_CACHES is set.
+        """
+        repo.git.checkout("--force", "--detach", target, kill_after_timeout=config.GIT_TIMEOUT)
+        kept = ["__pycache__", ".pytest_cache"] if config.WORKSPACE_KEEP_CACHES else []
+        repo.git.clean("-ffdx", *[f"--exclude={pattern}" for pattern in kept])
+
+    def _object_bytes(self, repo):
+        """
+        Returns the size in bytes of a repository's object store, loose objects and packs,
+        as reported by `git count-objects`. The difference around a fetch is what it downloaded.
+        """
+        output = str(repo.git.count_objects("-v"))
+        return sum(int(kib) * 1024 for kib in re.findall(r"^size(?:-pack)?: (\d+)$", output, re.MULTILINE))
+
+    def checkout_from_mirror(self, repo_url, repo_dir, branch_name="main", commit_id=None, build_id=None):
+        """
+        Checks out a build workspace as a git worktree of a local bare mirror of the repository.
+        The mirror is created on the first build of a repository and fetched incrementally afterwards.
+        A workspace that already is a worktree, such as a reused one, is reset to the commit instead.
+        The bytes fetched into the mirror are recorded in the build log.
+
+        Args:
+            repo_url (str): The Git repository URL.
+            repo_dir (str): The directory where the worktree should be created.
+            branch_name (str): The branch to check out if the commit is not known.
+            commit_id (str): The exact commit to check out.
+            build_id (str): The build whose log gets the results. Defaults to the branch name.
+
+        Returns:
+            bool: True if successful, False otherwise.
+        """
+
+        build_id = build_id or branch_name
+        mirror_path = self._mirror_path(repo_url)
+        logging.info(f"[Build {build_id}] Checking out {commit_id or branch_name} from mirror {mirror_path} into {repo_dir}...")
+
+        try:
+            with self._mirror_lock(mirror_path):
+                if os.path.exists(mirror_path):
+                    mirror = git.Repo(mirror_path)
+                    bytes_before = self._object_bytes(mirror)
+                    mirror.git.fetch("--prune", "origin", kill_after_timeout=config.GIT_TIMEOUT)
+                    # Forget worktrees of earlier builds whose workspace was removed
+                    mirror.git.worktree("prune")
+                else:
+                    os.makedirs(os.path.dirname(mirror_path), exist_ok=True)
+                    bytes_before = 0
+                    mirror = git.Repo.clone_from(repo_url, mirror_path, mirror=True)
+                    logging.info(f"Created mirror of {repo_url} at {mirror_path}.")
+                fetched = self._object_bytes(mirror) - bytes_before
+
+                target = branch_name
+                if commit_id:
+                    try:
+                        mirror.git.cat_file("-e", f"{commit_id}^{{commit}}")
+                        target = commit_id
+                    except git.GitCommandError:
+                        logging.warning(f"Commit {commit_id} not found in mirror, using branch {branch_name}.")
+
+                # A worktree has a .git file pointing at the mirror, a clone a .git directory
+                reused = os.path.isfile(os.path.join(repo_dir, ".git"))
+                if reused:
+                    self._reset_checkout(git.Repo(repo_dir), target)
+                else:
+                    shutil.rmtree(repo_dir, ignore_errors=True)
+                    mirror.git.worktree("add", "--detach", os.path.abspath(repo_dir), target,
+                                        kill_after_timeout=config.GIT_TIMEOUT)
+
+            action = "Reset worktree to" if reused else "Checked out"
+            self.logger.log_build_result(build_id, "git", "success",
+                                         f"{action} {target} at {repo_dir} from mirror {mirror_path} (strategy: mirror, {fetched} bytes fetched).")
+            logging.info(f"[Build {build_id}] Worktree for {target} {'reset' if reused else 'created'} at {repo_dir}.")
+            return True
+
+        except Exception as e:
+            shutil.rmtree(repo_dir, ignore_errors=True)
+            self.logger.log_build_result(build_id, "git", "failure", f"Error checking out from mirror: {e}")
+            logging.error(f"[Build {build_id}] Error checking out from mirror: {e}")
+            return False
+
+    def _mirror_path(self, repo_url):
+        """
+        Returns the directory of the bare mirror for a repository URL.
+        """
+        name = repo_url.rstrip("/").split("/")[-1]
+        if name.endswith(".git"):
+            name = name[:-4]
+        digest = hashlib.sha1(repo_url.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.mirror_dir, f"{name}-{digest}.git")
+
+    def _mirror_lock(self, mirror_path):
+        """
+        Returns the lock serialising fetches and worktree changes of one mirror between workers.
+        """
+        with self._mirror_locks_guard:
+            return self._mirror_locks.setdefault(mirror_path, threading.Lock())
+
+    def list_repo_files(self, repo_path, include=None):
+        """
+        Lists the files of a repository the pipeline stages should look at.
+        In a git checkout the files come from `git ls-files`, so ignored files are never visited;
+        otherwise the tree is walked without descending into excluded directories.
+
+        Args:
+            repo_path (str): Path to the repository.
+            include (list): Globs the relative path must match, in addition to config.INCLUDE_GLOBS.
+
+        Returns:
+            list: Sorted paths of the files, joined to repo_path.
+        """
+        try:
+            repo = git.Repo(repo_path)
+            output = repo.git.ls_files("-z", "--cached", "--others", "--exclude-standard")
+            relative_paths = [path for path in output.split("\0") if path]
+        except (git.InvalidGitRepositoryError, git.NoSuchPathError, git.GitCommandError):
+            relative_paths = []
+            for root, dirs, files in os.walk(repo_path):
+                rel_root = os.path.relpath(root, repo_path).replace(os.sep, "/")
+                rel_root = "" if rel_root == "." else rel_root + "/"
+                dirs[:] = [d for d in dirs if not self._is_excluded(rel_root + d + "/")]
+                relative_paths.extend(rel_root + file for file in files)
+
+        file_paths = []
+        for relative_path in relative_paths:
+            if self._is_excluded(relative_path):
+                continue
+            if config.INCLUDE_GLOBS and not any(fnmatch.fnmatch(relative_path, glob) for glob in config.INCLUDE_GLOBS):
+                continue
+            if include and not any(fnmatch.fnmatch(relative_path, glob) for glob in include):
+                continue
+            file_path = os.path.join(repo_path, *relative_path.split("/"))
+            if os.path.isfile(file_path):
+                file_paths.append(file_path)
+
+        return sorted(file_paths)
+
+    def _is_excluded(self, relative_path):
+        return any(fnmatch.fnmatch(relative_path, glob) for glob in config.EXCLUDE_GLOBS)
+
+    def check_python_syntax(self, build_id, repo_path, workers=None):
         """
         Perform static syntax checking on all Python files in a repo using the ast library.
+        With more than one worker the files are parsed in chunks on a process pool.
         
         Args:
             build_id (str): Unique identifier for the build
             repo_path (str): Path to the repository
+            workers (int): Number of parser processes. Defaults to config.SYNTAX_WORKERS.
+        
+        Files whose content hash is in the syntax cache are not parsed again.
             
         Returns:
             bool: True if syntax check passes, False otherwise
         """
         
         logging.info(f"[Build {build_id}] Running Python syntax check...")
+        workers = workers or config.SYNTAX_WORKERS
+        start_time = time.monotonic()
+
+        # Collect the repository's own .py files in a fixed order
+        file_paths = self.list_repo_files(repo_path, include=["*.py"])
+
+        # Files whose content was checked by an earlier build are looked up by blob SHA
+        file_shas = {}
+        cached = {}
+        if self.syntax_cache is not None:
+            for file_path in file_paths:
+                with open(file_path, 'rb') as f:
+                    file_shas[file_path] = blob_sha(f.read())
+            cached = self.syntax_cache.get_many(file_shas.values())
+        to_parse = [path for path in file_paths if file_shas.get(path) not in cached]
+
+        chunk_size = config.SYNTAX_CHUNK_SIZE
+        if workers > 1 and len(to_parse) > chunk_size:
+            chunks = [to_parse[i:i + chunk_size] for i in range(0, len(to_parse), chunk_size)]
+            # map() keeps the chunk order, so results line up with to_parse
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_syntax_pool_context()) as executor:
+                parsed = [result for results in executor.map(_parse_python_files, chunks) for result in results]
+        else:
+            workers = 1
+            parsed = _parse_python_files(to_parse)
+
+        results = dict(zip(to_parse, parsed))
+        if self.syntax_cache is not None:
+            self.syntax_cache.put_many({file_shas[path]: result or (None, None) for path, result in results.items()})
+
         syntax_errors = []
-        
-        # Walk through the repository and check .py files
-        for root, _, files in os.walk(repo_path):
-            for file in files:
-                if file.endswith('.py'):
-                    file_path = os.path.join(root, file)
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            source = f.read()
-                        ast.parse(source, file_path)
-                    except SyntaxError as e:
-                        error_msg = f"Syntax error in {file_path}: {str(e)}"
-                        syntax_errors.append(error_msg)
+        for file_path in file_paths:
+            result = results[file_path] if file_path in results else cached[file_shas[file_path]]
+            if result is not None and result[0] is not None:
+                syntax_errors.append(_format_syntax_error(file_path, *result))
+
+        elapsed = time.monotonic() - start_time
+        rate = len(file_paths) / elapsed if elapsed > 0 else float(len(file_paths))
+        summary = (f"Checked {len(file_paths)} files ({len(file_paths) - len(to_parse)} cached) "
+                   f"with {workers} worker(s) in {elapsed:.2f}s ({rate:.0f} files/s)")
+        logging.info(f"[Build {build_id}] {summary}.")
         
         # Log the results
         if syntax_errors:
@@ -110,7 +419,7 @@ class CIPipeline:
                 build_id,
                 'syntax_check',
                 'failure',
-                '\n'.join(syntax_errors)
+                summary + '\n' + '\n'.join(syntax_errors)
             )
             logging.error(f"[Build {build_id}] Syntax check failed:\n" + "\n".join(syntax_errors))
             return syntax_errors, False
@@ -119,24 +428,136 @@ class CIPipeline:
             build_id,
             'syntax_check',
             'success',
-            'All Python files passed syntax check'
+            f'All Python files passed syntax check. {summary}'
         )
         logging.info(f"[Build {build_id}] Syntax check passed.")
         return "No syntax errors detected.", True
     
-    def run_tests(self, build_id, repo_path):
+    def select_tests(self, build_id, repo_path, repo_url, branch_name):
+        """
+        Selects the test files affected by the changes since the last green build of the branch
+        (or of a full suite branch), when config.TEST_SELECTION is "impacted".
+
+        Args:
+            build_id (str): Unique identifier for the build.
+            repo_path (str): Path to the checked-out repository.
+            repo_url (str): The Git repository URL.
+            branch_name (str): The branch being built.
+
+        Returns:
+            list: Paths of the test files to run, or None to run the full suite.
+        """
+        if config.TEST_SELECTION != "impacted" or self.test_history is None:
+            return None
+
+        if branch_name in config.FULL_SUITE_BRANCHES:
+            logging.info(f"[Build {build_id}] Branch {branch_name} always runs the full test suite.")
+            return None
+
+        base_commit = self.test_history.last_green_commit(repo_url, [branch_name] + config.FULL_SUITE_BRANCHES)
+        if base_commit is None:
+            logging.info(f"[Build {build_id}] No green build to compare with, running the full test suite.")
+            return None
+
+        try:
+            repo = git.Repo(repo_path)
+            repo.git.cat_file("-e", f"{base_commit}^{{commit}}")
+            output = repo.git.diff("--name-only", "-z", base_commit, "HEAD")
+        except (git.InvalidGitRepositoryError, git.NoSuchPathError, git.GitCommandError) as e:
+            logging.info(f"[Build {build_id}] Cannot diff against green build {base_commit[:7]}, running the full test suite: {e}")
+            return None
+
+        changed_python_files = []
+        for path in (path for path in output.split("\0") if path):
+            if path.endswith(".py"):
+                if os.path.basename(path) == "conftest.py":
+                    logging.info(f"[Build {build_id}] {path} changed, running the full test suite.")
+                    return None
+                changed_python_files.append(path)
+            elif not any(fnmatch.fnmatch(path, glob) for glob in config.IMPACT_IGNORE_GLOBS):
+                logging.info(f"[Build {build_id}] Non-Python file {path} changed, running the full test suite.")
+                return None
+
+        import_graph = build_import_graph(repo_path, self.list_repo_files(repo_path, include=["*.py"]))
+        test_files = []
+        for path in sorted(impacted_files(import_graph, changed_python_files)):
+            file_name = os.path.basename(path)
+            if path.startswith("tests/") and (file_name.startswith("test_") or file_name.endswith("_test.py")):
+                file_path = os.path.join(repo_path, *path.split("/"))
+                if os.path.isfile(file_path):
+                    test_files.append(file_path)
+
+        self.logger.log_build_result(build_id, "test_selection", "success",
+                                     f"{len(changed_python_files)} Python files changed since {base_commit[:7]}, "
+                                     f"running {len(test_files)} impacted test files.")
+        logging.info(f"[Build {build_id}] {len(changed_python_files)} Python files changed since green build "
+                     f"{base_commit[:7]}, {len(test_files)} test files impacted.")
+        return test_files
+
+    def record_green_build(self, repo_url, branch_name, commit_id):
+        """
+        Remembers a commit whose tests passed, as the base for later test selection.
+        """
+        if self.test_history is not None:
+            self.test_history.record_green_build(repo_url, branch_name, commit_id)
+
+    def prepare_environment(self, build_id, repo_path):
+        """
+        Creates a virtualenv for the build's tests with the repository's requirements.txt installed,
+        from the environment cache when another build already installed the same requirements.
+
+        Args:
+            build_id (str): Unique identifier for the build.
+            repo_path (str): Path to the repository.
+
+        Returns:
+            str: The Python executable to run the tests with, or None to use the server's pytest.
+        """
+        requirements_path = os.path.join(repo_path, "requirements.txt")
+        if self.env_cache is None or not os.path.isfile(requirements_path):
+            return None
+
+        start_time = time.monotonic()
+        target_dir = os.path.join(repo_path, ".ci_venv")
+        try:
+            # A reused workspace can still hold parts of the previous build's environment
+            shutil.rmtree(target_dir, ignore_errors=True)
+            # Inside the workspace, so it is removed with it; excluded from the other stages as a venv
+            python = self.env_cache.materialize(requirements_path, target_dir)
+        except Exception as e:
+            self.logger.log_build_result(build_id, "environment", "failure", f"Error creating test environment: {e}")
+            logging.error(f"[Build {build_id}] Error creating test environment, using the server's pytest: {e}")
+            return None
+
+        elapsed = time.monotonic() - start_time
+        self.logger.log_build_result(build_id, "environment", "success", f"Test environment ready in {elapsed:.1f}s.")
+        logging.info(f"[Build {build_id}] Test environment ready in {elapsed:.1f}s.")
+        return python
+
+    def run_tests(self, build_id, repo_path, cancel_event=None, shards=None, repo_url=None, test_files=None,
+                  python=None):
         """
         Runs unit tests in the repository using pytest.
+        With more than one shard the collected tests are split over concurrent pytest processes.
+        When the repository URL is given, the duration and outcome of every test are added to
+        the test history, and the history is used to balance shards and run recent failures first.
         
         Args:
             build_id (str): Unique identifier for the build.
             repo_path (str): Path to the repository.
+            cancel_event (threading.Event): Optional event; the pytest process is killed when it is set.
+            shards (int): Number of concurrent pytest processes. Defaults to config.TEST_SHARDS.
+            repo_url (str): The repository the tests belong to, used as the test history key.
+            test_files (list): Test files to run, as returned by select_tests. None runs all tests.
+            python (str): Interpreter to run pytest with, as returned by prepare_environment.
+                None uses the pytest on the server's PATH.
 
         Returns:
             bool: True if all tests pass, False otherwise.
         """
         
         logging.info(f"[Build {build_id}] Running tests...")
+        shards = shards or config.TEST_SHARDS
 
         tests_dir = os.path.join(repo_path, "tests")
 
@@ -146,89 +567,397 @@ class CIPipeline:
             self.logger.log_build_result(build_id, "tests", "skipped", "No tests directory found.")
             logging.warning(f"[Build {build_id}] No tests directory found. Skipping tests.")
 
-            return True  # No tests to run, treat as success
+            return "No tests directory found.", True  # No tests to run, treat as success
 
-        try:
-            # Run pytest and capture output
-            result = subprocess.run(["pytest", tests_dir], capture_output=True, text=True)
-
-            # Clean up the output from the tests
-            lines = result.stdout.split("\n")
-            cleaned = []
-            skip_next = False
-
-            for line in lines:
-                if "test session starts" in line or "platform" in line or "rootdir" in line:
-                    continue
-
-                if "passed" in line or "failed" in line and "=" in line:
-                    cleaned.append(line)
-                    continue
-
-                if line.strip() and not line.startswith("="):
-
-                    if "tmp/ci_workspaces" in line or "C:\\tmp\\ci_workspaces" in line:
-                        skip_next = True
-                        continue
-
-                    if "[" in line and "%" in line and "]" in line:
-                        continue
-
-                    if "self = " in line:
-                        continue
+        if test_files is not None and not test_files:
 
-                    if skip_next:
-                        skip_next = False
-                        continue
+            self.logger.log_build_result(build_id, "tests", "skipped", "No tests affected by the change.")
+            logging.info(f"[Build {build_id}] No tests affected by the change. Skipping tests.")
 
-                    if "AssertionError" in line:
-                        cleaned.append("Error cause: " + line)
-                        continue
+            return "No tests affected by the change.", True
 
-                    cleaned.append(line)
+        use_history = self.test_history is not None and repo_url is not None
+        history = self.test_history.lookup(repo_url) if use_history else {}
+        output_path = self.logger.output_path(build_id, "tests")
+        deadline = time.monotonic() + config.TEST_TIMEOUT if config.TEST_TIMEOUT > 0 else None
 
-            cleaned_output = "\n".join(cleaned)
-
-            if result.returncode == 0:
-
-                self.logger.log_build_result(build_id, "tests", "success", "All tests passed.")
+        try:
+            with tempfile.TemporaryDirectory(prefix="ci_pytest_") as run_dir:
+                plugin_variables = self._resource_limit_variables()
+                if test_files is not None:
+                    plugin_variables["CI_PYTEST_FILES"] = os.path.join(run_dir, "files.txt")
+                    self._write_test_ids(plugin_variables["CI_PYTEST_FILES"], [os.path.abspath(path) for path in test_files])
+                retry_variables = dict(plugin_variables)
+
+                if shards > 1:
+                    returncode, stop_reason = self._run_sharded_pytest(build_id, tests_dir, shards, run_dir, output_path,
+                                                                       history, cancel_event, plugin_variables, python,
+                                                                       deadline)
+                else:
+                    # Run pytest with the CI plugin reporting every test result,
+                    # running the tests that failed last time first
+                    plugin_variables["CI_PYTEST_REPORT"] = os.path.join(run_dir, "report_0.jsonl")
+                    if history:
+                        plugin_variables["CI_PYTEST_FIRST"] = os.path.join(run_dir, "first.txt")
+                        self._write_test_ids(plugin_variables["CI_PYTEST_FIRST"],
+                                             [test_id for test_id, entry in history.items() if entry["failed"]])
+                    # The output goes straight to the build's output file, never into memory
+                    with open(output_path, "w", encoding="utf-8") as output:
+                        process = self._start_pytest(python, ["-p", "ci_pytest_plugin", tests_dir], output,
+                                                     self._pytest_plugin_env(**plugin_variables))
+                        stop_reason = self._wait(process, cancel_event, deadline=deadline)
+                    returncode = process.returncode
+
+                test_results = self._read_test_reports(run_dir)
+
+                # Exit code 1 means tests failed; anything else is not something a rerun fixes
+                if returncode == 1 and stop_reason is None and config.TEST_RETRIES > 0:
+                    returncode, stop_reason = self._retry_failed_tests(build_id, tests_dir, run_dir, output_path,
+                                                                       test_results, cancel_event, retry_variables,
+                                                                       python, deadline)
+
+            output_tail = self._tail(output_path, config.OUTPUT_TAIL_LINES)
+
+            if cancel_event is not None and cancel_event.is_set():
+
+                self.logger.log_build_result(build_id, "tests", "cancelled", "Superseded by a newer push.")
+                logging.warning(f"[Build {build_id}] Test run cancelled, superseded by a newer push.")
+
+                return "Build was cancelled by a newer push.", False
+
+            tests_run = [result for result in test_results if not result["collect_error"]]
+            if use_history and tests_run:
+                self.test_history.record(repo_url, tests_run)
+                flake_rates = self.test_history.flake_rates(repo_url)
+                for result in tests_run:
+                    if result["outcome"] == "flaky":
+                        logging.warning(f"[Build {build_id}] Flaky test {result['nodeid']}, "
+                                        f"flaky in {flake_rates[result['nodeid']]:.0%} of its runs.")
+
+            summary = self._summarize_test_results(test_results, returncode, output_tail)
+            limit_hit = self._resource_limit_hit(stop_reason, returncode, test_results)
+            if limit_hit:
+                summary = f"Resource limit hit: {limit_hit}\n{summary}"
+                self.logger.log_build_result(build_id, "limits", "exceeded", limit_hit)
+                logging.warning(f"[Build {build_id}] Resource limit hit: {limit_hit}")
+
+            if returncode == 0:
+
+                self.logger.log_build_result(build_id, "tests", "success", f"All tests passed. {summary}")
                 logging.info(f"[Build {build_id}] All tests passed.")
 
+                flaky = [result["nodeid"] for result in test_results if result["outcome"] == "flaky"]
+                if flaky:
+                    logging.warning(f"[Build {build_id}] {len(flaky)} flaky test(s) passed on retry.")
+                    return "Build was successful, with flaky tests that passed on retry:\n" + "\n".join(flaky), True
                 return "Build was successful", True
             else:
 
-                self.logger.log_build_result(build_id, "tests", "failure", result.stdout + "\n" + result.stderr)
-                logging.error(f"[Build {build_id}] Test failures:\n{result.stdout}\n{result.stderr}")
+                self.logger.log_build_result(build_id, "tests", "failure",
+                                             f"{summary}\nFull output: {output_path}\n{output_tail}")
+                logging.error(f"[Build {build_id}] Test failures (full output in {output_path}):\n{output_tail}")
                 
-                return cleaned_output, False
+                return summary, False
 
         except Exception as e:
 
             self.logger.log_build_result(build_id, "tests", "failure", f"Test execution error: {e}")
             logging.error(f"[Build {build_id}] Error running tests: {e}")
 
-            return cleaned_output, False
-    
-    def cleanup_workspace(self, repo_path):
+            return f"Test execution error: {e}", False
+
+    def _summarize_test_results(self, test_results, returncode, output_tail=""):
         """
-        Deletes the repository workspace after the CI process is complete.
-        
-        Args:
-            repo_path (str): Path to the repository to be removed.
+        Builds the test summary for the notification email from the per-test results.
+
+        Returns:
+            str: Counts of passed, failed and skipped tests followed by every failure and its cause.
+        """
+        counts = {"passed": 0, "failed": 0, "skipped": 0, "flaky": 0}
+        for result in test_results:
+            if not result["collect_error"]:
+                counts[result["outcome"]] += 1
+        duration = sum(result["duration"] for result in test_results)
+
+        flaky = f", {counts['flaky']} flaky" if counts["flaky"] else ""
+        lines = [f"{counts['passed']} passed, {counts['failed']} failed, {counts['skipped']} skipped{flaky} "
+                 f"in {duration:.2f}s"]
+        for result in test_results:
+            if result["outcome"] == "failed":
+                lines.append(f"{'ERROR collecting' if result['collect_error'] else 'FAILED'} {result['nodeid']}")
+                lines.append(f"Error cause: {result['message']}")
+            elif result["outcome"] == "flaky":
+                lines.append(f"FLAKY {result['nodeid']} (passed on retry)")
+                lines.append(f"First failure: {result['message']}")
+
+        if not test_results and returncode != 0:
+            # pytest did not get as far as running tests, e.g. a usage error
+            lines.append(f"pytest exited with code {returncode}.")
+            lines.extend(line for line in output_tail.strip().split("\n")[-10:] if line)
+        return "\n".join(lines)
+
+    def _run_sharded_pytest(self, build_id, tests_dir, shards, run_dir, output_path, history=None,
+                            cancel_event=None, plugin_variables=None, python=None, deadline=None):
         """
+        Collects the test node IDs once and runs them split over concurrent pytest processes.
+        Each shard writes its per-test results to a report file in run_dir, and the shards'
+        console output is appended to output_path. plugin_variables are passed on to every
+        pytest process.
 
-        logging.info(f"Cleaning up workspace: {repo_path}...")
+        Returns:
+            tuple: The merged return code, 0 only if every shard passed, and the reason the shards
+                   were killed ("cancelled", "timeout") or None.
+        """
+        collect_file = os.path.join(run_dir, "collected.txt")
+        with open(output_path, "w", encoding="utf-8") as output:
+            process = self._start_pytest(
+                python, ["-p", "ci_pytest_plugin", "--collect-only", "-q", tests_dir], output,
+                self._pytest_plugin_env(CI_PYTEST_COLLECT=collect_file, **(plugin_variables or {}))
+            )
+            stop_reason = self._wait(process, cancel_event, deadline=deadline)
+        if process.returncode != 0 or not os.path.exists(collect_file):
+            return process.returncode or 1, stop_reason
+
+        with open(collect_file, "r", encoding="utf-8") as f:
+            test_ids = [line.strip() for line in f if line.strip()]
+
+        assignments = self._assign_shards(test_ids, min(shards, max(1, len(test_ids))), history)
+        logging.info(f"[Build {build_id}] Running {len(test_ids)} tests in {len(assignments)} shard(s)...")
+
+        processes = []
+        for i, shard_ids in enumerate(assignments):
+            select_file = os.path.join(run_dir, f"shard_{i}.txt")
+            self._write_test_ids(select_file, shard_ids)
+            # Shard output goes to files so one shard never blocks on a full pipe
+            shard_output = open(os.path.join(run_dir, f"shard_{i}.log"), "w+", encoding="utf-8")
+            shard_process = self._start_pytest(
+                python, ["-p", "ci_pytest_plugin", tests_dir], shard_output,
+                self._pytest_plugin_env(CI_PYTEST_SELECT=select_file,
+                                        CI_PYTEST_REPORT=os.path.join(run_dir, f"report_{i}.jsonl"),
+                                        **(plugin_variables or {}))
+            )
+            processes.append((shard_process, shard_output))
+
+        returncode = 0
+        stop_reason = None
+        with open(output_path, "w", encoding="utf-8") as output:
+            for i, (shard_process, shard_output) in enumerate(processes):
+                stop_reason = self._wait(shard_process, cancel_event, [p for p, _ in processes], deadline) or stop_reason
+                output.write(f"===== shard {i + 1}/{len(processes)} =====\n")
+                shard_output.seek(0)
+                shutil.copyfileobj(shard_output, output)
+                shard_output.close()
+                if shard_process.returncode != 0:
+                    returncode = shard_process.returncode
+
+        return returncode, stop_reason
+
+    def _retry_failed_tests(self, build_id, tests_dir, run_dir, output_path, test_results, cancel_event=None,
+                            plugin_variables=None, python=None, deadline=None):
+        """
+        Reruns only the failed tests of a run, in the same workspace, up to config.TEST_RETRIES times.
+        Tests that pass on a rerun get the outcome "flaky" in test_results. Nothing is rerun if a
+        module failed to import, since that fails the same way every time.
 
-        try:
+        Returns:
+            tuple: The return code, 0 if every failed test passed on a rerun, and the reason a rerun
+                   was killed ("cancelled", "timeout") or None.
+        """
+        if any(result["collect_error"] for result in test_results):
+            return 1, None
+        failed = {result["nodeid"]: result for result in test_results if result["outcome"] == "failed"}
+        if not failed:
+            return 1, None  # pytest failed without a failing test, e.g. an error in a fixture teardown
+
+        for attempt in range(1, config.TEST_RETRIES + 1):
+            retry_dir = os.path.join(run_dir, f"retry_{attempt}")
+            os.makedirs(retry_dir)
+            variables = dict(plugin_variables or {}, CI_PYTEST_SELECT=os.path.join(retry_dir, "select.txt"),
+                             CI_PYTEST_REPORT=os.path.join(retry_dir, "report_0.jsonl"))
+            self._write_test_ids(variables["CI_PYTEST_SELECT"], list(failed))
+
+            logging.info(f"[Build {build_id}] Retry {attempt}: rerunning {len(failed)} failed test(s).")
+            with open(output_path, "a", encoding="utf-8") as output:
+                output.write(f"\n===== Retry {attempt} of {len(failed)} failed test(s) =====\n")
+                output.flush()
+                process = self._start_pytest(python, ["-p", "ci_pytest_plugin", tests_dir], output,
+                                             self._pytest_plugin_env(**variables))
+                stop_reason = self._wait(process, cancel_event, deadline=deadline)
+            if stop_reason is not None:
+                return process.returncode, stop_reason
+
+            for result in self._read_test_reports(retry_dir):
+                if result["nodeid"] in failed and result["outcome"] == "passed":
+                    failed.pop(result["nodeid"])["outcome"] = "flaky"
+            if not failed:
+                return 0, None
+
+        return 1, None
+
+    def _assign_shards(self, test_ids, shards, history=None):
+        """
+        Splits the test node IDs into shards of about the same expected runtime, placing the
+        longest tests first on the least loaded shard. Tests without history count as the median
+        known duration. Within a shard, tests that failed last time run first.
+        """
+        history = history or {}
+        known = [entry["duration"] for entry in history.values()]
+        default_duration = statistics.median(known) if known else 1.0
+
+        def duration(test_id):
+            return history[test_id]["duration"] if test_id in history else default_duration
+
+        assignments = [[] for _ in range(shards)]
+        loads = [(0.0, i) for i in range(shards)]
+        for test_id in sorted(test_ids, key=duration, reverse=True):
+            load, i = heapq.heappop(loads)
+            assignments[i].append(test_id)
+            heapq.heappush(loads, (load + duration(test_id), i))
+
+        position = {test_id: i for i, test_id in enumerate(test_ids)}
+        for shard in assignments:
+            shard.sort(key=lambda test_id: (not history.get(test_id, {}).get("failed", False), position[test_id]))
+        return [shard for shard in assignments if shard]
+
+    def _resource_limit_variables(self):
+        """
+        Returns the plugin variables that make pytest processes apply the configured resource limits.
+        """
+        limits = {"cpu_seconds": config.TEST_CPU_SECONDS, "memory_bytes": config.TEST_MEMORY_BYTES,
+                  "processes": config.TEST_MAX_PROCESSES}
+        limits = {name: value for name, value in limits.items() if value > 0}
+        return {"CI_PYTEST_LIMITS": json.dumps(limits)} if limits else {}
 
-            shutil.rmtree(repo_path)
-            self.logger.log_build_result("cleanup", "workspace", "success", f"Workspace {repo_path} removed.")
-            logging.info(f"Workspace cleanup successful: {repo_path}.")
+    def _resource_limit_hit(self, stop_reason, returncode, test_results):
+        """
+        Describes the resource limit a test run ran into, or returns None if it hit none.
+        """
+        if stop_reason == "timeout":
+            return f"wall-clock timeout of {config.TEST_TIMEOUT}s"
+        if hasattr(signal, "SIGXCPU") and returncode == -signal.SIGXCPU:
+            return f"CPU time limit of {config.TEST_CPU_SECONDS}s"
+        if config.TEST_MEMORY_BYTES > 0 and any("MemoryError" in (result["message"] or "") for result in test_results):
+            return f"memory limit of {config.TEST_MEMORY_BYTES} bytes"
+        if config.TEST_MAX_PROCESSES > 0 and any("Resource temporarily unavailable" in (result["message"] or "")
+                                                 for result in test_results):
+            return f"process limit of {config.TEST_MAX_PROCESSES}"
+        return None
+
+    def _tail(self, path, lines):
+        """
+        Returns the last lines of a file, reading it line by line so memory stays bounded.
+        """
+        if not os.path.exists(path):
+            return ""
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return "".join(collections.deque(f, maxlen=lines))
 
-        except Exception as e:
+    def _write_test_ids(self, path, test_ids):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(test_id + "\n" for test_id in test_ids))
 
-            self.logger.log_build_result("cleanup", "workspace", "failure", f"Error deleting workspace: {e}")
-            logging.error(f"Error during cleanup: {e}")
+    def _read_test_reports(self, run_dir):
+        """
+        Reads the per-phase reports written by the CI pytest plugin into one result per test.
+        Modules that failed to import are included as results with "collect_error" set.
+
+        Returns:
+            list: Dicts with the "nodeid", "outcome", total "duration", failure "message"
+                  and "collect_error" of each test.
+        """
+        results = {}
+        for report_file in sorted(glob.glob(os.path.join(run_dir, "report_*.jsonl"))):
+            with open(report_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        report = json.loads(line)
+                    except ValueError:
+                        continue  # Line cut short by a killed process
+                    result = results.setdefault(report["nodeid"], {
+                        "nodeid": report["nodeid"], "outcome": "passed", "duration": 0.0,
+                        "message": None, "collect_error": report["when"] == "collect", "finished": False
+                    })
+                    result["duration"] += report["duration"]
+                    if report["when"] in ("call", "collect") or report["outcome"] != "passed":
+                        result["finished"] = True
+                    if report["outcome"] == "failed":
+                        result["outcome"] = "failed"
+                        result["message"] = result["message"] or report.get("message")
+                    elif report["outcome"] == "skipped" and result["outcome"] == "passed":
+                        result["outcome"] = "skipped"
+
+        for result in results.values():
+            # Only the setup report was written before the process was killed
+            if not result.pop("finished"):
+                result["outcome"] = "failed"
+                result["message"] = "Test did not finish, the test process was killed."
+        return list(results.values())
+
+    def _pytest_command(self, python=None):
+        return [python, "-m", "pytest"] if python else ["pytest"]
+
+    def _start_pytest(self, python, args, output, env):
+        """
+        Starts pytest with its console output going to an open file. Runs with the server's pytest
+        are forked from the warm runner when it is enabled.
+
+        Returns:
+            subprocess.Popen or WarmProcess: The running pytest process.
+        """
+        if self.warm_runner is not None and python is None:
+            output.flush()
+            return self.warm_runner.run(args, env, os.getcwd(), os.path.abspath(output.name))
+        # Its own session, so a timeout or cancellation can kill every process the tests start
+        return subprocess.Popen(self._pytest_command(python) + args, stdout=output, stderr=subprocess.STDOUT,
+                                text=True, env=env, start_new_session=(os.name == "posix"))
+
+    def _pytest_plugin_env(self, **variables):
+        """
+        Returns the environment for a pytest process that loads the CI pytest plugin.
+        """
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [PYTEST_PLUGIN_DIR, env.get("PYTHONPATH")]))
+        env.update(variables)
+        return env
 
+    def _wait(self, process, cancel_event=None, group=(), deadline=None):
+        """
+        Waits for a subprocess. Its whole process tree, and those of the rest of its group,
+        are killed if the cancel event is set or the deadline (a time.monotonic() value) passes.
 
+        Returns:
+            str: "cancelled" or "timeout" if the process was killed, otherwise None.
+        """
+        if cancel_event is None and deadline is None:
+            process.wait()
+            return None
+
+        while True:
+            try:
+                process.wait(timeout=0.5)
+                return None
+            except subprocess.TimeoutExpired:
+                if cancel_event is not None and cancel_event.is_set():
+                    reason = "cancelled"
+                elif deadline is not None and time.monotonic() > deadline:
+                    reason = "timeout"
+                else:
+                    continue
+                for other in group or [process]:
+                    if other.poll() is None:
+                        self._kill_tree(other)
+                process.wait()
+                return reason
 
+    def _kill_tree(self, process):
+        """
+        Kills a process started in its own session together with everything it started.
+        """
+        pid = getattr(process, "pid", None)
+        if os.name == "posix" and isinstance(pid, int):
+            try:
+                os.killpg(pid, signal.SIGKILL)
+                return
+            except (ProcessLookupError, PermissionError):
+                pass
+        process.kill()
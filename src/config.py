@@ -1 +1,155 @@
-# Configuration settings
\ No newline at end of file
+"""
+Configuration Module
+
+This module collects the tunable settings of the CI server. Every setting
+can be overridden with an environment variable (or in the .env file), in the
+same way as the SMTP settings used by the notifications module.
+
+Settings:
+    DATA_DIR: Directory for persistent CI state (queue database, caches)
+    BUILD_WORKERS: Number of builds that may run at the same time
+    QUEUE_DB_PATH: SQLite database backing the build queue
+    SUPERSEDE_BUILDS: Whether a new push cancels older builds of the same branch
+    PATH_RULES_FILE: JSON file of per-repository rules skipping or narrowing builds by changed path (empty disables it)
+    SKIP_BUILD_GLOBS: Changed paths that need no build, for repositories without path rules
+    MIRROR_DIR: Directory holding the bare mirror of every built repository
+    USE_MIRROR_CACHE: Whether builds check out a worktree from the mirror instead of cloning
+    CLONE_STRATEGY: How a fresh clone fetches the repository (full, shallow, blobless or sparse)
+    SPARSE_PATHS: Directories checked out by the sparse clone strategy
+    SYNTAX_WORKERS: Number of processes parsing Python files in the syntax check
+    SYNTAX_CHUNK_SIZE: Number of files handed to a syntax check process at a time
+    SYNTAX_CACHE_DB: SQLite database caching syntax check results (empty disables the cache)
+    SYNTAX_CACHE_MAX_ENTRIES: Number of cached syntax check results kept
+    TEST_SHARDS: Number of concurrent pytest processes a test run is split over
+    OUTPUT_TAIL_LINES: Number of lines of test output kept in memory for the build log
+    TEST_RETRIES: Times the failed tests of a run are rerun to tell flaky tests from broken ones
+    TEST_HISTORY_DB: SQLite database of per-test durations and outcomes (empty disables the history)
+    TEST_SELECTION: Which tests a build runs: "all", or "impacted" by the change since the last green build
+    FULL_SUITE_BRANCHES: Branches that always run the full test suite
+    IMPACT_IGNORE_GLOBS: Changed non-Python files that cannot affect any test
+    USE_ENV_CACHE: Whether tests run in a virtualenv with the repository's requirements.txt installed
+    ENV_CACHE_DIR: Directory holding the cached virtualenvs
+    ENV_CACHE_MAX_BYTES: Disk budget of the virtualenv cache
+    ENV_PYTHON: Interpreter the virtualenvs are created with
+    GIT_TIMEOUT: Seconds a mirror fetch or worktree checkout may take
+    ENV_TIMEOUT: Seconds creating a test environment may take
+    TEST_TIMEOUT: Seconds the test stage of a build may take (0 disables the timeout)
+    TEST_CPU_SECONDS: CPU seconds each pytest process may use (0 means no limit, POSIX only)
+    TEST_MEMORY_BYTES: Address space each pytest process may use (0 means no limit, POSIX only)
+    TEST_MAX_PROCESSES: Processes the CI user may have while tests run (0 means no limit, POSIX only)
+    WARM_RUNNER: Whether tests run in forks of a warm pytest process (POSIX only)
+    WARM_RUNNER_PRELOAD: Modules the warm pytest process imports once for all runs
+    LOG_FLUSH_INTERVAL: Seconds build log records may wait in memory before they are written
+    LOG_BUFFER_RECORDS: Buffered build log records that trigger a write before the interval is up
+    LOG_MAX_OPEN_FILES: Build log files the log writer keeps open at once
+    BUILD_INDEX_DB: SQLite full-text index of all build log records (empty disables the index)
+    LOG_SEGMENT_MAX_BYTES: Size at which the log store starts a new compressed segment
+    LOG_RETENTION_BYTES: Disk budget of the archived build logs (0 means no limit)
+    LOG_RETENTION_DAYS: Days archived build logs are kept (0 means no limit)
+    OUTBOX_DB: SQLite database backing the outbox of notification emails
+    SMTP_POOL_SIZE: Number of SMTP connections kept open, and emails sent at the same time
+    SMTP_IDLE_SECONDS: Seconds an idle SMTP connection is reused for before it is replaced
+    NOTIFY_MAX_ATTEMPTS: Times sending an email is tried before it is given up
+    NOTIFY_BACKOFF_SECONDS: Wait before the first retry of an email, doubled for every further retry
+    NOTIFY_DIGEST: Whether build results are collected per recipient and sent as one digest email
+    NOTIFY_DIGEST_WINDOW: Seconds results are collected for after the first one of a digest
+    NOTIFY_URGENT_BRANCHES: Branches whose failures are sent straight away, bypassing the digest
+    NOTIFY_MAX_LOG_BYTES: Size the build log in a notification email is cut down to
+    NOTIFY_ATTACH_LOG: Whether a cut-down build log is attached in full, gzip-compressed
+    PUBLIC_URL: Address the CI server is reachable at, used for links to build logs (empty means no links)
+    WORKSPACE_QUOTA_BYTES: Disk space the build workspaces may use (0 means no limit)
+    WORKSPACE_GC_INTERVAL: Seconds between two sweeps of the workspace garbage collector
+    WORKSPACE_POOL_SIZE: Workspaces kept for reuse per repository and branch (0 disables reuse)
+    WORKSPACE_KEEP_CACHES: Whether bytecode and pytest caches survive in reused workspaces
+    INCLUDE_GLOBS: Repository paths the pipeline stages look at (empty means all)
+    EXCLUDE_GLOBS: Repository paths the pipeline stages skip, such as virtualenvs and build output
+"""
+import os
+import sys
+from dotenv import load_dotenv
+
+load_dotenv() # loading env variables
+
+# Persistent state of the CI server
+DATA_DIR = os.getenv("ci_data_dir", "ci_data")
+
+# Build queue
+BUILD_WORKERS = int(os.getenv("ci_build_workers", "2"))
+QUEUE_DB_PATH = os.getenv("ci_queue_db", os.path.join(DATA_DIR, "build_queue.db"))
+SUPERSEDE_BUILDS = os.getenv("ci_supersede_builds", "true").lower() == "true"
+PATH_RULES_FILE = os.getenv("ci_path_rules_file", os.path.join(DATA_DIR, "path_rules.json"))
+SKIP_BUILD_GLOBS = [glob.strip() for glob in os.getenv("ci_skip_build_globs", "docs/**,*.md").split(",") if glob.strip()]
+
+# Repository mirror cache
+MIRROR_DIR = os.getenv("ci_mirror_dir", os.path.join(DATA_DIR, "mirrors"))
+USE_MIRROR_CACHE = os.getenv("ci_use_mirror_cache", "true").lower() == "true"
+
+# Fresh clones (used when the mirror cache is disabled or fails)
+CLONE_STRATEGY = os.getenv("ci_clone_strategy", "full").lower()
+SPARSE_PATHS = [path.strip() for path in os.getenv("ci_sparse_paths", "src,tests").split(",") if path.strip()]
+
+# Syntax check
+SYNTAX_WORKERS = int(os.getenv("ci_syntax_workers", str(os.cpu_count() or 1)))
+SYNTAX_CHUNK_SIZE = int(os.getenv("ci_syntax_chunk_size", "200"))
+SYNTAX_CACHE_DB = os.getenv("ci_syntax_cache_db", os.path.join(DATA_DIR, "syntax_cache.db"))
+SYNTAX_CACHE_MAX_ENTRIES = int(os.getenv("ci_syntax_cache_max_entries", "200000"))
+
+# Files of a repository looked at by the pipeline stages, as globs on the path relative to the repository
+INCLUDE_GLOBS = [glob.strip() for glob in os.getenv("ci_include_globs", "").split(",") if glob.strip()]
+EXCLUDE_GLOBS = [glob.strip() for glob in os.getenv(
+    "ci_exclude_globs",
+    ".git/*,*venv/*,*node_modules/*,*site-packages/*,*__pycache__/*,build/*,dist/*,vendor/*,third_party/*"
+).split(",") if glob.strip()]
+
+# Test execution
+TEST_SHARDS = int(os.getenv("ci_test_shards", "1"))
+OUTPUT_TAIL_LINES = int(os.getenv("ci_output_tail_lines", "50"))
+TEST_RETRIES = int(os.getenv("ci_test_retries", "1"))
+TEST_HISTORY_DB = os.getenv("ci_test_history_db", os.path.join(DATA_DIR, "test_history.db"))
+TEST_SELECTION = os.getenv("ci_test_selection", "all").lower()
+FULL_SUITE_BRANCHES = [branch.strip() for branch in os.getenv("ci_full_suite_branches", "main,master").split(",") if branch.strip()]
+IMPACT_IGNORE_GLOBS = [glob.strip() for glob in os.getenv("ci_impact_ignore_globs", "*.md,*.rst,docs/*,LICENSE*").split(",") if glob.strip()]
+
+# Test environments
+USE_ENV_CACHE = os.getenv("ci_use_env_cache", "true").lower() == "true"
+ENV_CACHE_DIR = os.getenv("ci_env_cache_dir", os.path.join(DATA_DIR, "envs"))
+ENV_CACHE_MAX_BYTES = int(os.getenv("ci_env_cache_max_bytes", str(5 * 1024 ** 3)))
+ENV_PYTHON = os.getenv("ci_env_python", sys.executable)
+WARM_RUNNER = os.getenv("ci_warm_runner", "false").lower() == "true"
+WARM_RUNNER_PRELOAD = [module.strip() for module in os.getenv("ci_warm_runner_preload", "").split(",") if module.strip()]
+
+# Stage timeouts and resource limits of the test processes
+GIT_TIMEOUT = int(os.getenv("ci_git_timeout", "600"))
+ENV_TIMEOUT = int(os.getenv("ci_env_timeout", "1800"))
+TEST_TIMEOUT = int(os.getenv("ci_test_timeout", "3600"))
+TEST_CPU_SECONDS = int(os.getenv("ci_test_cpu_seconds", "0"))
+TEST_MEMORY_BYTES = int(os.getenv("ci_test_memory_mb", "0")) * 1024 * 1024
+TEST_MAX_PROCESSES = int(os.getenv("ci_test_max_processes", "0"))
+
+# Build logs
+LOG_FLUSH_INTERVAL = float(os.getenv("ci_log_flush_interval", "1.0"))
+LOG_BUFFER_RECORDS = int(os.getenv("ci_log_buffer_records", "256"))
+LOG_MAX_OPEN_FILES = int(os.getenv("ci_log_max_open_files", "64"))
+BUILD_INDEX_DB = os.getenv("ci_build_index_db", os.path.join(DATA_DIR, "build_index.db"))
+LOG_SEGMENT_MAX_BYTES = int(os.getenv("ci_log_segment_max_mb", "64")) * 1024 * 1024
+LOG_RETENTION_BYTES = int(os.getenv("ci_log_retention_mb", "2048")) * 1024 * 1024
+LOG_RETENTION_DAYS = float(os.getenv("ci_log_retention_days", "30"))
+
+# Notification emails
+OUTBOX_DB = os.getenv("ci_outbox_db", os.path.join(DATA_DIR, "outbox.db"))
+SMTP_POOL_SIZE = int(os.getenv("ci_smtp_pool_size", "2"))
+SMTP_IDLE_SECONDS = float(os.getenv("ci_smtp_idle_seconds", "60"))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("ci_notify_max_attempts", "6"))
+NOTIFY_BACKOFF_SECONDS = float(os.getenv("ci_notify_backoff_seconds", "5"))
+NOTIFY_DIGEST = os.getenv("ci_notify_digest", "false").lower() == "true"
+NOTIFY_DIGEST_WINDOW = float(os.getenv("ci_notify_digest_window", "900"))
+NOTIFY_URGENT_BRANCHES = [branch.strip() for branch in os.getenv("ci_notify_urgent_branches", "main,master").split(",") if branch.strip()]
+NOTIFY_MAX_LOG_BYTES = int(os.getenv("ci_notify_max_log_kb", "16")) * 1024
+NOTIFY_ATTACH_LOG = os.getenv("ci_notify_attach_log", "true").lower() == "true"
+PUBLIC_URL = os.getenv("ci_public_url", "").rstrip("/")
+
+# Build workspaces
+WORKSPACE_QUOTA_BYTES = int(os.getenv("ci_workspace_quota_mb", "10240")) * 1024 * 1024
+WORKSPACE_GC_INTERVAL = float(os.getenv("ci_workspace_gc_interval", "60"))
+WORKSPACE_POOL_SIZE = int(os.getenv("ci_workspace_pool_size", "1"))
+WORKSPACE_KEEP_CACHES = os.getenv("ci_workspace_keep_caches", "true").lower() == "true"
@@ -0,0 +1,170 @@
+"""
+Environment Cache Module
+
+This module provides the virtual environments tests run in. A build's
+requirements.txt is installed once into a cached virtualenv keyed by the hash
+of the file and the Python version; later builds with the same requirements
+get a copy of the cached environment made of hardlinks, which takes seconds.
+The cache is kept under a disk budget by evicting the least recently used
+environments.
+
+Classes:
+    EnvironmentCache: Cache of virtualenvs keyed by requirements hash
+
+Functions:
+    None (all functionality is encapsulated in the EnvironmentCache class)
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import hashlib
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import logging
+from src import config
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,  # Use logging.DEBUG for more verbosity
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+# File whose modification time records when a cached environment was last used
+LAST_USED_MARKER = ".last_used"
+
+
+def python_path(env_dir):
+    """
+    Returns the Python executable of a virtualenv.
+    """
+    if os.name == "nt":
+        return os.path.join(env_dir, "Scripts", "python.exe")
+    return os.path.join(env_dir, "bin", "python")
+
+
+class EnvironmentCache:
+    def __init__(self, cache_dir=config.ENV_CACHE_DIR, max_bytes=config.ENV_CACHE_MAX_BYTES,
+                 python=config.ENV_PYTHON):
+        """
+        Args:
+            cache_dir (str): Directory holding the cached environments.
+            max_bytes (int): Disk budget of the cache; older environments are evicted above it.
+            python (str): Interpreter the environments are created with.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.python = python
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def environment_key(self, requirements_path):
+        """
+        Returns the cache key of an environment: a hash of the requirements file and the Python version.
+        """
+        digest = hashlib.sha256()
+        with open(requirements_path, "rb") as f:
+            digest.update(f.read())
+        digest.update(f"{self.python}\0{platform.python_version()}".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def materialize(self, requirements_path, target_dir):
+        """
+        Creates a virtualenv with the given requirements (and pytest) at target_dir, from the cache
+        if possible. The copy is made of hardlinks to the cached files where the filesystem allows.
+
+        Args:
+            requirements_path (str): The requirements.txt to install.
+            target_dir (str): Where the build's environment should be created.
+
+        Returns:
+            str: The Python executable of the new environment.
+        """
+        key = self.environment_key(requirements_path)
+        env_dir = os.path.join(self.cache_dir, key)
+
+        with self._lock(key):
+            if os.path.exists(env_dir):
+                logging.info(f"Environment cache hit for {requirements_path} ({key}).")
+            else:
+                logging.info(f"Environment cache miss for {requirements_path} ({key}), installing requirements...")
+                self._build(requirements_path, env_dir)
+
+            with open(os.path.join(env_dir, LAST_USED_MARKER), "w"):
+                pass
+            shutil.copytree(env_dir, target_dir, symlinks=True, copy_function=self._link_or_copy)
+
+        self._evict(keep=key)
+        return python_path(target_dir)
+
+    def _build(self, requirements_path, env_dir):
+        """
+        Creates and fills a cached environment. It is built in a temporary directory and renamed
+        into place, so a failed or concurrent build never leaves a half-installed environment behind.
+        """
+        build_dir = tempfile.mkdtemp(prefix="building_", dir=self.cache_dir)
+        try:
+            subprocess.run([self.python, "-m", "venv", build_dir], check=True, capture_output=True, text=True,
+                           timeout=config.ENV_TIMEOUT)
+            self._install(python_path(build_dir), requirements_path)
+            os.rename(build_dir, env_dir)
+        except subprocess.CalledProcessError as e:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise RuntimeError(f"Creating environment failed: {e.stderr or e}") from e
+        except Exception:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise
+
+    def _install(self, python, requirements_path):
+        subprocess.run(
+            [python, "-m", "pip", "install", "--disable-pip-version-check", "-q", "-r", requirements_path, "pytest"],
+            check=True, capture_output=True, text=True, timeout=config.ENV_TIMEOUT
+        )
+
+    def _link_or_copy(self, source, destination):
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copy2(source, destination)  # Other filesystem, or no hardlink support
+
+    def _lock(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _evict(self, keep=None):
+        """
+        Deletes the least recently used environments until the cache fits its disk budget.
+        """
+        environments = []
+        for key in os.listdir(self.cache_dir):
+            env_dir = os.path.join(self.cache_dir, key)
+            marker = os.path.join(env_dir, LAST_USED_MARKER)
+            if key == keep or not os.path.exists(marker):
+                continue  # In use, or still being built
+            environments.append((os.path.getmtime(marker), self._size(env_dir), key))
+
+        total = sum(size for _, size, _ in environments)
+        if keep is not None and os.path.exists(os.path.join(self.cache_dir, keep)):
+            total += self._size(os.path.join(self.cache_dir, keep))
+
+        for _, size, key in sorted(environments):
+            if total <= self.max_bytes:
+                break
+            with self._lock(key):
+                shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+            total -= size
+            logging.info(f"Evicted cached environment {key} ({size} bytes).")
+
+    def _size(self, path):
+        total = 0
+        for root, _, files in os.walk(path):
+            for file in files:
+                file_path = os.path.join(root, file)
+                if not os.path.islink(file_path):
+                    total += os.path.getsize(file_path)
+        return total
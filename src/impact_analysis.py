@@ -0,0 +1,119 @@
+"""
+Impact Analysis Module
+
+This module finds the tests affected by a change. It builds a graph of the
+imports between the Python files of a checked-out repository and walks it
+backwards from the changed files, so only test files that import a changed
+module, directly or through other modules, are selected. Module names are
+resolved generously (every dotted suffix of a file's path counts as one of
+its names), so the analysis errs on the side of running too many tests.
+
+Functions:
+    module_names: Lists the module names a Python file can be imported as
+    build_import_graph: Maps module names to the files that import them
+    impacted_files: Finds the files that transitively import a set of changed files
+"""
+import ast
+import os
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,  # Use logging.DEBUG for more verbosity
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+
+def module_names(relative_path):
+    """
+    Lists the module names a Python file can be imported as.
+
+    Args:
+        relative_path (str): Path of the file relative to the repository, with "/" separators.
+
+    Returns:
+        list: Every dotted suffix of the module path, e.g. "src/pkg/mod.py" gives
+              "src.pkg.mod", "pkg.mod" and "mod". A package's __init__.py is named after the package.
+    """
+    parts = relative_path[:-len(".py")].split("/")
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return [".".join(parts[i:]) for i in range(len(parts))]
+
+
+def _imported_names(tree, relative_path):
+    """
+    Returns the module names an AST imports, including every parent package of each import.
+    """
+    package = relative_path.split("/")[:-1]
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            targets = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package[:len(package) - node.level + 1] if node.level <= len(package) + 1 else []
+                base = ".".join(base + ([node.module] if node.module else []))
+            else:
+                base = node.module or ""
+            # "from pkg import name" may import the submodule pkg.name
+            targets = [base] + [f"{base}.{alias.name}" if base else alias.name for alias in node.names]
+        else:
+            continue
+
+        for target in targets:
+            parts = target.split(".")
+            for i in range(1, len(parts) + 1):
+                if parts[i - 1]:
+                    names.add(".".join(parts[:i]))
+    return names
+
+
+def build_import_graph(repo_path, file_paths):
+    """
+    Parses Python files and maps every imported module name to the files importing it.
+
+    Args:
+        repo_path (str): Path to the repository.
+        file_paths (list): Paths of the Python files of the repository.
+
+    Returns:
+        dict: Maps module names to sets of importing files, relative to repo_path with "/" separators.
+    """
+    importers = {}
+    for file_path in file_paths:
+        relative_path = os.path.relpath(file_path, repo_path).replace(os.sep, "/")
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                tree = ast.parse(f.read(), file_path)
+        except (SyntaxError, UnicodeDecodeError, ValueError) as e:
+            logging.warning(f"Could not read imports of {relative_path}: {e}")
+            continue
+
+        for name in _imported_names(tree, relative_path):
+            importers.setdefault(name, set()).add(relative_path)
+    return importers
+
+
+def impacted_files(import_graph, changed_paths):
+    """
+    Finds the changed Python files and every file that imports one of them, directly or transitively.
+
+    Args:
+        import_graph (dict): Result of build_import_graph.
+        changed_paths (list): Changed (or deleted) .py files, relative to the repository with "/" separators.
+
+    Returns:
+        set: The changed files and all files depending on them.
+    """
+    impacted = set(changed_paths)
+    pending = list(changed_paths)
+    while pending:
+        path = pending.pop()
+        for name in module_names(path):
+            for importer in import_graph.get(name, ()):
+                if importer not in impacted:
+                    impacted.add(importer)
+                    pending.append(importer)
+    return impacted
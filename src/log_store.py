@@ -0,0 +1,233 @@
+"""
+Log Store Module
+
+This module archives the logs and console output of finished builds in
+compressed segment files. Each segment is a sequence of gzip members, one
+per frame of at most FRAME_BYTES of log. A SQLite index records the segment,
+offset and length of every frame, so one build's log is read back by
+decompressing only its own frames. New frames go to the newest segment until
+it reaches config.LOG_SEGMENT_MAX_BYTES. Whole segments are deleted, oldest
+first, once they are older than config.LOG_RETENTION_DAYS or the store is
+above config.LOG_RETENTION_BYTES.
+
+Classes:
+    LogStore: Compressed, segmented storage of build logs
+
+Functions:
+    None (all functionality is encapsulated in the LogStore class)
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import gzip
+import sqlite3
+import threading
+import time
+import logging
+from src import config
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,  # Use logging.DEBUG for more verbosity
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+# Uncompressed size of a frame, the unit a log is read back in
+FRAME_BYTES = 1024 * 1024
+
+
+class LogStore:
+    def __init__(self, store_dir, segment_max_bytes=None, max_bytes=None, max_age_days=None):
+        """
+        Args:
+            store_dir (str): Directory holding the segments and their index.
+            segment_max_bytes (int): Size at which a new segment is started.
+            max_bytes (int): Total size of the segments kept (0 means no limit).
+            max_age_days (float): Days a segment is kept after its last write (0 means no limit).
+        """
+        self.store_dir = store_dir
+        self.segment_max_bytes = config.LOG_SEGMENT_MAX_BYTES if segment_max_bytes is None else segment_max_bytes
+        self.max_bytes = config.LOG_RETENTION_BYTES if max_bytes is None else max_bytes
+        self.max_age_days = config.LOG_RETENTION_DAYS if max_age_days is None else max_age_days
+        os.makedirs(store_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(store_dir, "index.db"), timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS segments (
+                    id INTEGER PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    last_write_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS frames (
+                    build_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    segment INTEGER NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    raw_length INTEGER NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS frames_by_build ON frames (build_id, name)")
+
+    def append(self, build_id, name, text):
+        """
+        Appends text to a log of a build.
+
+        Args:
+            build_id (str): The build the log belongs to.
+            name (str): Name of the log, such as its file name.
+            text (str): The log text.
+        """
+        data = text.encode("utf-8")
+        self._append(build_id, name, (data[i:i + FRAME_BYTES] for i in range(0, len(data), FRAME_BYTES)))
+
+    def append_file(self, build_id, name, path):
+        """
+        Appends the contents of a file to a log of a build, reading it a frame at a time.
+        """
+        with open(path, "rb") as f:
+            self._append(build_id, name, iter(lambda: f.read(FRAME_BYTES), b""))
+
+    def read(self, build_id, name):
+        """
+        Reads a log of a build back, decompressing only its frames.
+
+        Returns:
+            str: The log text, or None if the store has no such log.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT segment, offset, length FROM frames WHERE build_id = ? AND name = ? ORDER BY rowid",
+                (build_id, name)
+            ).fetchall()
+        if not rows:
+            return None
+
+        parts = []
+        segment_file, segment_id = None, None
+        try:
+            for segment, offset, length in rows:
+                if segment != segment_id:
+                    if segment_file is not None:
+                        segment_file.close()
+                    segment_file, segment_id = open(self._segment_path(segment), "rb"), segment
+                segment_file.seek(offset)
+                parts.append(gzip.decompress(segment_file.read(length)))
+        finally:
+            if segment_file is not None:
+                segment_file.close()
+        return b"".join(parts).decode("utf-8", errors="replace")
+
+    def names(self, build_id):
+        """
+        Returns the names of the logs stored for a build, in the order they were added.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name FROM frames WHERE build_id = ? GROUP BY name ORDER BY MIN(rowid)", (build_id,)
+            ).fetchall()
+        return [name for (name,) in rows]
+
+    def size(self):
+        """
+        Returns the total size of the segments in bytes.
+        """
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM segments").fetchone()[0]
+
+    def enforce_retention(self, expired_builds=None):
+        """
+        Deletes the oldest segments that are past the age limit or above the size limit.
+        The segment being written to is never deleted.
+
+        Args:
+            expired_builds (list): If given, the IDs of the builds whose logs were deleted entirely are added to it.
+
+        Returns:
+            int: The number of segments deleted.
+        """
+        removed = 0
+        touched = set()
+        with self._lock:
+            segments = self._conn.execute("SELECT id, size, last_write_at FROM segments ORDER BY id").fetchall()
+            total = sum(size for _, size, _ in segments)
+            cutoff = time.time() - self.max_age_days * 86400
+
+            for segment_id, size, last_write_at in segments[:-1]:
+                expired = self.max_age_days > 0 and last_write_at < cutoff
+                over_budget = self.max_bytes > 0 and total > self.max_bytes
+                if not expired and not over_budget:
+                    break
+                touched.update(row[0] for row in self._conn.execute(
+                    "SELECT DISTINCT build_id FROM frames WHERE segment = ?", (segment_id,)))
+                with self._conn:
+                    self._conn.execute("DELETE FROM frames WHERE segment = ?", (segment_id,))
+                    self._conn.execute("DELETE FROM segments WHERE id = ?", (segment_id,))
+                try:
+                    os.remove(self._segment_path(segment_id))
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+
+            if expired_builds is not None:
+                # A build's frames can span segments, only those with none left are gone
+                expired_builds.extend(sorted(
+                    build_id for build_id in touched
+                    if self._conn.execute("SELECT 1 FROM frames WHERE build_id = ? LIMIT 1", (build_id,)).fetchone() is None
+                ))
+
+        if removed:
+            logging.info(f"Deleted {removed} log segment(s), {total} bytes of logs kept.")
+        return removed
+
+    def _append(self, build_id, name, chunks):
+        """
+        Compresses each chunk into a frame at the end of the newest segment, starting a new
+        segment when it is full.
+        """
+        with self._lock:
+            segment_id = self._current_segment()
+            segment_file = open(self._segment_path(segment_id), "ab")
+            try:
+                for chunk in chunks:
+                    # The file position, not the indexed size, so bytes of an interrupted append are skipped
+                    offset = segment_file.tell()
+                    if offset >= self.segment_max_bytes:
+                        segment_file.close()
+                        segment_id = self._new_segment()
+                        segment_file = open(self._segment_path(segment_id), "ab")
+                        offset = 0
+                    frame = gzip.compress(chunk)
+                    segment_file.write(frame)
+                    segment_file.flush()
+                    with self._conn:
+                        self._conn.execute(
+                            "INSERT INTO frames (build_id, name, segment, offset, length, raw_length) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            (build_id, name, segment_id, offset, len(frame), len(chunk))
+                        )
+                        self._conn.execute("UPDATE segments SET size = ?, last_write_at = ? WHERE id = ?",
+                                           (offset + len(frame), time.time(), segment_id))
+            finally:
+                segment_file.close()
+
+    def _current_segment(self):
+        """
+        Returns the ID of the segment to write to. Must be called with the lock held.
+        """
+        row = self._conn.execute("SELECT id FROM segments ORDER BY id DESC LIMIT 1").fetchone()
+        return self._new_segment() if row is None else row[0]
+
+    def _new_segment(self):
+        with self._conn:
+            return self._conn.execute("INSERT INTO segments (size, last_write_at) VALUES (0, ?)",
+                                      (time.time(),)).lastrowid
+
+    def _segment_path(self, segment_id):
+        return os.path.join(self.store_dir, f"segment_{segment_id:06d}.gz")
@@ -3,34 +3,346 @@ Build Logger Module
 
 This module provides logging functionality for CI build processes,
 creating timestamped logs for each build stage in a dedicated log directory.
+The raw console output of long-running stages is streamed to separate
+per-build output files next to the logs.
+
+Build threads never write log files themselves: records are put on a queue
+and a single writer thread appends them in batches, every
+config.LOG_FLUSH_INTERVAL seconds or as soon as config.LOG_BUFFER_RECORDS
+records are waiting. The writer keeps up to config.LOG_MAX_OPEN_FILES log
+files open, closing the least recently used. Pending records are written
+when the process exits. The writer also feeds every record to the
+full-text build index (src/build_index.py), which GET /search queries,
+and removes the builds whose archived logs expired from it.
+Once a build is finished, its log and output files
+are moved into the compressed log store under logs/archive.
 
 Classes:
     BuildLogger: Handles logging of build events and results
+    LogWriter: Background thread appending queued records to log files
 
 Functions:
-    None (all functionality is encapsulated in the BuildLogger class)
+    None (all functionality is encapsulated in the classes)
 """
 from datetime import datetime
 import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import atexit
+import collections
+import glob
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from src import config
+from src.build_index import BuildIndex
+from src.log_store import LogStore
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,  # Use logging.DEBUG for more verbosity
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+_STOP = object()
+
+
+class _CloseFile:
+    # Queued to make the writer close a log file that is about to be moved
+    def __init__(self, path):
+        self.path = path
+        self.done = threading.Event()
+
+
+class _RemoveBuilds:
+    # Queued to make the writer remove expired builds from the index, off the build threads
+    def __init__(self, build_ids):
+        self.build_ids = build_ids
+
+
+_shared_writer = None
+_shared_writer_lock = threading.Lock()
+
+
+class LogWriter:
+    def __init__(self, flush_interval=None, buffer_records=None, max_open_files=None, index=None):
+        """
+        Args:
+            flush_interval (float): Seconds a record may wait before it is written.
+            buffer_records (int): Number of waiting records that triggers a write straight away.
+            max_open_files (int): Number of log files kept open at once.
+            index (BuildIndex): Full-text index the records are added to, or None.
+        """
+        self.flush_interval = config.LOG_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.buffer_records = config.LOG_BUFFER_RECORDS if buffer_records is None else buffer_records
+        self.max_open_files = max(1, config.LOG_MAX_OPEN_FILES if max_open_files is None else max_open_files)
+        self.index = index
+        self._queue = queue.Queue()
+        self._files = collections.OrderedDict()  # Open log files, least recently used first
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def write(self, path, text, record=None):
+        """
+        Queues text to be appended to a file, and a record to be indexed. Never blocks on file I/O.
+
+        Args:
+            path (str): The log file.
+            text (str): Text appended to the file.
+            record (tuple): Build ID, stage, status, details and time of the record for the index, or None.
+        """
+        self._ensure_started()
+        self._queue.put((path, text, record))
+
+    def flush(self, timeout=None):
+        """
+        Waits until everything queued so far has been written to the log files.
+
+        Returns:
+            bool: False if the writer did not get there within timeout seconds.
+        """
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close_file(self, path, timeout=None):
+        """
+        Writes everything queued so far and closes the file at path, if the writer has it open.
+        """
+        if self._thread is None:
+            return True
+        request = _CloseFile(path)
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    def remove_builds(self, build_ids):
+        """
+        Queues the removal of builds and their records from the index. Never blocks on the index.
+        """
+        if self.index is None or not build_ids:
+            return
+        self._ensure_started()
+        self._queue.put(_RemoveBuilds(build_ids))
+
+    def close(self):
+        """
+        Writes everything still queued, closes the log files and stops the writer thread.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="build-log-writer")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _run(self):
+        pending = collections.defaultdict(list)
+        records = []
+        count = 0
+        next_write = time.monotonic() + self.flush_interval
+
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, next_write - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, tuple):
+                path, text, record = item
+                pending[path].append(text)
+                if record is not None:
+                    records.append(record)
+                count += 1
+                if count < self.buffer_records and time.monotonic() < next_write:
+                    continue
+
+            self._write_pending(pending, records)
+            count = 0
+            next_write = time.monotonic() + self.flush_interval
+
+            if isinstance(item, threading.Event):
+                item.set()
+            elif isinstance(item, _CloseFile):
+                f = self._files.pop(item.path, None)
+                if f is not None:
+                    f.close()
+                item.done.set()
+            elif isinstance(item, _RemoveBuilds):
+                try:
+                    self.index.remove_builds(item.build_ids)
+                except sqlite3.Error as e:
+                    logging.error(f"Could not remove {len(item.build_ids)} expired build(s) from the index: {e}")
+            elif item is _STOP:
+                for f in self._files.values():
+                    f.close()
+                self._files.clear()
+                return
+
+    def _write_pending(self, pending, records):
+        """
+        Appends the pending records to their files, one write and flush per file, and adds
+        them to the index in one transaction.
+        """
+        for path, texts in pending.items():
+            try:
+                f = self._open(path)
+                f.write("".join(texts))
+                f.flush()
+            except OSError as e:
+                logging.error(f"Could not write build log {path}: {e}")
+        pending.clear()
+
+        if self.index is not None and records:
+            try:
+                self.index.add_records(records)
+            except sqlite3.Error as e:
+                logging.error(f"Could not index {len(records)} build log record(s): {e}")
+        records.clear()
+
+    def _open(self, path):
+        f = self._files.pop(path, None)
+        if f is None:
+            if len(self._files) >= self.max_open_files:
+                _, oldest = self._files.popitem(last=False)
+                oldest.close()
+            f = open(path, 'a')
+        self._files[path] = f
+        return f
+
+
+def _get_shared_writer():
+    """
+    Returns the log writer shared by every BuildLogger of the process, so one thread owns all log files.
+    """
+    global _shared_writer
+    with _shared_writer_lock:
+        if _shared_writer is None:
+            _shared_writer = LogWriter(index=BuildIndex(config.BUILD_INDEX_DB) if config.BUILD_INDEX_DB else None)
+            atexit.register(_shared_writer.close)
+        return _shared_writer
+
 
 class BuildLogger:
-    def __init__(self, log_dir='logs'):
+    def __init__(self, log_dir='logs', writer=None):
         self.log_dir = log_dir
+        self.writer = writer or _get_shared_writer()
         os.makedirs(log_dir, exist_ok=True)
-        
+        self.store = LogStore(os.path.join(log_dir, 'archive'))
+
     def log_build_result(self, build_id, stage, status, details):
         """
-        Log build results to a new file in the "logs" folder.
-        
+        Log build results to a new file in the "logs" folder. The record is queued and
+        written by the log writer thread.
+
         Args:
             build_id (str): Unique identifier for the build
             stage (str): Pipeline stage (e.g., 'syntax_check', 'tests')
             status (str): Status of the stage ('success', 'failure')
             details (str): Additional information about the stage result
         """
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        now = datetime.now()
+        timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
+        log_file = os.path.join(self.log_dir, f'build_{build_id}.log')
+
+        self.writer.write(log_file, f'[{timestamp}] {stage}: {status}\nDetails: {details}\n\n',
+                          (build_id, stage, status, str(details), now.timestamp()))
+
+    def start_build(self, build_id, repo_url, branch_name, commit_id):
+        """
+        Records which repository, branch and commit a build is for, so searches can filter on them.
+
+        Args:
+            build_id (str): Unique identifier for the build
+            repo_url (str): The repository being built
+            branch_name (str): The pushed branch
+            commit_id (str): The pushed commit
+        """
+        if self.writer.index is not None:
+            self.writer.index.add_build(build_id, repo_url, branch_name, commit_id)
+
+    def search(self, text, **filters):
+        """
+        Searches the log records of all builds, see BuildIndex.search for the filters.
+
+        Returns:
+            list: The matching records, newest first, or an empty list if the index is disabled.
+        """
+        if self.writer.index is None:
+            return []
+        self.flush()
+        return self.writer.index.search(text, **filters)
+
+    def flush(self, timeout=None):
+        """
+        Waits until every record logged so far is in the log files.
+        """
+        return self.writer.flush(timeout)
+
+    def output_path(self, build_id, stage):
+        """
+        Returns the file the console output of a build stage is streamed to.
+
+        Args:
+            build_id (str): Unique identifier for the build
+            stage (str): Pipeline stage (e.g., 'tests')
+        """
+        return os.path.join(self.log_dir, f'build_{build_id}_{stage}.out')
+
+    def archive_build(self, build_id):
+        """
+        Moves the log and output files of a finished build into the compressed log store,
+        then deletes the oldest archived logs beyond the retention limits, and removes
+        the builds whose logs are gone from the search index.
+
+        Args:
+            build_id (str): Unique identifier for the build
+        """
         log_file = os.path.join(self.log_dir, f'build_{build_id}.log')
-        
-        with open(log_file, 'a') as f:
-            f.write(f'[{timestamp}] {stage}: {status}\n')
-            f.write(f'Details: {details}\n\n')
\ No newline at end of file
+        self.writer.close_file(log_file)
+
+        for path in [log_file] + sorted(glob.glob(os.path.join(self.log_dir, f'build_{glob.escape(build_id)}_*.out'))):
+            if not os.path.exists(path):
+                continue
+            try:
+                self.store.append_file(build_id, os.path.basename(path), path)
+                os.remove(path)
+            except OSError as e:
+                logging.error(f"[Build {build_id}] Could not archive {path}: {e}")
+
+        expired_builds = []
+        self.store.enforce_retention(expired_builds)
+        self.writer.remove_builds(expired_builds)
+
+    def read_log(self, build_id, stage=None):
+        """
+        Reads the log of a build, or the console output of one of its stages, whether or not
+        the build has been archived yet.
+
+        Args:
+            build_id (str): Unique identifier for the build
+            stage (str): Pipeline stage whose output to read, or None for the build log
+
+        Returns:
+            str: The log text, or None if there is no such log.
+        """
+        if stage is None:
+            path = os.path.join(self.log_dir, f'build_{build_id}.log')
+            self.flush()
+        else:
+            path = self.output_path(build_id, stage)
+
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                return f.read()
+        return self.store.read(build_id, os.path.basename(path))
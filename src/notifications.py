@@ -5,8 +5,31 @@ This module handles email notifications for CI build results,
 supporting SMTP-based email delivery with configurable settings
 loaded from environment variables.
 
+Build threads do not talk to the mail server. Notifications are stored in
+a persistent SQLite outbox and sent by the NotificationDispatcher's worker
+threads over a small pool of reused, logged-in SMTP connections. Failed
+sends are retried with exponential backoff, and emails still in the outbox
+are sent after a restart.
+
+In digest mode (config.NOTIFY_DIGEST) build results are held per recipient
+for config.NOTIFY_DIGEST_WINDOW seconds after the first one, then sent as a
+single email listing the failures first. Failures on the branches in
+config.NOTIFY_URGENT_BRANCHES are still sent straight away.
+
+Build logs in emails are cut down to config.NOTIFY_MAX_LOG_BYTES, keeping
+the failing tests and their causes. The full log is then attached as a gzip
+file and, if config.PUBLIC_URL is set, linked on the server's log endpoint.
+
+Classes:
+    SMTPConnectionPool: Reuses logged-in SMTP connections between emails
+    NotificationDispatcher: Persistent outbox sending emails in the background
+
 Functions:
-    send_email_notification: Sends build status notifications via email
+    build_email: Builds the notification email for a build result
+    build_digest_email: Builds one email summarizing several build results
+    is_failure: Tells whether a build status is a failure
+    summarize_log: Cuts a build log down to its failures within a size limit
+    send_email_notification: Sends build status notifications via email, synchronously
 
 Environment Variables Required:
     smtp_server: SMTP server hostname
@@ -15,11 +38,18 @@ Environment Variables Required:
 """
 import smtplib
 import os
+from email.mime.application import MIMEApplication
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import gzip
+import sqlite3
+import threading
+import time
 import logging
 from dotenv import load_dotenv
+from src import config
 
 # Configure logging
 logging.basicConfig(
@@ -36,14 +66,75 @@ port = 587
 sender = os.getenv("smtp_sender")
 pwd = os.getenv("smtp_pwd")
 
-def send_email_notification(build_id, commit_id, receiver, build_status, log_output, user, branch):
+# Longest wait between two attempts to send an email
+MAX_BACKOFF_SECONDS = 3600
+
+# A full log compressing to more than this is linked but not attached
+MAX_ATTACHMENT_BYTES = 1024 * 1024
+# Longest line kept in a cut-down log, enough for the first line of a traceback
+MAX_SUMMARY_LINE_CHARS = 500
+# Lines kept first when a log is cut down: counts, failing tests and their causes
+SUMMARY_PREFIXES = ("FAILED", "ERROR", "Error cause", "FLAKY", "First failure", "Resource limit hit",
+                    "Syntax error", "pytest exited", "Test execution error")
+
+
+def _log_text(log_output):
+    # The syntax check reports a list of errors, the other stages a string
+    return "\n".join(map(str, log_output)) if isinstance(log_output, (list, tuple)) else str(log_output)
+
+
+def summarize_log(log_output, max_bytes=None):
     """
-    Sends an email notification about the CI build result.
+    Cuts a build log down to at most max_bytes. The first line, with the test counts, and the
+    lines naming failures and their causes are kept first, then as many other lines as fit.
+    Long lines are shortened. Kept lines stay in their original order.
 
-    param commit_id (str): The Git commit hash being tested
-    param build_status (str): "Success" or "Failure"
-    param log_output (str): Log output from the build/test process
+    Args:
+        log_output (str or list): The build log, or the list of syntax errors.
+        max_bytes (int): Size limit of the result, by default config.NOTIFY_MAX_LOG_BYTES.
+
+    Returns:
+        tuple: The log text, and whether it was cut down.
+    """
+    max_bytes = config.NOTIFY_MAX_LOG_BYTES if max_bytes is None else max_bytes
+    text = _log_text(log_output)
+    if len(text.encode("utf-8")) <= max_bytes:
+        return text, False
+
+    lines = [line if len(line) <= MAX_SUMMARY_LINE_CHARS else line[:MAX_SUMMARY_LINE_CHARS] + "..."
+             for line in text.split("\n")]
+    important = [0] + [i for i in range(1, len(lines)) if lines[i].lstrip().startswith(SUMMARY_PREFIXES)]
+    others = sorted(set(range(len(lines))) - set(important))
+
+    kept, size = [], 0
+    for i in important + others:
+        line_bytes = len(lines[i].encode("utf-8")) + 1
+        if size + line_bytes > max_bytes:
+            break
+        kept.append(i)
+        size += line_bytes
+
+    summary = [lines[i] for i in sorted(kept)]
+    summary.append(f"... {len(lines) - len(kept)} more line(s) not shown, see the full log.")
+    return "\n".join(summary), True
+
+
+def _log_link(build_id):
+    return f"{config.PUBLIC_URL}/logs/{build_id}" if config.PUBLIC_URL else None
+
+
+def build_email(build_id, commit_id, receiver, build_status, log_output, user, branch):
+    """
+    Builds the notification email about a CI build result. A log above the size limit is
+    cut down, with the full log attached gzip-compressed and linked on the server.
+
+    Returns:
+        MIMEMultipart: The email, with its From, To and Subject headers set.
     """
+    log_summary, truncated = summarize_log(log_output)
+    link = _log_link(build_id)
+    link_line = f"Full logs: {link} (test output: {link}?stage=tests)" if link else ""
+
     subject = f"CI Build: {build_status}, Commit: {commit_id[:7]}"
     message = f"""
     The CI build for commit {commit_id} {build_status}.
@@ -51,20 +142,85 @@ def send_email_notification(build_id, commit_id, receiver, build_status, log_out
     Made by user: {user}, on branch: {branch}.
 
     Build id: {build_id}
-
+    {link_line}
     Build logs:
-    {log_output}
+    {log_summary}
+    """
+
+    msg = MIMEMultipart()
+    msg["From"] = sender
+    msg["To"] = receiver
+    msg["Subject"] = subject
+    msg.attach(MIMEText(message, "plain"))
+
+    if truncated and config.NOTIFY_ATTACH_LOG:
+        text = _log_text(log_output)
+        compressed = gzip.compress(text.encode("utf-8"))
+        if len(compressed) <= MAX_ATTACHMENT_BYTES:
+            attachment = MIMEApplication(compressed, "gzip")
+            attachment.add_header("Content-Disposition", "attachment", filename=f"build_{build_id}.log.gz")
+            msg.attach(attachment)
+    return msg
+
+
+def build_digest_email(receiver, builds):
+    """
+    Builds the digest email summarizing several build results for one recipient.
+
+    Args:
+        receiver (str): The recipient.
+        builds (list): Dicts with the "build_id", "commit_id", "build_status", "log_output", "user"
+                       and "branch" of each build, oldest first.
+
+    Returns:
+        MIMEMultipart: The email, with its From, To and Subject headers set.
     """
+    # Failures first, each group oldest first
+    ordered = sorted(builds, key=lambda build: not is_failure(build["build_status"]))
+    failures = sum(1 for build in builds if is_failure(build["build_status"]))
+
+    subject = f"CI Digest: {len(builds)} build(s), {failures} failed"
+    lines = [f"Results of your {len(builds)} latest CI build(s):", ""]
+    for build in ordered:
+        lines.append(f"- {build['build_status']}: commit {build['commit_id'][:7]} on branch {build['branch']} "
+                     f"(build id: {build['build_id']})")
+    for build in ordered:
+        if is_failure(build["build_status"]):
+            # The failures share the log size limit of a single email
+            log_summary, _ = summarize_log(build["log_output"], config.NOTIFY_MAX_LOG_BYTES // failures)
+            link = _log_link(build["build_id"])
+            lines.extend(["", f"Build logs of commit {build['commit_id'][:7]} on branch {build['branch']}"
+                          + (f" (full logs: {link})" if link else "") + ":", log_summary])
 
+    msg = MIMEMultipart()
+    msg["From"] = sender
+    msg["To"] = receiver
+    msg["Subject"] = subject
+    msg.attach(MIMEText("\n".join(lines) + "\n", "plain"))
+    return msg
+
+
+def is_failure(build_status):
+    """
+    Returns whether a build status reported by the CI server means the build did not pass.
+    """
+    return str(build_status).lower() not in ("succeeded", "success")
+
+
+def send_email_notification(build_id, commit_id, receiver, build_status, log_output, user, branch):
+    """
+    Sends an email notification about the CI build result over a new SMTP connection.
+    The CI server queues its notifications on a NotificationDispatcher instead.
+
+    param commit_id (str): The Git commit hash being tested
+    param build_status (str): "Success" or "Failure"
+    param log_output (str): Log output from the build/test process
+    """
     try:
 
         logging.info(f"Preparing email notification for commit {commit_id[:7]} ({build_status}) to {receiver}...")
 
-        msg = MIMEMultipart()
-        msg["From"] = sender
-        msg["To"] = receiver
-        msg["Subject"] = subject
-        msg.attach(MIMEText(message, "plain"))
+        msg = build_email(build_id, commit_id, receiver, build_status, log_output, user, branch)
 
         logging.info("Connecting to SMTP server...")
 
@@ -76,7 +232,402 @@ def send_email_notification(build_id, commit_id, receiver, build_status, log_out
         mail_server.quit()
         logging.info(f"Email successfully sent to {receiver} for commit {commit_id[:7]} ({build_status}).")
 
-        
+
 
     except Exception as e:
-        logging.error(f"Failed to send email for commit {commit_id[:7]}: {e}")
\ No newline at end of file
+        logging.error(f"Failed to send email for commit {commit_id[:7]}: {e}")
+
+
+class SMTPConnectionPool:
+    def __init__(self, host=None, port=port, user=None, password=None, size=config.SMTP_POOL_SIZE,
+                 idle_seconds=config.SMTP_IDLE_SECONDS, use_tls=True):
+        """
+        Args:
+            host (str): SMTP server hostname, by default the smtp_server environment variable.
+            port (int): SMTP server port.
+            user (str): Login name, by default the smtp_sender environment variable.
+            password (str): Login password, by default the smtp_pwd environment variable. No login without one.
+            size (int): Number of connections kept open.
+            idle_seconds (float): Seconds an idle connection is reused for before it is replaced.
+            use_tls (bool): Whether connections are upgraded with STARTTLS.
+        """
+        self.host = host or smtp_server
+        self.port = port
+        self.user = user or sender
+        self.password = pwd if password is None else password
+        self.size = max(1, int(size))
+        self.idle_seconds = idle_seconds
+        self.use_tls = use_tls
+        self._idle = []  # (connection, time it was released)
+        self._lock = threading.Lock()
+        self.connects = 0
+
+    def send(self, from_addr, to_addrs, message):
+        """
+        Sends an email over a pooled connection. A connection that fails is closed rather than
+        returned to the pool.
+
+        Raises:
+            smtplib.SMTPException, OSError: If the email could not be sent.
+        """
+        connection, reused = self._acquire()
+        try:
+            connection.sendmail(from_addr, to_addrs, message)
+        except smtplib.SMTPServerDisconnected:
+            self._discard(connection)
+            if not reused:
+                raise
+            # The server closed the idle connection, try once more on a new one
+            connection = self._connect()
+            try:
+                connection.sendmail(from_addr, to_addrs, message)
+            except Exception:
+                self._discard(connection)
+                raise
+        except smtplib.SMTPRecipientsRefused:
+            self._release(connection)  # The connection itself is fine
+            raise
+        except Exception:
+            self._discard(connection)
+            raise
+        self._release(connection)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._discard(connection, quit=True)
+
+    def _acquire(self):
+        """
+        Returns a connection and whether it was reused from the pool.
+        """
+        stale = []
+        connection = None
+        with self._lock:
+            while self._idle and connection is None:
+                candidate, released_at = self._idle.pop()
+                if time.monotonic() - released_at < self.idle_seconds:
+                    connection = candidate
+                else:
+                    stale.append(candidate)
+        for candidate in stale:
+            self._discard(candidate, quit=True)
+        if connection is not None:
+            return connection, True
+        return self._connect(), False
+
+    def _release(self, connection):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((connection, time.monotonic()))
+                return
+        self._discard(connection, quit=True)
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=60)
+        try:
+            if self.use_tls:
+                connection.starttls()
+            if self.password:
+                connection.login(self.user, self.password)
+        except Exception:
+            self._discard(connection)
+            raise
+        self.connects += 1
+        logging.info(f"Opened SMTP connection to {self.host}:{self.port}.")
+        return connection
+
+    def _discard(self, connection, quit=False):
+        try:
+            if quit:
+                connection.quit()
+            else:
+                connection.close()
+        except Exception:
+            pass
+
+
+class NotificationDispatcher:
+    def __init__(self, pool=None, db_path=config.OUTBOX_DB, workers=None, max_attempts=config.NOTIFY_MAX_ATTEMPTS,
+                 backoff_seconds=config.NOTIFY_BACKOFF_SECONDS, digest=config.NOTIFY_DIGEST,
+                 digest_window=config.NOTIFY_DIGEST_WINDOW, urgent_branches=config.NOTIFY_URGENT_BRANCHES):
+        """
+        Args:
+            pool (SMTPConnectionPool): Connections emails are sent over.
+            db_path (str): Path to the SQLite database holding the outbox.
+            workers (int): Number of emails sent at the same time, by default the pool size.
+            max_attempts (int): Times sending an email is tried before it is marked failed.
+            backoff_seconds (float): Wait before the first retry, doubled for every further retry.
+            digest (bool): Whether build results are sent as per-recipient digests.
+            digest_window (float): Seconds a digest collects results for after its first one.
+            urgent_branches (list): Branches whose failures bypass the digest.
+        """
+        self.pool = pool or SMTPConnectionPool()
+        self.db_path = db_path
+        self.workers = max(1, int(workers or self.pool.size))
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff_seconds = backoff_seconds
+        self.digest = digest
+        self.digest_window = digest_window
+        self.urgent_branches = set(urgent_branches)
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._threads = []
+
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sender TEXT,
+                    receiver TEXT NOT NULL,
+                    subject TEXT,
+                    message TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    sent_at REAL,
+                    send_seconds REAL,
+                    last_error TEXT
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, next_attempt_at)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS digest_items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    receiver TEXT NOT NULL,
+                    build_id TEXT NOT NULL,
+                    commit_id TEXT NOT NULL,
+                    build_status TEXT NOT NULL,
+                    log_output TEXT,
+                    user TEXT,
+                    branch TEXT,
+                    added_at REAL NOT NULL
+                )
+            """)
+
+    def start(self):
+        """
+        Starts the sender threads. Emails left in the outbox from a previous run are sent first,
+        and emails that were being sent when the server stopped are sent again, so only the process
+        serving the notifications may start the dispatcher.
+        """
+        if self._threads:
+            return
+
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending'")
+
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"ci-notifier-{i}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """
+        Stops the sender threads after their current email and closes the SMTP connections.
+        Unsent emails stay in the outbox.
+        """
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self.pool.close()
+
+    def notify(self, build_id, commit_id, receiver, build_status, log_output, user, branch):
+        """
+        Queues the notification email about a build result, or adds the result to the recipient's
+        digest in digest mode. Returns without waiting for the mail server.
+
+        Returns:
+            int: The outbox id of the email, or None if the result went into a digest or there is no receiver.
+        """
+        if not receiver:
+            logging.warning(f"No email address for {user}, not notifying about build {build_id}.")
+            return None
+
+        urgent = is_failure(build_status) and branch in self.urgent_branches
+        if self.digest and not urgent:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT INTO digest_items (receiver, build_id, commit_id, build_status, log_output, user, branch, "
+                    "added_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (receiver, build_id, commit_id, str(build_status), _log_text(log_output), user, branch, time.time())
+                )
+            logging.info(f"Added build {build_id} ({build_status}) to the digest for {receiver}.")
+            return None
+
+        msg = build_email(build_id, commit_id, receiver, build_status, log_output, user, branch)
+        return self.enqueue(msg["From"], receiver, msg["Subject"], msg.as_string())
+
+    def enqueue(self, from_addr, receiver, subject, message):
+        """
+        Adds an email to the outbox.
+
+        Returns:
+            int: The outbox id of the email.
+        """
+        with self._wakeup:
+            with self._conn:
+                email_id = self._insert_email(from_addr, receiver, subject, message)
+            self._wakeup.notify()
+        return email_id
+
+    def flush_digests(self, force=False):
+        """
+        Moves the digests whose window has closed, or all of them if force is set, into the outbox.
+
+        Returns:
+            int: The number of digest emails queued.
+        """
+        with self._wakeup:
+            queued = self._queue_due_digests(force)
+            if queued:
+                self._wakeup.notify_all()
+        return queued
+
+    def _insert_email(self, from_addr, receiver, subject, message):
+        """
+        Adds an email to the outbox. Must be called with the lock held, inside a transaction.
+        """
+        now = time.time()
+        cursor = self._conn.execute(
+            "INSERT INTO outbox (sender, receiver, subject, message, status, next_attempt_at, enqueued_at) "
+            "VALUES (?, ?, ?, ?, 'pending', ?, ?)",
+            (from_addr, receiver, subject, message, now, now)
+        )
+
+        logging.info(f"Queued email {cursor.lastrowid} to {receiver}: {subject}")
+        return cursor.lastrowid
+
+    def _queue_due_digests(self, force=False):
+        """
+        Turns the digests whose window has closed into outbox emails, in the same transaction that
+        removes their results. Must be called with the lock held.
+        """
+        cutoff = time.time() - (0 if force else self.digest_window)
+        receivers = [row[0] for row in self._conn.execute(
+            "SELECT receiver FROM digest_items GROUP BY receiver HAVING MIN(added_at) <= ?", (cutoff,)
+        ).fetchall()]
+
+        for receiver in receivers:
+            rows = self._conn.execute(
+                "SELECT id, build_id, commit_id, build_status, log_output, user, branch FROM digest_items "
+                "WHERE receiver = ? ORDER BY id", (receiver,)
+            ).fetchall()
+            builds = [dict(zip(("build_id", "commit_id", "build_status", "log_output", "user", "branch"), row[1:]))
+                      for row in rows]
+            msg = build_digest_email(receiver, builds)
+            with self._conn:
+                self._insert_email(msg["From"], receiver, msg["Subject"], msg.as_string())
+                self._conn.execute("DELETE FROM digest_items WHERE receiver = ? AND id <= ?", (receiver, rows[-1][0]))
+        return len(receivers)
+
+    def stats(self):
+        """
+        Reports the state of the outbox and the send latency.
+
+        Returns:
+            dict: Number of pending, sent and failed emails, of build results waiting in digests,
+                  the number of SMTP connections opened,
+                  and the average and maximum SMTP send time and delivery delay (from queueing to
+                  sent) of the last 100 sent emails (in seconds).
+        """
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            in_digests = self._conn.execute("SELECT COUNT(*) FROM digest_items").fetchone()[0]
+            send_avg, send_max, delay_avg, delay_max = self._conn.execute(
+                "SELECT AVG(send_seconds), MAX(send_seconds), AVG(sent_at - enqueued_at), MAX(sent_at - enqueued_at) "
+                "FROM (SELECT * FROM outbox WHERE status = 'sent' ORDER BY sent_at DESC LIMIT 100)"
+            ).fetchone()
+
+        return {
+            "pending": counts.get("pending", 0) + counts.get("sending", 0),
+            "sent": counts.get("sent", 0),
+            "failed": counts.get("failed", 0),
+            "results_in_digests": in_digests,
+            "smtp_connections_opened": self.pool.connects,
+            "avg_send_seconds": round(send_avg or 0.0, 3),
+            "max_send_seconds": round(send_max or 0.0, 3),
+            "avg_delivery_seconds": round(delay_avg or 0.0, 3),
+            "max_delivery_seconds": round(delay_max or 0.0, 3)
+        }
+
+    def _claim_next(self):
+        """
+        Marks the oldest email that is due as being sent and returns it, or returns the seconds
+        until the next one is due (None if the outbox is empty). Must be called with the lock held.
+        """
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT id, sender, receiver, subject, message, attempts, next_attempt_at FROM outbox "
+            "WHERE status = 'pending' ORDER BY next_attempt_at, id LIMIT 1"
+        ).fetchone()
+        if row is None:
+            return None
+        if row[6] > now:
+            return row[6] - now
+
+        with self._conn:
+            self._conn.execute("UPDATE outbox SET status = 'sending' WHERE id = ?", (row[0],))
+        return dict(zip(("id", "sender", "receiver", "subject", "message", "attempts"), row[:6]))
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            with self._wakeup:
+                if self.digest:
+                    self._queue_due_digests()
+                email = self._claim_next()
+                if not isinstance(email, dict):
+                    self._wakeup.wait(timeout=min(email, 1.0) if email is not None else 1.0)
+                    continue
+
+            self._send(email)
+
+    def _send(self, email):
+        start = time.monotonic()
+        try:
+            self.pool.send(email["sender"], email["receiver"], email["message"])
+        except Exception as e:
+            self._failed(email, e)
+            return
+
+        elapsed = time.monotonic() - start
+        with self._lock, self._conn:
+            # The body is dropped once sent, so the outbox does not keep every build log
+            self._conn.execute(
+                "UPDATE outbox SET status = 'sent', attempts = attempts + 1, sent_at = ?, send_seconds = ?, "
+                "message = '' WHERE id = ?",
+                (time.time(), elapsed, email["id"])
+            )
+        logging.info(f"Email {email['id']} sent to {email['receiver']} in {elapsed:.2f}s: {email['subject']}")
+
+    def _failed(self, email, error):
+        attempts = email["attempts"] + 1
+        # A refused recipient is refused again on every retry
+        if attempts >= self.max_attempts or isinstance(error, smtplib.SMTPRecipientsRefused):
+            status, next_attempt_at = "failed", time.time()
+            logging.error(f"Giving up on email {email['id']} to {email['receiver']} after {attempts} attempt(s): {error}")
+        else:
+            delay = min(self.backoff_seconds * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+            status, next_attempt_at = "pending", time.time() + delay
+            logging.warning(f"Sending email {email['id']} to {email['receiver']} failed, retrying in {delay:.0f}s: {error}")
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (status, attempts, next_attempt_at, str(error), email["id"])
+            )
@@ -0,0 +1,123 @@
+"""
+Path Rules Module
+
+This module decides, from the files a push changed, whether a build is needed
+and which of its stages should run. The changed paths come from the
+commits[].added/modified/removed lists of the GitHub push payload, so the
+decision is made in the webhook handler before any git I/O. Each repository
+can have its own rules in the JSON file config.PATH_RULES_FILE, keyed by
+clone URL, with "*" for every other repository:
+
+    {"*": {"skip": ["docs/**", "*.md"],
+           "stages": {"tests": ["*.py", "requirements*.txt", "pytest.ini"]}}}
+
+A push changing only paths that match "skip" is not built. A stage listed
+under "stages" only runs if a changed path matches one of its globs; stages
+not listed always run. Repositories without rules skip pushes that only
+change config.SKIP_BUILD_GLOBS. Globs are matched with fnmatch, where "*"
+also matches "/". When the payload does not list every changed path, the
+full build runs.
+
+Functions:
+    changed_paths: Collects the paths changed by a push from its payload
+    load_path_rules: Reads the per-repository path rules
+    plan_build: Picks the stages a push needs, or none
+"""
+import fnmatch
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import logging
+from src import config
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,  # Use logging.DEBUG for more verbosity
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+STAGES = ("syntax_check", "tests")
+
+# GitHub lists at most this many commits in a push payload
+MAX_PAYLOAD_COMMITS = 20
+
+
+def changed_paths(payload):
+    """
+    Collects the paths changed by a push from its payload.
+
+    Args:
+        payload (dict): The GitHub push event.
+
+    Returns:
+        set: The added, modified and removed paths of every commit, or None if the payload
+             may not list them all (no commits, or as many commits as GitHub lists at most).
+    """
+    commits = payload.get("commits") or []
+    if not commits or len(commits) >= MAX_PAYLOAD_COMMITS:
+        return None
+
+    paths = set()
+    for commit in commits:
+        for key in ("added", "modified", "removed"):
+            paths.update(commit.get(key) or [])
+    return paths or None
+
+
+def load_path_rules(path=config.PATH_RULES_FILE):
+    """
+    Reads the per-repository path rules.
+
+    Args:
+        path (str): The JSON rules file, see the module docstring.
+
+    Returns:
+        dict: Rules keyed by clone URL. Empty if the file is not set, missing or invalid.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            rules = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.error(f"Could not read path rules from {path}, building every push in full: {e}")
+        return {}
+    if not isinstance(rules, dict):
+        logging.error(f"Path rules in {path} must be a JSON object, building every push in full.")
+        return {}
+    return rules
+
+
+def _matches(path, globs):
+    return any(fnmatch.fnmatchcase(path, glob) for glob in globs)
+
+
+def plan_build(repo_url, paths, rules=None):
+    """
+    Picks the stages a push needs.
+
+    Args:
+        repo_url (str): Clone URL of the pushed repository.
+        paths (set): Paths changed by the push, or None if unknown.
+        rules (dict): Per-repository rules, as returned by load_path_rules.
+
+    Returns:
+        list: The stages to run, empty if the push needs no build, or None for a full build.
+    """
+    if not paths:
+        return None
+
+    rules = load_path_rules() if rules is None else rules
+    rule = rules.get(repo_url, rules.get("*", {"skip": config.SKIP_BUILD_GLOBS}))
+
+    if all(_matches(path, rule.get("skip", [])) for path in paths):
+        return []
+
+    stage_globs = rule.get("stages", {})
+    stages = [stage for stage in STAGES
+              if stage not in stage_globs or any(_matches(path, stage_globs[stage]) for path in paths)]
+    if len(stages) == len(STAGES):
+        return None
+    return stages
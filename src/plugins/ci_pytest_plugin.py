@@ -0,0 +1,127 @@
+"""
+CI Pytest Plugin
+
+This pytest plugin is loaded into the pytest processes started by the CI
+pipeline (with `-p ci_pytest_plugin`). It lives in its own directory so that
+putting it on the PYTHONPATH does not shadow any module of the repository
+under test. It is controlled through environment variables:
+
+    CI_PYTEST_COLLECT: File the collected test node IDs are written to, one per line
+    CI_PYTEST_SELECT: File listing the test node IDs to run, in the order to run them;
+                      all other tests are deselected
+    CI_PYTEST_FIRST: File listing test node IDs to run before all other tests
+    CI_PYTEST_FILES: File listing the absolute paths of the test files to run;
+                     tests in other files are deselected
+    CI_PYTEST_LIMITS: JSON object with the "cpu_seconds", "memory_bytes" and "processes"
+                      resource limits of the pytest process (POSIX only)
+    CI_PYTEST_REPORT: File every test phase result and collection error is appended to,
+                      as one JSON object per line
+
+Functions:
+    pytest_configure: Applies the resource limits in CI_PYTEST_LIMITS
+    pytest_collection_modifyitems: Selects and orders the tests to run
+    pytest_collection_finish: Writes the collected node IDs to CI_PYTEST_COLLECT
+    pytest_runtest_logreport: Appends test results to CI_PYTEST_REPORT
+    pytest_collectreport: Appends collection errors to CI_PYTEST_REPORT
+"""
+import json
+import os
+
+
+def _read_ids(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def pytest_configure(config):
+    limits = os.environ.get("CI_PYTEST_LIMITS")
+    if not limits:
+        return
+
+    try:
+        import resource
+    except ImportError:
+        return  # Not a POSIX system
+
+    rlimits = {"cpu_seconds": resource.RLIMIT_CPU, "memory_bytes": resource.RLIMIT_AS,
+               "processes": getattr(resource, "RLIMIT_NPROC", None)}
+    for name, value in json.loads(limits).items():
+        if rlimits.get(name) is None:
+            continue
+        # A higher hard CPU limit makes the kernel send SIGXCPU first, so the overrun is recognisable
+        hard = value + 1 if name == "cpu_seconds" else value
+        resource.setrlimit(rlimits[name], (value, hard))
+
+
+def pytest_collection_modifyitems(config, items):
+    files_file = os.environ.get("CI_PYTEST_FILES")
+    if files_file:
+        test_files = {os.path.normcase(os.path.abspath(path)) for path in _read_ids(files_file)}
+        keep, deselected = [], []
+        for item in items:
+            item_path = item.path if hasattr(item, "path") else item.fspath  # pytest < 7 only has fspath
+            path = os.path.normcase(os.path.abspath(str(item_path)))
+            (keep if path in test_files else deselected).append(item)
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+        items[:] = keep
+
+    select_file = os.environ.get("CI_PYTEST_SELECT")
+    if select_file:
+        position = {nodeid: i for i, nodeid in enumerate(_read_ids(select_file))}
+        keep = sorted((item for item in items if item.nodeid in position), key=lambda item: position[item.nodeid])
+        deselected = [item for item in items if item.nodeid not in position]
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+        items[:] = keep
+
+    first_file = os.environ.get("CI_PYTEST_FIRST")
+    if first_file:
+        first = set(_read_ids(first_file))
+        # Stable sort, so the other tests keep their order
+        items.sort(key=lambda item: item.nodeid not in first)
+
+
+def pytest_collection_finish(session):
+    collect_file = os.environ.get("CI_PYTEST_COLLECT")
+    if not collect_file:
+        return
+
+    with open(collect_file, "w", encoding="utf-8") as f:
+        for item in session.items:
+            f.write(item.nodeid + "\n")
+
+
+def _failure_message(report):
+    """
+    Returns a one-line cause of a failed report, such as the failing assertion.
+    """
+    crash = getattr(report.longrepr, "reprcrash", None)
+    if crash is not None:
+        return crash.message
+    lines = [line for line in report.longreprtext.strip().split("\n") if line.strip()]
+    return lines[-1] if lines else "unknown error"
+
+
+def _write_report(report, when):
+    report_file = os.environ.get("CI_PYTEST_REPORT")
+    if not report_file:
+        return
+
+    with open(report_file, "a", encoding="utf-8") as f:
+        f.write(json.dumps({
+            "nodeid": report.nodeid,
+            "when": when,
+            "outcome": report.outcome,
+            "duration": getattr(report, "duration", 0.0),
+            "message": _failure_message(report) if report.failed else None
+        }) + "\n")
+
+
+def pytest_runtest_logreport(report):
+    _write_report(report, report.when)
+
+
+def pytest_collectreport(report):
+    if report.failed:
+        _write_report(report, "collect")
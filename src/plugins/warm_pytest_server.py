@@ -0,0 +1,114 @@
+"""
+Warm Pytest Server
+
+This script is the long-lived process behind the warm runner of the CI
+pipeline. It imports pytest and any configured modules once, then forks a
+child for every test run it is asked for, so runs skip interpreter startup
+and those imports. Each child gets copy-on-write copies of the preloaded
+modules, so builds cannot see each other's imports. Like the CI pytest
+plugin, it must not import anything from the CI server itself.
+
+Requests are JSON lines on stdin with the "id", "args", "env", "cwd" and
+"output" (file for the run's console output) of a run. For every request the
+server answers with a JSON line holding the child's "pid", and another with
+its "returncode" once it exits.
+
+Usage:
+    python warm_pytest_server.py [module_to_preload ...]
+"""
+import importlib
+import json
+import os
+import select
+import sys
+
+import pytest
+
+
+def _send(message):
+    os.write(1, (json.dumps(message) + "\n").encode("utf-8"))
+
+
+def _run_child(request):
+    """
+    Runs pytest in a forked child. Never returns.
+    """
+    code = 1
+    try:
+        os.setpgid(0, 0)  # Own process group, so the client can kill the whole run
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        output = os.open(request["output"], os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        os.dup2(output, 1)
+        os.dup2(output, 2)
+
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        # PYTHONPATH is only read at interpreter startup
+        for path in reversed(request["env"].get("PYTHONPATH", "").split(os.pathsep)):
+            if path:
+                sys.path.insert(0, path)
+
+        code = int(pytest.main(request["args"]))
+    except BaseException as e:
+        print(f"Warm runner error: {e}", file=sys.stderr)
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def main(preload):
+    for module in preload:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f"Could not preload {module}: {e}", file=sys.stderr)
+
+    children = {}
+    buffer = b""
+    stdin_open = True
+
+    # A single thread, so forking never copies a lock held by another thread
+    while stdin_open or children:
+        if stdin_open:
+            readable, _, _ = select.select([0], [], [], 0.1)
+            if readable:
+                data = os.read(0, 65536)
+                if not data:
+                    stdin_open = False
+                buffer += data
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    if not line.strip():
+                        continue
+                    request = json.loads(line)
+                    pid = os.fork()
+                    if pid == 0:
+                        _run_child(request)
+                    try:
+                        # Also set here, so the group exists before the client can try to kill it
+                        os.setpgid(pid, pid)
+                    except OSError:
+                        pass  # The child got there first, or has already exited
+                    children[pid] = request["id"]
+                    _send({"id": request["id"], "pid": pid})
+        else:
+            select.select([], [], [], 0.1)
+
+        while children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            request_id = children.pop(pid, None)
+            if request_id is not None:
+                returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+                _send({"id": request_id, "returncode": returncode})
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,164 @@
+"""
+Run History Module
+
+This module keeps the duration and outcome of every test run by the CI
+pipeline, keyed by repository URL and pytest node ID, in a SQLite database.
+The pipeline uses the history to balance test shards by expected runtime and
+to run recently failed tests first. Tests that failed but passed on a rerun
+are counted as flaky, so their flake rate can be followed over time. It also
+remembers the last commit of each branch whose tests passed, which test
+impact analysis diffs against.
+
+Classes:
+    TestHistory: Persistent per-test durations and outcomes
+
+Functions:
+    None (all functionality is encapsulated in the TestHistory class)
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sqlite3
+import threading
+import time
+from src import config
+
+# Weight of the newest run in the moving average of a test's duration
+DURATION_WEIGHT = 0.3
+
+
+class TestHistory:
+    __test__ = False  # Not a test class, despite the name
+
+    def __init__(self, db_path=config.TEST_HISTORY_DB):
+        """
+        Args:
+            db_path (str): Path to the SQLite database holding the history.
+        """
+        self.db_path = db_path
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS test_runs (
+                    repo_url TEXT NOT NULL,
+                    nodeid TEXT NOT NULL,
+                    avg_duration REAL NOT NULL,
+                    last_outcome TEXT NOT NULL,
+                    runs INTEGER NOT NULL,
+                    last_run_at REAL NOT NULL,
+                    PRIMARY KEY (repo_url, nodeid)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS test_flakes (
+                    repo_url TEXT NOT NULL,
+                    nodeid TEXT NOT NULL,
+                    flaky_runs INTEGER NOT NULL,
+                    last_flaky_at REAL NOT NULL,
+                    PRIMARY KEY (repo_url, nodeid)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS green_builds (
+                    repo_url TEXT NOT NULL,
+                    branch_name TEXT NOT NULL,
+                    commit_id TEXT NOT NULL,
+                    finished_at REAL NOT NULL,
+                    PRIMARY KEY (repo_url, branch_name)
+                )
+            """)
+
+    def record(self, repo_url, results):
+        """
+        Adds the results of a test run to the history.
+
+        Args:
+            repo_url (str): The repository the tests belong to.
+            results (list): Dicts with the "nodeid", "outcome" ("passed", "failed", "skipped" or "flaky")
+                            and "duration" (in seconds) of each test.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO test_runs (repo_url, nodeid, avg_duration, last_outcome, runs, last_run_at) "
+                "VALUES (?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT (repo_url, nodeid) DO UPDATE SET "
+                "avg_duration = avg_duration * ? + excluded.avg_duration * ?, "
+                "last_outcome = excluded.last_outcome, runs = runs + 1, last_run_at = excluded.last_run_at",
+                [(repo_url, result["nodeid"], result["duration"], result["outcome"], now,
+                  1 - DURATION_WEIGHT, DURATION_WEIGHT) for result in results]
+            )
+            self._conn.executemany(
+                "INSERT INTO test_flakes (repo_url, nodeid, flaky_runs, last_flaky_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT (repo_url, nodeid) DO UPDATE SET "
+                "flaky_runs = flaky_runs + 1, last_flaky_at = excluded.last_flaky_at",
+                [(repo_url, result["nodeid"], now) for result in results if result["outcome"] == "flaky"]
+            )
+
+    def lookup(self, repo_url):
+        """
+        Returns the history of every test of a repository.
+
+        Returns:
+            dict: Maps node IDs to {"duration": expected seconds, "failed": whether the last run failed}.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT nodeid, avg_duration, last_outcome FROM test_runs WHERE repo_url = ?",
+                (repo_url,)
+            ).fetchall()
+
+        return {nodeid: {"duration": duration, "failed": outcome == "failed"} for nodeid, duration, outcome in rows}
+
+    def flake_rates(self, repo_url):
+        """
+        Returns how often each test of a repository that was ever flaky only passed on a rerun.
+
+        Returns:
+            dict: Maps node IDs to the fraction of their recorded runs that were flaky.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT f.nodeid, f.flaky_runs, r.runs FROM test_flakes f JOIN test_runs r "
+                "ON r.repo_url = f.repo_url AND r.nodeid = f.nodeid WHERE f.repo_url = ?",
+                (repo_url,)
+            ).fetchall()
+
+        return {nodeid: flaky_runs / runs for nodeid, flaky_runs, runs in rows}
+
+    def record_green_build(self, repo_url, branch_name, commit_id):
+        """
+        Remembers a commit whose tests passed as the last green build of its branch.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO green_builds (repo_url, branch_name, commit_id, finished_at) VALUES (?, ?, ?, ?)",
+                (repo_url, branch_name, commit_id, time.time())
+            )
+
+    def last_green_commit(self, repo_url, branch_names):
+        """
+        Returns the last green commit of the first of the given branches that has one.
+
+        Args:
+            repo_url (str): The repository.
+            branch_names (list): Branches to look at, in order of preference.
+
+        Returns:
+            str: The commit ID, or None if none of the branches had a green build.
+        """
+        with self._lock:
+            for branch_name in branch_names:
+                row = self._conn.execute(
+                    "SELECT commit_id FROM green_builds WHERE repo_url = ? AND branch_name = ?",
+                    (repo_url, branch_name)
+                ).fetchone()
+                if row is not None:
+                    return row[0]
+        return None
@@ -9,7 +9,15 @@ Classes:
     CIServer: Manages CI workspace and build processes
 
 Functions:
+    run_ci: Runs a queued build and sends the notification
+    create_services: Creates the CI server, notifier and build queue on the configured paths
+    start_services: Starts the build workers, the notification senders and the workspace collector
     index: Root endpoint that confirms server status
+    queue_status: Reports build queue depth and wait times
+    workspace_status: Reports workspace disk usage, reuse and what the collector reclaimed
+    notification_status: Reports the notification outbox and email send latency
+    build_log: Returns the log, or a stage's output, of a build
+    search_builds: Full-text search over the log records of all builds
     webhook: Handles GitHub webhook POST requests
 """
 import sys
@@ -17,12 +25,17 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import uuid
+from datetime import datetime
 from flask import Flask, request, jsonify
 from git import Repo
-import threading
 import logging
+from src import config
+from src.build_queue import BuildQueue
 from src.ci_pipeline import CIPipeline
-from src.notifications import send_email_notification
+from src.workspace_gc import WorkspaceCollector
+from src.workspace_pool import WorkspacePool
+from src.notifications import NotificationDispatcher
+from src.path_rules import changed_paths, plan_build
 
 # Configure logging
 logging.basicConfig(
@@ -39,41 +52,87 @@ members = {
 }
 
 class CIServer:
-    def __init__(self, base_dir='/tmp/ci_workspaces'):
+    def __init__(self, base_dir='/tmp/ci_workspaces', pipeline=None):
         self.base_dir = base_dir
         os.makedirs(base_dir, exist_ok=True)
-        self.pipeline = CIPipeline()
+        self.pipeline = pipeline or CIPipeline()
+        # Deletes workspaces in the background once started, beginning with those left by an earlier run
+        self.collector = WorkspaceCollector(base_dir)
+        # Keeps finished builds' checkouts for the next build of the same repository and branch
+        self.pool = WorkspacePool(base_dir, self.collector)
         
-    def process_build(self, repo_url, branch_name, commit_id, author_email, author_username):
+    def process_build(self, repo_url, branch_name, commit_id, author_email, author_username, cancel_event=None,
+                      stages=None):
         """
         Executes the CI process: Clone repo, run syntax check, run tests, cleanup.
+        If cancel_event is set (the build was superseded by a newer push), the build stops early.
+        If stages is a list, only the stages in it run (see src/path_rules.py).
+        The workspace is leased from the workspace pool, and given back however the build ends.
         """
         build_id = str(uuid.uuid4())
-        workspace = os.path.join(self.base_dir, build_id)
+        self.pipeline.logger.start_build(build_id, repo_url, branch_name, commit_id)
 
+        workspace, _ = self.pool.lease(repo_url, branch_name)
+        try:
+            return self._run_build(build_id, workspace, repo_url, branch_name, commit_id, cancel_event, stages)
+        finally:
+            # Keep the workspace for reuse or let the collector delete it in the background
+            logging.info("Cleaning up workspace...")
+            self.pool.give_back(repo_url, branch_name, workspace)
+
+    def _run_build(self, build_id, workspace, repo_url, branch_name, commit_id, cancel_event=None, stages=None):
+        """
+        Runs the build stages in the workspace.
+
+        Returns:
+            tuple: The build ID, the final status and the build output.
+        """
         logging.info(f"Starting CI process for {repo_url} on branch {branch_name} (commit: {commit_id})")
 
-        # Clone or pull the repository
-        clone_success = self.pipeline.clone_pull_repo(repo_url, workspace, branch_name)
+        # Check out the pushed commit from the mirror cache, falling back to a fresh clone
+        clone_success = False
+        if config.USE_MIRROR_CACHE:
+            clone_success = self.pipeline.checkout_from_mirror(repo_url, workspace, branch_name, commit_id,
+                                                                build_id=build_id)
+        if not clone_success:
+            clone_success = self.pipeline.clone_pull_repo(repo_url, workspace, branch_name, commit_id, build_id=build_id)
         if not clone_success:
             logging.error("Cloning repository failed.")
-            send_email_notification(build_id, commit_id, author_email, "Failed", "Cloning repository failed.", author_username, branch_name)
-            return build_id, False, "Cloning repository failed."
+            return build_id, "failed", "Cloning repository failed."
 
-        # Run syntax check
-        logging.info("Running syntax check...")
-        syntax_output, syntax_success = self.pipeline.check_python_syntax(build_id, workspace)
-        if not syntax_success:
-            logging.error("Syntax errors detected.")
-            return build_id, "failed", syntax_output
+        if cancel_event is not None and cancel_event.is_set():
+            return self._cancel_build(build_id)
 
-        # Run tests
+        # Run syntax check
+        if stages is None or "syntax_check" in stages:
+            logging.info("Running syntax check...")
+            syntax_output, syntax_success = self.pipeline.check_python_syntax(build_id, workspace)
+            if not syntax_success:
+                logging.error("Syntax errors detected.")
+                return build_id, "failed", syntax_output
+        else:
+            self.pipeline.logger.log_build_result(build_id, "syntax_check", "skipped", "No changed path needs this stage.")
+
+        if cancel_event is not None and cancel_event.is_set():
+            return self._cancel_build(build_id)
+
+        if stages is not None and "tests" not in stages:
+            self.pipeline.logger.log_build_result(build_id, "tests", "skipped", "No changed path needs this stage.")
+            logging.info("CI process completed with status: succeeded (tests skipped)")
+            return build_id, "succeeded", "Build was successful, tests were skipped as no changed path needs them."
+
+        # Run tests, only the ones affected by the push if test selection is enabled
         logging.info("Running tests...")
-        std_output, tests_success = self.pipeline.run_tests(build_id, workspace)
+        test_files = self.pipeline.select_tests(build_id, workspace, repo_url, branch_name)
+        python = self.pipeline.prepare_environment(build_id, workspace)
+        std_output, tests_success = self.pipeline.run_tests(build_id, workspace, cancel_event, repo_url=repo_url,
+                                                            test_files=test_files, python=python)
+
+        if cancel_event is not None and cancel_event.is_set():
+            return self._cancel_build(build_id)
         
-        # Cleanup workspace
-        logging.info("Cleaning up workspace...")
-        self.pipeline.cleanup_workspace(workspace)
+        if tests_success:
+            self.pipeline.record_green_build(repo_url, branch_name, commit_id)
 
         # Determine final status
         final_status = "succeeded" if tests_success else "failed"
@@ -81,16 +140,116 @@ class CIServer:
 
         return build_id, final_status, std_output
 
+    def _cancel_build(self, build_id):
+        """
+        Stops a build that was superseded by a newer push to the same branch.
+        """
+        logging.info(f"[Build {build_id}] Superseded by a newer push, stopping build.")
+        return build_id, "cancelled", "Build was cancelled by a newer push."
+
+
+def run_ci(job):
+    """
+    Function to execute a queued CI process on one of the build queue workers.
+    The notification is queued on the notifier, which sends it in the background.
+    Builds superseded by a newer push to the same branch are not notified.
+    """
+    logging.info(f"Starting async CI process for commit {job['commit_id']} on branch {job['branch_name']}...")
+    build_id, test_success, log_output = ci_server.process_build(
+        job["repo_url"], job["branch_name"], job["commit_id"], job["author_email"], job["author_username"],
+        job.get("cancel_event"), job.get("stages")
+    )
+    try:
+        if test_success == "cancelled":
+            logging.info(f"Skipping notification for superseded commit {job['commit_id']}.")
+        else:
+            notifier.notify(build_id, job["commit_id"], job["author_email"], test_success, log_output, job["author_username"], job["branch_name"])
+    finally:
+        # Compress the build's logs into the log store once nothing needs them as plain files
+        ci_server.pipeline.logger.archive_build(build_id)
+
 
 # Flask API for CI Server
 app = Flask(__name__)
-ci_server = CIServer()
+# Created by create_services(), so importing this module opens no database and starts no thread
+ci_server = None
+notifier = None
+build_queue = None
+
+
+def create_services():
+    """
+    Creates the CI server, the notifier and the build queue on the configured paths, if not created yet.
+    No background thread is started.
+    """
+    global ci_server, notifier, build_queue
+    if ci_server is None:
+        ci_server = CIServer()
+    if notifier is None:
+        notifier = NotificationDispatcher()
+    if build_queue is None:
+        build_queue = BuildQueue(run_ci)
+
+
+def start_services():
+    """
+    Creates the services and starts the background threads of the server. Only the process serving
+    requests may call it: importing this module, as the tests do, must not start workers on the
+    shared queue and outbox, nor sweep the shared workspace directory.
+    """
+    create_services()
+    ci_server.collector.start()
+    notifier.start()
+    build_queue.start()
+
 
 @app.route("/", methods=["GET"])
 def index():
     return jsonify({"message": "CI Server is running!"}), 200
 
 
+@app.route("/queue", methods=["GET"])
+def queue_status():
+    return jsonify(build_queue.stats()), 200
+
+
+@app.route("/workspaces", methods=["GET"])
+def workspace_status():
+    return jsonify({**ci_server.collector.stats(), **ci_server.pool.stats()}), 200
+
+
+@app.route("/notifications", methods=["GET"])
+def notification_status():
+    return jsonify(notifier.stats()), 200
+
+
+@app.route("/logs/<build_id>", methods=["GET"])
+def build_log(build_id):
+    text = ci_server.pipeline.logger.read_log(build_id, request.args.get("stage"))
+    if text is None:
+        return jsonify({"error": "No such build log"}), 404
+    return text, 200, {"Content-Type": "text/plain; charset=utf-8"}
+
+
+@app.route("/search", methods=["GET"])
+def search_builds():
+    text = request.args.get("q", "").strip()
+    if not text:
+        return jsonify({"error": "Missing search text, use ?q="}), 400
+    try:
+        since = request.args.get("since")
+        since = datetime.fromisoformat(since).timestamp() if since else None
+        limit = int(request.args.get("limit", "50"))
+    except ValueError:
+        return jsonify({"error": "since must be an ISO date or time and limit a number"}), 400
+
+    results = ci_server.pipeline.logger.search(
+        text, status=request.args.get("status"), stage=request.args.get("stage"),
+        branch_name=request.args.get("branch"), since=since, limit=limit
+    )
+    return jsonify({"results": results}), 200
+
+
 # Handling GitHub webhooks
 @app.route("/webhook", methods=["POST"])
 def webhook():
@@ -129,23 +288,26 @@ def webhook():
 
         author_email = members.get(author_username)
 
-        def run_ci(repo_url, branch_name, commit_id, author_email):
-            """
-            Function to execute CI process asynchronously.
-            """
-            logging.info(f"Starting async CI process for commit {commit_id} on branch {branch_name}...")
-            build_id, test_success, log_output = ci_server.process_build(repo_url, branch_name, commit_id, author_email, author_username)
-            send_email_notification(build_id, commit_id, author_email, test_success, log_output, author_username, branch_name)
+        # Skip or narrow the build from the changed paths, before any git I/O
+        stages = plan_build(repo_url, changed_paths(data))
+        if stages == []:
+            logging.info(f"No build needed for {commit_id} on branch {branch_name}, only skipped paths changed.")
+            return jsonify({
+                "message": "CI process skipped, only paths that need no build changed",
+                "repository": repo_url,
+                "branch": branch_name,
+                "commit_id": commit_id
+            }), 200
 
-        # Start a daemon thread
-        thread = threading.Thread(target=run_ci, args=(repo_url, branch_name, commit_id, author_email))
-        thread.daemon = True  # Ensures the thread does not block Flask shutdown
-        thread.start()
+        # Hand the build over to the queue workers
+        queue_id = build_queue.enqueue(repo_url, branch_name, commit_id, author_email, author_username, stages)
 
         logging.info(f"CI process triggered for {commit_id} on branch {branch_name}")
 
         return jsonify({
             "message": "CI process started",
+            "queue_id": queue_id,
+            "stages": stages,
             "repository": repo_url,
             "branch": branch_name,
             "commit_id": commit_id,
@@ -164,4 +326,6 @@ def webhook():
 
 if __name__ == '__main__':
     logging.info("Starting CI Server...")
-    app.run(port=8004, debug=True)  # port 8000 + <group number>
\ No newline at end of file
+    start_services()
+    # The reloader would run the server in a second process, sharing the build queue with this one
+    app.run(port=8004, debug=True, use_reloader=False)  # port 8000 + <group number>
\ No newline at end of file
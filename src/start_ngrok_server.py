@@ -21,7 +21,7 @@ import platform
 import textwrap
 import subprocess
 from pyngrok import ngrok
-from src.server import app  # Import the Flask "app" from server.py
+from src.server import app, start_services  # Import the Flask "app" from server.py
 
 
 def start_ngrok_server():
@@ -101,6 +101,7 @@ def start_ngrok_server():
         print(f"ngrok tunnel established at: {tunnel.public_url}")
 
         # Start flask server
+        start_services()
         app.run(port=port, use_reloader=False)
 
     except KeyboardInterrupt:
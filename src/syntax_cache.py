@@ -0,0 +1,127 @@
+"""
+Syntax Cache Module
+
+This module provides a persistent cache of syntax check results. Results are
+keyed by the git blob SHA of the file content, so a file that did not change
+between builds is not parsed again, whatever workspace it was checked out in.
+The cache is a SQLite database shared by all builds and is bounded by evicting
+the least recently used results.
+
+Classes:
+    SyntaxCache: Persistent, size-bounded cache of syntax check results
+
+Functions:
+    blob_sha: Computes the git blob SHA of file content
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import hashlib
+import sqlite3
+import threading
+import time
+import logging
+from src import config
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,  # Use logging.DEBUG for more verbosity
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+
+def blob_sha(content):
+    """
+    Computes the SHA git uses for a blob with the given content.
+
+    Args:
+        content (bytes): The file content.
+
+    Returns:
+        str: The hex SHA-1 of the git blob.
+    """
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+class SyntaxCache:
+    def __init__(self, db_path=config.SYNTAX_CACHE_DB, max_entries=config.SYNTAX_CACHE_MAX_ENTRIES):
+        """
+        Args:
+            db_path (str): Path to the SQLite database holding the cache.
+            max_entries (int): Number of results kept before the least recently used are evicted.
+        """
+        self.db_path = db_path
+        self.max_entries = max(1, int(max_entries))
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS syntax_results (
+                    blob_sha TEXT PRIMARY KEY,
+                    error_msg TEXT,
+                    lineno INTEGER,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_syntax_results_last_used ON syntax_results (last_used)")
+
+    def get_many(self, shas):
+        """
+        Looks up the results of a set of blobs and marks them as recently used.
+
+        Returns:
+            dict: Maps every cached SHA to its (error_msg, lineno); error_msg is None for a file that parsed.
+        """
+        shas = list(set(shas))
+        results = {}
+        with self._lock, self._conn:
+            # Stay below SQLite's limit on the number of query parameters
+            for i in range(0, len(shas), 500):
+                batch = shas[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT blob_sha, error_msg, lineno FROM syntax_results WHERE blob_sha IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for sha, error_msg, lineno in rows:
+                    results[sha] = (error_msg, lineno)
+                self._conn.execute(
+                    f"UPDATE syntax_results SET last_used = ? WHERE blob_sha IN ({placeholders})",
+                    [time.time()] + batch
+                )
+        return results
+
+    def put_many(self, results):
+        """
+        Stores syntax check results and evicts the least recently used ones above the size bound.
+
+        Args:
+            results (dict): Maps blob SHAs to (error_msg, lineno); error_msg is None for a file that parsed.
+        """
+        if not results:
+            return
+
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO syntax_results (blob_sha, error_msg, lineno, last_used) VALUES (?, ?, ?, ?)",
+                [(sha, error_msg, lineno, now) for sha, (error_msg, lineno) in results.items()]
+            )
+            evicted = self._conn.execute(
+                "DELETE FROM syntax_results WHERE blob_sha IN "
+                "(SELECT blob_sha FROM syntax_results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+
+        if evicted:
+            logging.info(f"Evicted {evicted} syntax check result(s) from the cache.")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM syntax_results").fetchone()[0]
@@ -0,0 +1,160 @@
+"""
+Warm Runner Module
+
+This module keeps a warm pytest process for the CI pipeline. The process
+(src/plugins/warm_pytest_server.py) imports pytest and the configured
+modules once and forks a child per test run, so runs do not pay for
+interpreter startup and those imports. Runs are handed out as WarmProcess
+objects, which can be waited on and killed like a subprocess.Popen.
+Forking needs a POSIX system.
+
+Classes:
+    WarmRunner: Client of the warm pytest process
+    WarmProcess: A test run in a child of the warm pytest process
+
+Functions:
+    None (all functionality is encapsulated in the classes)
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import itertools
+import json
+import signal
+import subprocess
+import threading
+import logging
+from src import config
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,  # Use logging.DEBUG for more verbosity
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plugins", "warm_pytest_server.py")
+
+
+class WarmProcess:
+    def __init__(self, args):
+        self.args = args
+        self.pid = None
+        self.returncode = None
+        self.owner = None  # The warm process the run was sent to
+        self._started = threading.Event()
+        self._exited = threading.Event()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        """
+        Waits for the run to finish.
+
+        Raises:
+            subprocess.TimeoutExpired: If the run is still going after timeout seconds.
+        """
+        if not self._exited.wait(timeout):
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        return self.returncode
+
+    def kill(self):
+        """
+        Kills the run and every process it started.
+        """
+        if self.pid is not None and self.returncode is None:
+            try:
+                os.killpg(self.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+
+class WarmRunner:
+    def __init__(self, preload=config.WARM_RUNNER_PRELOAD, python=sys.executable):
+        """
+        Args:
+            preload (list): Modules the warm process imports before forking runs.
+            python (str): Interpreter of the warm process.
+        """
+        self.preload = preload
+        self.python = python
+        self._process = None
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def run(self, args, env, cwd, output_path):
+        """
+        Starts a pytest run in a fresh child of the warm process.
+
+        Args:
+            args (list): pytest command line arguments.
+            env (dict): Environment of the run.
+            cwd (str): Working directory of the run.
+            output_path (str): File the run's console output is appended to.
+
+        Returns:
+            WarmProcess: The running test run.
+        """
+        run = WarmProcess(["pytest"] + list(args))
+        with self._lock:
+            self._ensure_started()
+            request_id = next(self._ids)
+            run.owner = self._process
+            self._pending[request_id] = run
+            self._process.stdin.write(json.dumps({
+                "id": request_id, "args": list(args), "env": dict(env), "cwd": cwd, "output": output_path
+            }) + "\n")
+            self._process.stdin.flush()
+
+        run._started.wait()
+        return run
+
+    def stop(self):
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                self._process.stdin.close()
+                self._process.wait()
+            self._process = None
+
+    def _ensure_started(self):
+        """
+        Starts the warm process if it is not running. Must be called with the lock held.
+        """
+        if self._process is not None and self._process.poll() is None:
+            return
+
+        self._process = subprocess.Popen(
+            [self.python, SERVER_SCRIPT] + list(self.preload),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        reader = threading.Thread(target=self._read_responses, args=(self._process,), name="warm-runner-reader")
+        reader.daemon = True
+        reader.start()
+        logging.info(f"Started warm pytest runner (pid {self._process.pid}), preloading {len(self.preload)} module(s).")
+
+    def _read_responses(self, process):
+        for line in process.stdout:
+            message = json.loads(line)
+            with self._lock:
+                run = self._pending.get(message["id"])
+                if run is None:
+                    continue
+                if "pid" in message:
+                    run.pid = message["pid"]
+                    run._started.set()
+                else:
+                    run.returncode = message["returncode"]
+                    self._pending.pop(message["id"])
+                    run._exited.set()
+
+        # The warm process died: fail the runs it still had
+        logging.error("Warm pytest runner exited.")
+        with self._lock:
+            for request_id, run in list(self._pending.items()):
+                if run.owner is process:
+                    run.returncode = -1
+                    run._started.set()
+                    run._exited.set()
+                    del self._pending[request_id]
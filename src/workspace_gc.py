@@ -0,0 +1,287 @@
+"""
+Workspace Garbage Collector Module
+
+This module removes build workspaces in the background, so deleting a
+checkout is not on a build's critical path. A finished build's workspace is
+renamed into a trash directory, which is fast, and a collector thread deletes
+it later. The collector also reclaims orphaned workspaces: directories that
+no running build holds, such as those of builds that stopped early or of a
+server that crashed. It does this once at startup and again every
+config.WORKSPACE_GC_INTERVAL seconds, oldest workspaces first. Workspaces
+kept for reuse by the workspace pool (src/workspace_pool.py) are retained
+rather than deleted, until the disk usage of all workspaces goes above
+config.WORKSPACE_QUOTA_BYTES: then the least recently retained ones are
+evicted. It warns when running builds alone use more than the quota.
+
+Which workspaces are held is also recorded on disk: a held or retained
+workspace has an owner file next to it holding the server's process ID. A
+sweep leaves the workspaces of other live processes alone, so two servers,
+or a tool importing the server, can share the base directory.
+
+Classes:
+    WorkspaceCollector: Background deletion of build workspaces under a disk quota
+
+Functions:
+    None (all functionality is encapsulated in the WorkspaceCollector class)
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import shutil
+import threading
+import time
+import uuid
+import logging
+from src import config
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,  # Use logging.DEBUG for more verbosity
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+TRASH_DIR = ".trash"
+OWNER_SUFFIX = ".owner"
+
+
+def _tree_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _process_alive(pid):
+    if os.name != "posix":
+        return True  # No safe liveness check; never delete another process's workspace
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Alive, but run by another user
+    return True
+
+
+class WorkspaceCollector:
+    def __init__(self, base_dir, quota_bytes=config.WORKSPACE_QUOTA_BYTES, interval=config.WORKSPACE_GC_INTERVAL):
+        """
+        Args:
+            base_dir (str): Directory the build workspaces are created in.
+            quota_bytes (int): Disk space the workspaces may use (0 means no limit).
+            interval (float): Seconds between two sweeps for orphaned workspaces.
+        """
+        self.base_dir = base_dir
+        self.trash_dir = os.path.join(base_dir, TRASH_DIR)
+        self.quota_bytes = quota_bytes
+        self.interval = interval
+        os.makedirs(self.trash_dir, exist_ok=True)
+
+        self._active = set()
+        self._retained = {}  # Workspaces kept for reuse, and when they were retained
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reclaimed_bytes = 0
+        self.reclaimed_workspaces = 0
+        self.usage_bytes = 0
+
+    def start(self):
+        """
+        Starts the collector thread. Its first sweep reclaims the workspaces left by an earlier run.
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ci-workspace-gc")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def acquire(self, path):
+        """
+        Marks a workspace as held by a running build, so the collector leaves it alone.
+        Call it before the workspace is created.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            self._active.add(path)
+        self._write_owner(path)
+
+    def release(self, path):
+        """
+        Hands the workspace of a finished build to the collector. It is moved out of the way at once
+        and deleted in the background.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            self._active.discard(path)
+        self._remove_owner(path)
+        if os.path.exists(path):
+            try:
+                os.rename(path, os.path.join(self.trash_dir, f"{os.path.basename(path)}-{uuid.uuid4().hex[:8]}"))
+            except OSError as e:
+                logging.warning(f"Could not move workspace {path} to the trash, the next sweep removes it: {e}")
+        self._wakeup.set()
+
+    def retain(self, path):
+        """
+        Keeps the workspace of a finished build for reuse. The collector only deletes it to stay under the quota.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            self._active.discard(path)
+            self._retained[path] = time.time()
+        self._write_owner(path)
+
+    def claim(self, path):
+        """
+        Marks a retained workspace as held by a running build again.
+
+        Returns:
+            bool: False if the workspace is not retained any more, because it was evicted.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            if self._retained.pop(path, None) is None:
+                return False
+            self._active.add(path)
+            return True
+
+    def stats(self):
+        """
+        Reports the disk usage of the workspaces and what the collector has reclaimed.
+
+        Returns:
+            dict: Running builds' and retained workspaces, usage and quota at the last sweep, and the number
+                  and size of the workspaces reclaimed since the server started (sizes in bytes).
+        """
+        with self._lock:
+            active = len(self._active)
+            retained = len(self._retained)
+        return {
+            "active_workspaces": active,
+            "retained_workspaces": retained,
+            "usage_bytes": self.usage_bytes,
+            "quota_bytes": self.quota_bytes,
+            "reclaimed_workspaces": self.reclaimed_workspaces,
+            "reclaimed_bytes": self.reclaimed_bytes
+        }
+
+    def sweep(self):
+        """
+        Deletes the trash and the orphaned workspaces, oldest first, measures the disk usage
+        of the workspaces left, and evicts the least recently retained ones while it is above the quota.
+        """
+        for name in os.listdir(self.trash_dir):
+            self._delete(os.path.join(self.trash_dir, name))
+
+        workspaces = []
+        for name in os.listdir(self.base_dir):
+            path = os.path.abspath(os.path.join(self.base_dir, name))
+            if name.endswith(OWNER_SUFFIX):
+                workspace = path[:-len(OWNER_SUFFIX)]
+                with self._lock:
+                    ours = workspace in self._active or workspace in self._retained
+                if not ours and not os.path.exists(workspace):
+                    self._owned_elsewhere(workspace)  # Removes the owner file of a dead process
+                continue
+            if name == TRASH_DIR or not os.path.isdir(path):
+                continue
+            try:
+                workspaces.append((os.path.getmtime(path), path))
+            except OSError:
+                continue  # Removed while we looked
+
+        usage = 0
+        retained = []
+        for _, path in sorted(workspaces):
+            with self._lock:
+                held = path in self._active
+                retained_at = self._retained.get(path)
+            if not held and retained_at is None and self._owned_elsewhere(path):
+                continue  # Held or retained by another live server process
+            if held:
+                usage += _tree_size(path)
+            elif retained_at is not None:
+                size = _tree_size(path)
+                usage += size
+                retained.append((retained_at, path, size))
+            else:
+                self._delete(path)
+
+        for _, path, size in sorted(retained):
+            if self.quota_bytes <= 0 or usage <= self.quota_bytes:
+                break
+            with self._lock:
+                if self._retained.pop(path, None) is None:
+                    continue  # Claimed by a build in the meantime
+            self._remove_owner(path)
+            self._delete(path, size)
+            usage -= size
+
+        if self.quota_bytes > 0 and usage > self.quota_bytes:
+            logging.warning(f"Workspaces of running builds use {usage} bytes, above the quota of {self.quota_bytes}.")
+        self.usage_bytes = usage
+
+    def _owner_path(self, path):
+        return path + OWNER_SUFFIX
+
+    def _write_owner(self, path):
+        try:
+            with open(self._owner_path(path), "w") as f:
+                f.write(str(os.getpid()))
+        except OSError as e:
+            logging.warning(f"Could not record the owner of workspace {path}: {e}")
+
+    def _remove_owner(self, path):
+        try:
+            os.remove(self._owner_path(path))
+        except FileNotFoundError:
+            pass
+
+    def _owned_elsewhere(self, path):
+        """
+        Tells whether another live process holds the workspace. Owner files of dead processes,
+        or left by an earlier run of this one, are removed.
+        """
+        try:
+            with open(self._owner_path(path), "r") as f:
+                pid = int(f.read().strip())
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            pid = None
+        if pid is not None and pid != os.getpid() and _process_alive(pid):
+            return True
+        self._remove_owner(path)
+        return False
+
+    def _delete(self, path, size=None):
+        size = _tree_size(path) if size is None else size
+        shutil.rmtree(path, ignore_errors=True)
+        if not os.path.exists(path):
+            self.reclaimed_bytes += size
+            self.reclaimed_workspaces += 1
+            logging.info(f"Reclaimed workspace {path} ({size} bytes).")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                logging.error(f"Workspace sweep failed: {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
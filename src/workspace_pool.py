@@ -0,0 +1,95 @@
+"""
+Workspace Pool Module
+
+This module keeps the workspaces of finished builds for reuse by later builds
+of the same repository and branch, so a build resets an existing checkout to
+the pushed commit instead of checking out the whole tree again. Up to
+config.WORKSPACE_POOL_SIZE idle workspaces are kept per repository and
+branch. Each is leased by one build at a time. The workspace collector
+(src/workspace_gc.py) keeps them on disk and evicts the least recently used
+ones when the workspaces go above their disk quota.
+
+Classes:
+    WorkspacePool: Leases build workspaces, reusing those of earlier builds
+
+Functions:
+    None (all functionality is encapsulated in the WorkspacePool class)
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import threading
+import uuid
+import logging
+from src import config
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,  # Use logging.DEBUG for more verbosity
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+
+class WorkspacePool:
+    def __init__(self, base_dir, collector, size=config.WORKSPACE_POOL_SIZE):
+        """
+        Args:
+            base_dir (str): Directory the build workspaces are created in.
+            collector (WorkspaceCollector): Collector deleting the workspaces that are not kept.
+            size (int): Idle workspaces kept per repository and branch (0 disables reuse).
+        """
+        self.base_dir = base_dir
+        self.collector = collector
+        self.size = size
+        self._idle = {}  # (repo_url, branch_name) -> idle workspaces, most recently returned last
+        self._lock = threading.Lock()
+        self.leases = 0
+        self.reuses = 0
+
+    def lease(self, repo_url, branch_name):
+        """
+        Leases a workspace for a build: the most recently returned idle one of the repository
+        and branch, or a new, empty path. No other build gets it until it is given back.
+
+        Returns:
+            tuple: The workspace path, and whether it holds a checkout of an earlier build.
+        """
+        with self._lock:
+            self.leases += 1
+            idle = self._idle.get((repo_url, branch_name), [])
+            while idle:
+                path = idle.pop()
+                if self.collector.claim(path):
+                    self.reuses += 1
+                    logging.info(f"Reusing workspace {path} for {repo_url} on branch {branch_name}.")
+                    return path, True
+
+        path = os.path.join(self.base_dir, str(uuid.uuid4()))
+        self.collector.acquire(path)
+        return path, False
+
+    def give_back(self, repo_url, branch_name, path):
+        """
+        Returns the workspace of a finished build. It is kept for the next build of the repository
+        and branch if it holds a checkout and the pool has room, otherwise it is deleted.
+        """
+        if self.size > 0 and os.path.exists(os.path.join(path, ".git")):
+            with self._lock:
+                idle = self._idle.setdefault((repo_url, branch_name), [])
+                if len(idle) < self.size:
+                    self.collector.retain(path)
+                    idle.append(path)
+                    return
+        self.collector.release(path)
+
+    def stats(self):
+        """
+        Reports how often builds reused a workspace.
+
+        Returns:
+            dict: Idle workspaces, and the number of leases and of reused workspaces since the server started.
+        """
+        with self._lock:
+            idle = sum(len(paths) for paths in self._idle.values())
+        return {"idle_workspaces": idle, "leases": self.leases, "reused_workspaces": self.reuses}
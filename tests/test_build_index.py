@@ -0,0 +1,86 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from src.build_index import BuildIndex
+
+repo_url = "https://example.com/repo.git"
+
+
+class TestBuildIndex(unittest.TestCase):
+    def setUp(self):
+        """
+        Set up an index with two builds for each test.
+        """
+        self.test_dir = tempfile.mkdtemp()
+        self.index = BuildIndex(os.path.join(self.test_dir, "build_index.db"))
+        self.index.add_build("1", repo_url, "main", "aaa")
+        self.index.add_build("2", repo_url, "feature", "bbb")
+        now = time.time()
+        self.index.add_records([
+            ("1", "tests", "failure", "FAILED tests/test_a.py::test_x\nError cause: ModuleNotFoundError: No module named 'yaml'", now - 7 * 86400),
+            ("1", "git", "success", "Checked out main", now - 7 * 86400),
+            ("2", "tests", "failure", "Error cause: ModuleNotFoundError: No module named 'yaml'", now),
+            ("2", "tests", "success", "All tests passed. module 'yaml' found", now),
+        ])
+
+    def tearDown(self):
+        """
+        Clean up after each test.
+        """
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_search_finds_records_with_every_word(self):
+        """
+        Test that a search returns the records containing all its words, newest first, with their build's branch.
+        """
+        results = self.index.search("No module named 'yaml'")
+
+        self.assertEqual([result["build_id"] for result in results], ["2", "1"])
+        self.assertEqual(results[1]["branch_name"], "main")
+        self.assertEqual(results[1]["commit_id"], "aaa")
+        self.assertIn("[yaml]", results[0]["snippet"])
+
+    def test_search_filters(self):
+        """
+        Test that searches can be limited by status, branch and time.
+        """
+        self.assertEqual(len(self.index.search("yaml", status="failure")), 2)
+        self.assertEqual([r["build_id"] for r in self.index.search("yaml", status="failure", since=time.time() - 86400)], ["2"])
+        self.assertEqual([r["build_id"] for r in self.index.search("yaml", branch_name="main")], ["1"])
+        self.assertEqual(self.index.search("yaml", stage="git"), [])
+
+    def test_removed_builds_are_not_found(self):
+        """
+        Test that removing a build deletes its records and leaves the other builds searchable.
+        """
+        self.index.remove_builds(["1"])
+
+        self.assertEqual({r["build_id"] for r in self.index.search("yaml")}, {"2"})
+        self.assertEqual(self.index.search("Checked out main"), [])
+
+    def test_builds_indexed_before_the_record_mapping_can_be_removed(self):
+        """
+        Test that reopening an index whose records have no build mapping yet maps them, so they can be removed.
+        """
+        with self.index._conn:
+            self.index._conn.execute("DROP TABLE record_builds")
+        index = BuildIndex(os.path.join(self.test_dir, "build_index.db"))
+
+        index.remove_builds(["2"])
+
+        self.assertEqual({r["build_id"] for r in index.search("yaml")}, {"1"})
+
+    def test_search_text_is_not_parsed_as_query_syntax(self):
+        """
+        Test that quotes, colons and operators in the search text are matched as plain words.
+        """
+        results = self.index.search('ModuleNotFoundError: "No module" OR')
+
+        self.assertEqual(results, [])
+        self.assertEqual(len(self.index.search("ModuleNotFoundError: No")), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from src.build_queue import BuildQueue
+
+
+class TestBuildQueue(unittest.TestCase):
+    def setUp(self):
+        """
+        Set up a fresh queue database for each test.
+        """
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, "queue.db")
+        self.processed = []
+        self.done = threading.Event()
+
+    def tearDown(self):
+        """
+        Clean up after each test.
+        """
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def handler(self, job):
+        self.processed.append(job["commit_id"])
+        if len(self.processed) >= self.expected:
+            self.done.set()
+
+    def test_queued_builds_are_processed_in_order(self):
+        """
+        Test that a single worker runs queued builds in the order they arrived.
+        """
+        self.expected = 3
+        queue = BuildQueue(self.handler, db_path=self.db_path, workers=1, supersede=False)
+        for commit_id in ["a1", "b2", "c3"]:
+            queue.enqueue("https://example.com/repo.git", "main", commit_id, "dev@example.com", "dev")
+
+        queue.start()
+        self.assertTrue(self.done.wait(timeout=10))
+        queue.stop(timeout=5)
+
+        self.assertEqual(self.processed, ["a1", "b2", "c3"])
+        self.assertEqual(queue.stats()["queued"], 0)
+
+    def test_queued_builds_survive_restart(self):
+        """
+        Test that builds queued before a restart are run by the next queue on the same database.
+        """
+        self.expected = 1
+        first = BuildQueue(self.handler, db_path=self.db_path, workers=1)
+        first.enqueue("https://example.com/repo.git", "main", "abc123", "dev@example.com", "dev")
+        self.assertEqual(first.stats()["queued"], 1)
+
+        second = BuildQueue(self.handler, db_path=self.db_path, workers=1)
+        second.start()
+        self.assertTrue(self.done.wait(timeout=10))
+        second.stop(timeout=5)
+
+        self.assertEqual(self.processed, ["abc123"])
+
+    def test_build_is_claimed_by_one_queue_only(self):
+        """
+        Test that two queues on the same database never claim the same build, and that opening
+        a queue without starting it leaves the other queue's running builds alone.
+        """
+        first = BuildQueue(self.handler, db_path=self.db_path, workers=1)
+        first.enqueue("https://example.com/repo.git", "main", "abc123", "dev@example.com", "dev")
+        with first._lock:
+            self.assertEqual(first._claim_next()["commit_id"], "abc123")
+
+        second = BuildQueue(self.handler, db_path=self.db_path, workers=1)
+        with second._lock:
+            self.assertIsNone(second._claim_next())
+        self.assertEqual(second.stats()["running"], 1)
+
+    def test_stages_survive_restart(self):
+        """
+        Test that a build limited to some stages is still limited when run after a restart.
+        """
+        first = BuildQueue(self.handler, db_path=self.db_path, workers=1)
+        first.enqueue("https://example.com/repo.git", "main", "abc123", "dev@example.com", "dev", ["syntax_check"])
+        first.enqueue("https://example.com/repo.git", "feature", "def456", "dev@example.com", "dev")
+
+        second = BuildQueue(self.handler, db_path=self.db_path, workers=1)
+        with second._lock:
+            jobs = [second._claim_next(), second._claim_next()]
+
+        self.assertEqual([job["stages"] for job in jobs], [["syntax_check"], None])
+
+    def test_narrow_push_takes_over_stages_of_superseded_build(self):
+        """
+        Test that a docs-only push superseding a full build still runs the full build.
+        """
+        queue = BuildQueue(self.handler, db_path=self.db_path, workers=1, supersede=True)
+        queue.enqueue("https://example.com/repo.git", "main", "a1", "dev@example.com", "dev")
+        queue.enqueue("https://example.com/repo.git", "main", "b2", "dev@example.com", "dev", ["syntax_check"])
+        queue.enqueue("https://example.com/repo.git", "feature", "c3", "dev@example.com", "dev", ["syntax_check"])
+        queue.enqueue("https://example.com/repo.git", "feature", "d4", "dev@example.com", "dev", ["tests"])
+
+        with queue._lock:
+            jobs = [queue._claim_next(), queue._claim_next()]
+
+        self.assertEqual([(job["commit_id"], job["stages"]) for job in jobs],
+                         [("b2", None), ("d4", ["syntax_check", "tests"])])
+
+    def test_new_push_drops_queued_builds_of_same_branch(self):
+        """
+        Test that only the newest queued commit of a branch is built in superseding mode.
+        """
+        self.expected = 2
+        queue = BuildQueue(self.handler, db_path=self.db_path, workers=1, supersede=True)
+        for commit_id in ["a1", "b2", "c3"]:
+            queue.enqueue("https://example.com/repo.git", "main", commit_id, "dev@example.com", "dev")
+        queue.enqueue("https://example.com/repo.git", "feature", "d4", "dev@example.com", "dev")
+
+        queue.start()
+        self.assertTrue(self.done.wait(timeout=10))
+        queue.stop(timeout=5)
+
+        self.assertEqual(self.processed, ["c3", "d4"])
+
+    def test_new_push_cancels_running_build_of_same_branch(self):
+        """
+        Test that the cancel event of a running build is set when its branch gets a newer push.
+        """
+        started = threading.Event()
+        cancelled = threading.Event()
+
+        def blocking_handler(job):
+            if job["commit_id"] != "a1":
+                return
+            started.set()
+            if job["cancel_event"].wait(timeout=10):
+                cancelled.set()
+
+        queue = BuildQueue(blocking_handler, db_path=self.db_path, workers=1, supersede=True)
+        queue.enqueue("https://example.com/repo.git", "main", "a1", "dev@example.com", "dev")
+        queue.start()
+        self.assertTrue(started.wait(timeout=10))
+
+        queue.enqueue("https://example.com/repo.git", "main", "b2", "dev@example.com", "dev")
+        self.assertTrue(cancelled.wait(timeout=10))
+        queue.stop(timeout=5)
+
+    def test_stats_report_depth_and_wait(self):
+        """
+        Test that the queue reports its depth and the age of the oldest waiting build.
+        """
+        queue = BuildQueue(self.handler, db_path=self.db_path, workers=4)
+        queue.enqueue("https://example.com/repo.git", "main", "abc123", "dev@example.com", "dev")
+        queue.enqueue("https://example.com/repo.git", "dev", "def456", "dev@example.com", "dev")
+
+        stats = queue.stats()
+        self.assertEqual(stats["workers"], 4)
+        self.assertEqual(stats["queued"], 2)
+        self.assertEqual(stats["running"], 0)
+        self.assertGreaterEqual(stats["oldest_wait_seconds"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,8 +4,11 @@ import sys
 import subprocess
 import git
 import shutil
-from unittest.mock import patch
+import tempfile
+import threading
+from unittest.mock import patch, ANY
 from src.ci_pipeline import CIPipeline
+from src.logger import BuildLogger, LogWriter
 
 # Update line below to match the file, function and variable names that are to be implemented
 # from file_name import clone_pull_function, repo_url, repo_dir
@@ -17,18 +20,31 @@ repo_url = "https://github.com/willeStjerna/Group4_2"
 class TestCIPipeline(unittest.TestCase):
     def setUp(self):
         """
-        Set up test environment before each test.
+        Set up test environment before each test. Caches, mirrors and logs go to a temporary directory.
         """
-        self.pipeline = CIPipeline()
+        self.cache_dir = tempfile.mkdtemp()
+        self.writer = LogWriter(flush_interval=60)
+        self.pipeline = self._pipeline()
         self.test_build_id = "test_build"
-        self.test_repo_dir = "./test_repo"
+        self.test_repo_dir = os.path.join(self.cache_dir, "test_repo")
 
     def tearDown(self):
         """
         Clean up after each test.
         """
-        if os.path.exists(self.test_repo_dir):
-            shutil.rmtree(self.test_repo_dir)
+        self.writer.close()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _pipeline(self, **kwargs):
+        paths = {
+            "mirror_dir": os.path.join(self.cache_dir, "mirrors"),
+            "syntax_cache_db": os.path.join(self.cache_dir, "syntax_cache.db"),
+            "test_history_db": os.path.join(self.cache_dir, "test_history.db"),
+            "env_cache_dir": os.path.join(self.cache_dir, "envs"),
+            "logger": BuildLogger(os.path.join(self.cache_dir, "logs"), writer=self.writer)
+        }
+        paths.update(kwargs)
+        return CIPipeline(**paths)
     
     
     @patch("git.Repo")
@@ -65,6 +81,177 @@ class TestCIPipeline(unittest.TestCase):
         mock_instance.git.fetch.assert_called_once()
         mock_instance.remotes.origin.pull.assert_called_once()
 
+    def _commit_file(self, repo, name, content):
+        with open(os.path.join(repo.working_dir, name), "w") as f:
+            f.write(content)
+        repo.index.add([name])
+        return repo.index.commit(f"Update {name}").hexsha
+
+    def test_checkout_from_mirror(self):
+        """
+        Test that builds get a worktree of the exact commit from a mirror that is fetched incrementally.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        origin = self._init_origin(tmp_dir)
+        first_commit = self._commit_file(origin, "app.py", "VERSION = 1\n")
+
+        pipeline = self._pipeline(mirror_dir=os.path.join(tmp_dir, "mirrors"))
+        first_workspace = os.path.join(tmp_dir, "build1")
+        self.assertTrue(pipeline.checkout_from_mirror(origin.working_dir, first_workspace, "main", first_commit))
+        self.assertEqual(git.Repo(first_workspace).head.commit.hexsha, first_commit)
+
+        second_commit = self._commit_file(origin, "app.py", "VERSION = 2\n")
+        # Workspaces are deleted by the workspace collector, leaving a stale worktree in the mirror
+        shutil.rmtree(first_workspace)
+        second_workspace = os.path.join(tmp_dir, "build2")
+        self.assertTrue(pipeline.checkout_from_mirror(origin.working_dir, second_workspace, "main", second_commit))
+        with open(os.path.join(second_workspace, "app.py")) as f:
+            self.assertEqual(f.read(), "VERSION = 2\n")
+        self.assertEqual(len(os.listdir(pipeline.mirror_dir)), 1)
+
+    def test_reused_worktree_is_reset_to_commit(self):
+        """
+        Test that a reused workspace is reset to the exact commit, dropping stray files but keeping bytecode caches.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        origin = self._init_origin(tmp_dir)
+        first_commit = self._commit_file(origin, "app.py", "VERSION = 1\n")
+        pipeline = self._pipeline(mirror_dir=os.path.join(tmp_dir, "mirrors"))
+        workspace = os.path.join(tmp_dir, "build")
+        self.assertTrue(pipeline.checkout_from_mirror(origin.working_dir, workspace, "main", first_commit))
+
+        with open(os.path.join(workspace, "app.py"), "w") as f:
+            f.write("edited by the build\n")
+        with open(os.path.join(workspace, "stray.txt"), "w") as f:
+            f.write("left over\n")
+        os.makedirs(os.path.join(workspace, "__pycache__"))
+        second_commit = self._commit_file(origin, "app.py", "VERSION = 2\n")
+
+        self.assertTrue(pipeline.checkout_from_mirror(origin.working_dir, workspace, "main", second_commit))
+        self.assertEqual(git.Repo(workspace).head.commit.hexsha, second_commit)
+        with open(os.path.join(workspace, "app.py")) as f:
+            self.assertEqual(f.read(), "VERSION = 2\n")
+        self.assertFalse(os.path.exists(os.path.join(workspace, "stray.txt")))
+        self.assertTrue(os.path.isdir(os.path.join(workspace, "__pycache__")))
+
+    @patch("src.env_cache.EnvironmentCache._install")
+    def test_reused_workspace_gets_a_fresh_environment(self, mock_install):
+        """
+        Test that the test environment is materialized again in a workspace reset for the next build.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        origin = self._init_origin(tmp_dir)
+        first_commit = self._commit_file(origin, "requirements.txt", "requests==2.32.3\n")
+        pipeline = self._pipeline(mirror_dir=os.path.join(tmp_dir, "mirrors"), env_cache_dir=os.path.join(tmp_dir, "envs"))
+        workspace = os.path.join(tmp_dir, "build")
+
+        self.assertTrue(pipeline.checkout_from_mirror(origin.working_dir, workspace, "main", first_commit))
+        self.assertIsNotNone(pipeline.prepare_environment("build1", workspace))
+        # Bytecode compiled inside the environment survives the reset like any other cache
+        os.makedirs(os.path.join(workspace, ".ci_venv", "lib", "__pycache__"), exist_ok=True)
+
+        second_commit = self._commit_file(origin, "app.py", "VERSION = 2\n")
+        self.assertTrue(pipeline.checkout_from_mirror(origin.working_dir, workspace, "main", second_commit))
+        python = pipeline.prepare_environment("build2", workspace)
+
+        self.assertIsNotNone(python)
+        self.assertTrue(os.path.exists(python))
+        self.assertEqual(mock_install.call_count, 1)
+
+    def test_reused_clone_is_reset_to_commit(self):
+        """
+        Test that an existing clone given a commit is reset to exactly that commit.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        origin = self._init_origin(tmp_dir)
+        first_commit = self._commit_file(origin, "app.py", "VERSION = 1\n")
+        workspace = os.path.join(tmp_dir, "build")
+        self.assertTrue(self.pipeline.clone_pull_repo("file://" + origin.working_dir, workspace, "main", first_commit))
+
+        second_commit = self._commit_file(origin, "app.py", "VERSION = 2\n")
+        self._commit_file(origin, "app.py", "VERSION = 3\n")
+
+        self.assertTrue(self.pipeline.clone_pull_repo("file://" + origin.working_dir, workspace, "main", second_commit))
+        self.assertEqual(git.Repo(workspace).head.commit.hexsha, second_commit)
+
+    def _init_origin(self, tmp_dir):
+        origin = git.Repo.init(os.path.join(tmp_dir, "origin"), initial_branch="main")
+        with origin.config_writer() as writer:
+            writer.set_value("user", "name", "dev")
+            writer.set_value("user", "email", "dev@example.com")
+        return origin
+
+    def test_clone_shallow_at_pushed_commit(self):
+        """
+        Test that the shallow strategy fetches only the pushed commit.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        origin = self._init_origin(tmp_dir)
+        pushed_commit = self._commit_file(origin, "app.py", "VERSION = 1\n")
+        self._commit_file(origin, "app.py", "VERSION = 2\n")
+
+        workspace = os.path.join(tmp_dir, "build")
+        result = self.pipeline.clone_pull_repo("file://" + origin.working_dir, workspace, "main", pushed_commit, strategy="shallow")
+
+        self.assertTrue(result)
+        clone = git.Repo(workspace)
+        self.assertEqual(clone.head.commit.hexsha, pushed_commit)
+        self.assertEqual(len(list(clone.iter_commits())), 1)
+
+    def test_clone_checks_out_pushed_commit_with_every_strategy(self):
+        """
+        Test that every strategy builds the pushed commit after the branch moved on, and logs
+        the bytes fetched under the build's ID.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        origin = self._init_origin(tmp_dir)
+        pushed_commit = self._commit_file(origin, "app.py", "VERSION = 1\n")
+        self._commit_file(origin, "app.py", "VERSION = 2\n")
+
+        for strategy in ["full", "blobless", "sparse"]:
+            build_id = f"{self.test_build_id}_{strategy}"
+            workspace = os.path.join(tmp_dir, strategy)
+            with patch("src.config.SPARSE_PATHS", ["."]):
+                result = self.pipeline.clone_pull_repo("file://" + origin.working_dir, workspace, "main",
+                                                       pushed_commit, strategy=strategy, build_id=build_id)
+
+            self.assertTrue(result)
+            self.assertEqual(git.Repo(workspace).head.commit.hexsha, pushed_commit)
+            self.assertRegex(self.pipeline.logger.read_log(build_id), rf"strategy: {strategy}, [1-9]\d* bytes fetched")
+
+    def test_clone_sparse_limits_checked_out_paths(self):
+        """
+        Test that the sparse strategy only checks out the configured directories.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        origin = self._init_origin(tmp_dir)
+        os.makedirs(os.path.join(origin.working_dir, "tests"))
+        os.makedirs(os.path.join(origin.working_dir, "assets"))
+        self._commit_file(origin, os.path.join("tests", "test_app.py"), "def test_app():\n    pass\n")
+        self._commit_file(origin, os.path.join("assets", "data.txt"), "large file\n")
+
+        workspace = os.path.join(tmp_dir, "build")
+        with patch("src.config.SPARSE_PATHS", ["tests"]):
+            result = self.pipeline.clone_pull_repo("file://" + origin.working_dir, workspace, "main", strategy="sparse")
+
+        self.assertTrue(result)
+        self.assertTrue(os.path.exists(os.path.join(workspace, "tests", "test_app.py")))
+        self.assertFalse(os.path.exists(os.path.join(workspace, "assets")))
+
+    def test_clone_unknown_strategy_fails(self):
+        """
+        Test that an unknown clone strategy is reported as a failed clone.
+        """
+        result = self.pipeline.clone_pull_repo(repo_url, self.test_repo_dir, strategy="torrent")
+        self.assertFalse(result)
+
     def test_check_python_syntax_valid(self):
         """
         Test syntax checking with valid Python code.
@@ -90,22 +277,106 @@ class TestCIPipeline(unittest.TestCase):
         syntax_output, syntax_success = self.pipeline.check_python_syntax(self.test_build_id, self.test_repo_dir)
         self.assertFalse(syntax_success)
         
-    @patch('subprocess.run')
-    def test_run_tests_success(self, mock_run):
+    @patch("src.config.SYNTAX_CHUNK_SIZE", 2)
+    def test_check_python_syntax_parallel(self):
+        """
+        Test that the parallel syntax check reports the same errors, in file order, as a single worker.
+        """
+        os.makedirs(self.test_repo_dir)
+        for i in range(7):
+            with open(os.path.join(self.test_repo_dir, f"module_{i}.py"), 'w') as f:
+                f.write("df broken(:\n" if i in (1, 5) else "x = 1\n")
+
+        serial_errors, serial_success = self.pipeline.check_python_syntax(self.test_build_id, self.test_repo_dir, workers=1)
+        self.pipeline.syntax_cache = None
+        parallel_errors, parallel_success = self.pipeline.check_python_syntax(self.test_build_id, self.test_repo_dir, workers=3)
+
+        self.assertFalse(parallel_success)
+        self.assertEqual(parallel_errors, serial_errors)
+        self.assertEqual(len(parallel_errors), 2)
+        self.assertIn("module_1.py", parallel_errors[0])
+
+    def test_check_python_syntax_uses_cache(self):
+        """
+        Test that files checked by an earlier build are not parsed again, and their errors are still reported.
+        """
+        os.makedirs(self.test_repo_dir)
+        with open(os.path.join(self.test_repo_dir, "valid.py"), 'w') as f:
+            f.write("x = 1\n")
+        with open(os.path.join(self.test_repo_dir, "invalid.py"), 'w') as f:
+            f.write("df broken(:\n")
+
+        first_errors, _ = self.pipeline.check_python_syntax(self.test_build_id, self.test_repo_dir, workers=1)
+        with patch("src.ci_pipeline._parse_python_files", return_value=[]) as mock_parse:
+            second_errors, second_success = self.pipeline.check_python_syntax(self.test_build_id, self.test_repo_dir, workers=1)
+
+        mock_parse.assert_called_once_with([])
+        self.assertFalse(second_success)
+        self.assertEqual(second_errors, first_errors)
+
+    def test_list_repo_files_skips_excluded_trees(self):
+        """
+        Test that the tree walk does not descend into virtualenvs or node_modules.
+        """
+        for directory in ["src", "venv/lib", "web/node_modules/pkg"]:
+            os.makedirs(os.path.join(self.test_repo_dir, directory))
+        for path in ["src/app.py", "venv/lib/six.py", "web/node_modules/pkg/index.py", "README.md"]:
+            with open(os.path.join(self.test_repo_dir, path), 'w') as f:
+                f.write("x = 1\n")
+
+        walked = []
+        real_walk = os.walk
+
+        def recording_walk(top):
+            for root, dirs, files in real_walk(top):
+                walked.append(root)
+                yield root, dirs, files
+
+        with patch("os.walk", recording_walk):
+            files = self.pipeline.list_repo_files(self.test_repo_dir, include=["*.py"])
+
+        self.assertEqual(files, [os.path.join(self.test_repo_dir, "src", "app.py")])
+        self.assertFalse(any("venv" in root or "node_modules" in root for root in walked))
+
+    def test_list_repo_files_skips_git_ignored_files(self):
+        """
+        Test that in a git checkout only tracked and non-ignored files are listed.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        origin = self._init_origin(tmp_dir)
+        self._commit_file(origin, ".gitignore", "generated/\n")
+        self._commit_file(origin, "app.py", "x = 1\n")
+        os.makedirs(os.path.join(origin.working_dir, "generated"))
+        with open(os.path.join(origin.working_dir, "generated", "out.py"), 'w') as f:
+            f.write("df broken(:\n")
+        with open(os.path.join(origin.working_dir, "new.py"), 'w') as f:
+            f.write("y = 2\n")
+
+        files = self.pipeline.list_repo_files(origin.working_dir, include=["*.py"])
+
+        self.assertEqual(files, [os.path.join(origin.working_dir, "app.py"), os.path.join(origin.working_dir, "new.py")])
+        _, success = self.pipeline.check_python_syntax(self.test_build_id, origin.working_dir)
+        self.assertTrue(success)
+
+    @patch('subprocess.Popen')
+    def test_run_tests_success(self, mock_popen):
         """
         Test successful test execution with pytest.
         """
         os.makedirs(os.path.join(self.test_repo_dir, "tests"))
-        mock_run.return_value.returncode = 0
-        mock_run.return_value.stdout = "All tests passed"
+        mock_popen.return_value.returncode = 0
         
         result = self.pipeline.run_tests(self.test_build_id, self.test_repo_dir)
         
         self.assertTrue(result)
-        mock_run.assert_called_once_with(
-            ["pytest", os.path.join(self.test_repo_dir, "tests")],
-            capture_output=True,
-            text=True
+        mock_popen.assert_called_once_with(
+            ["pytest", "-p", "ci_pytest_plugin", os.path.join(self.test_repo_dir, "tests")],
+            stdout=ANY,
+            stderr=subprocess.STDOUT,
+            text=True,
+            env=ANY,
+            start_new_session=(os.name == "posix")
         )
         
     def test_run_tests_no_test_directory(self):
@@ -116,21 +387,284 @@ class TestCIPipeline(unittest.TestCase):
         
         result = self.pipeline.run_tests(self.test_build_id, self.test_repo_dir)
         
-        self.assertTrue(result)  # No tests = no tests to fail = True
+        self.assertEqual(result, ("No tests directory found.", True))  # No tests = no tests to fail = True
 
         
-    @patch('subprocess.run')
-    def test_run_tests_failure(self, mock_run):
+    @patch('subprocess.Popen')
+    def test_run_tests_failure(self, mock_popen):
         """
         Test failed test execution with pytest.
         """
         os.makedirs(os.path.join(self.test_repo_dir, "tests"))
-        mock_run.return_value.returncode = 1
-        mock_run.return_value.stdout = "Test failures occurred"
+        mock_popen.return_value.returncode = 1
         
         cleaned_output, success = self.pipeline.run_tests(self.test_build_id, self.test_repo_dir)
         self.assertFalse(success)
 
+    def _write_tests(self, failing=False):
+        tests_dir = os.path.join(self.test_repo_dir, "tests")
+        os.makedirs(tests_dir)
+        for i in range(3):
+            with open(os.path.join(tests_dir, f"test_module_{i}.py"), 'w') as f:
+                f.write("def test_a():\n    assert True\n\ndef test_b():\n    assert True\n")
+        if failing:
+            with open(os.path.join(tests_dir, "test_broken.py"), 'w') as f:
+                f.write("def test_broken():\n    assert 1 == 2\n")
+
+    def test_run_tests_sharded_success(self):
+        """
+        Test that a sharded run executes every collected test once and merges the results.
+        """
+        self._write_tests()
+
+        output, success = self.pipeline.run_tests(self.test_build_id, self.test_repo_dir, shards=2)
+
+        self.assertTrue(success)
+
+    def test_run_tests_sharded_failure(self):
+        """
+        Test that a failure in one shard fails the whole run and is reported.
+        """
+        self._write_tests(failing=True)
+
+        output, success = self.pipeline.run_tests(self.test_build_id, self.test_repo_dir, shards=3)
+
+        self.assertFalse(success)
+        self.assertIn("test_broken", output)
+
+    def test_run_tests_reports_structured_failures(self):
+        """
+        Test that the failure summary lists each failed test with its cause, built from the plugin's reports.
+        """
+        self._write_tests(failing=True)
+
+        output, success = self.pipeline.run_tests(self.test_build_id, self.test_repo_dir)
+
+        self.assertFalse(success)
+        lines = output.split("\n")
+        self.assertTrue(lines[0].startswith("6 passed, 1 failed, 0 skipped in "))
+        self.assertIn("FAILED test_broken.py::test_broken", lines)
+        self.assertIn("Error cause: assert 1 == 2", lines)
+
+        with open(os.path.join(self.test_repo_dir, "tests", "test_import_error.py"), 'w') as f:
+            f.write("import module_that_does_not_exist\n")
+
+        output, success = self.pipeline.run_tests(self.test_build_id, self.test_repo_dir)
+
+        self.assertFalse(success)
+        self.assertIn("ERROR collecting test_import_error.py", output.split("\n"))
+        self.assertIn("No module named 'module_that_does_not_exist'", output)
+
+    def test_run_tests_streams_output_to_file(self):
+        """
+        Test that the test output is written to the build's output file and only its tail is kept for the log.
+        """
+        tests_dir = os.path.join(self.test_repo_dir, "tests")
+        os.makedirs(tests_dir)
+        with open(os.path.join(tests_dir, "test_chatty.py"), 'w') as f:
+            f.write("def test_chatty():\n    print('x' * 100000)\n    assert False\n")
+
+        output, success = self.pipeline.run_tests(self.test_build_id, self.test_repo_dir)
+
+        self.assertFalse(success)
+        output_path = self.pipeline.logger.output_path(self.test_build_id, "tests")
+        self.assertGreater(os.path.getsize(output_path), 100000)
+        self.assertIn("FAILED test_chatty.py::test_chatty", output)
+        self.assertLess(len(self.pipeline._tail(output_path, 3)), 1000)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "The warm runner needs os.fork")
+    def test_run_tests_with_warm_runner(self):
+        """
+        Test that tests forked from the warm runner give the same results, sharded or not.
+        """
+        self._write_tests(failing=True)
+        with patch("src.config.WARM_RUNNER", True):
+            pipeline = self._pipeline(syntax_cache_db="", test_history_db="")
+        self.addCleanup(pipeline.warm_runner.stop)
+
+        output, success = pipeline.run_tests(self.test_build_id, self.test_repo_dir)
+        self.assertFalse(success)
+        self.assertTrue(output.startswith("6 passed, 1 failed"))
+
+        output, success = pipeline.run_tests(self.test_build_id, self.test_repo_dir, shards=2)
+        self.assertFalse(success)
+        self.assertTrue(output.startswith("6 passed, 1 failed"))
+
+    @patch("src.config.TEST_TIMEOUT", 2)
+    def test_run_tests_timeout_kills_process_tree(self):
+        """
+        Test that a hanging test run and the processes it started are killed at the stage timeout.
+        """
+        tests_dir = os.path.join(self.test_repo_dir, "tests")
+        os.makedirs(tests_dir)
+        with open(os.path.join(tests_dir, "test_hang.py"), 'w') as f:
+            f.write("import subprocess, sys\n\ndef test_hang():\n"
+                    "    subprocess.run([sys.executable, '-c', 'import time; time.sleep(60)'])\n")
+
+        output, success = self.pipeline.run_tests(self.test_build_id, self.test_repo_dir)
+
+        self.assertFalse(success)
+        self.assertIn("Resource limit hit: wall-clock timeout of 2s", output)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "CPU rlimits are only checked on Linux")
+    @patch("src.config.TEST_CPU_SECONDS", 1)
+    def test_run_tests_cpu_limit(self):
+        """
+        Test that a test run spinning on the CPU is stopped by the CPU time limit.
+        """
+        tests_dir = os.path.join(self.test_repo_dir, "tests")
+        os.makedirs(tests_dir)
+        with open(os.path.join(tests_dir, "test_spin.py"), 'w') as f:
+            f.write("def test_spin():\n    while True:\n        pass\n")
+
+        output, success = self.pipeline.run_tests(self.test_build_id, self.test_repo_dir)
+
+        self.assertFalse(success)
+        self.assertIn("Resource limit hit: CPU time limit of 1s", output)
+
+    def test_assign_shards_covers_every_test(self):
+        """
+        Test that every test ID is assigned to exactly one shard.
+        """
+        test_ids = [f"tests/test_x.py::test_{i}" for i in range(10)]
+        assignments = self.pipeline._assign_shards(test_ids, 3)
+
+        self.assertEqual(len(assignments), 3)
+        self.assertEqual(sorted(sum(assignments, [])), sorted(test_ids))
+
+    def test_assign_shards_balances_expected_runtime(self):
+        """
+        Test that shards are balanced by test duration history and recent failures run first.
+        """
+        test_ids = ["t::slow", "t::a", "t::b", "t::c", "t::d"]
+        history = {
+            "t::slow": {"duration": 4.0, "failed": False},
+            "t::a": {"duration": 1.0, "failed": False},
+            "t::b": {"duration": 1.0, "failed": False},
+            "t::c": {"duration": 1.0, "failed": False},
+            "t::d": {"duration": 1.0, "failed": True},
+        }
+
+        assignments = self.pipeline._assign_shards(test_ids, 2, history)
+
+        self.assertIn(["t::slow"], assignments)
+        self.assertIn(["t::d", "t::a", "t::b", "t::c"], assignments)
+
+    def test_run_tests_records_history(self):
+        """
+        Test that a run with a repository URL stores every test's outcome in the history.
+        """
+        self._write_tests(failing=True)
+
+        output, success = self.pipeline.run_tests(self.test_build_id, self.test_repo_dir, repo_url=repo_url)
+        history = self.pipeline.test_history.lookup(repo_url)
+
+        self.assertFalse(success)
+        self.assertEqual(len(history), 7)
+        self.assertTrue(history["test_broken.py::test_broken"]["failed"])
+        self.assertFalse(history["test_module_0.py::test_a"]["failed"])
+
+    def _write_flaky_test(self):
+        tests_dir = os.path.join(self.test_repo_dir, "tests")
+        os.makedirs(tests_dir, exist_ok=True)
+        marker = os.path.join(self.test_repo_dir, "ran_once")
+        with open(os.path.join(tests_dir, "test_flaky.py"), 'w') as f:
+            f.write("import os\n\ndef test_ok():\n    pass\n\ndef test_flaky():\n"
+                    f"    if not os.path.exists({marker!r}):\n"
+                    f"        open({marker!r}, 'w').close()\n"
+                    "        assert False, 'first run'\n")
+
+    def test_run_tests_retries_failed_tests_and_marks_flakes(self):
+        """
+        Test that a test failing once passes the build on retry, is reported as flaky and gets a flake rate.
+        """
+        self._write_flaky_test()
+
+        output, success = self.pipeline.run_tests(self.test_build_id, self.test_repo_dir, repo_url=repo_url)
+
+        self.assertTrue(success)
+        self.assertIn("test_flaky.py::test_flaky", output)
+        self.assertEqual(self.pipeline.test_history.flake_rates(repo_url),
+                         {"test_flaky.py::test_flaky": 1.0})
+        with open(self.pipeline.logger.output_path(self.test_build_id, "tests"), 'r') as f:
+            rerun = f.read().split("===== Retry 1 of 1 failed test(s) =====")[1]
+        self.assertIn("1 passed, 1 deselected", rerun)
+
+    @patch("src.config.TEST_RETRIES", 0)
+    def test_run_tests_without_retries_fails_on_flaky_test(self):
+        """
+        Test that with retries disabled a test failing once fails the build.
+        """
+        self._write_flaky_test()
+
+        output, success = self.pipeline.run_tests(self.test_build_id, self.test_repo_dir)
+
+        self.assertFalse(success)
+        self.assertTrue(output.startswith("1 passed, 1 failed"))
+
+    def test_run_tests_retry_keeps_consistent_failures(self):
+        """
+        Test that a test failing on every retry still fails the build.
+        """
+        self._write_tests(failing=True)
+
+        output, success = self.pipeline.run_tests(self.test_build_id, self.test_repo_dir)
+
+        self.assertFalse(success)
+        self.assertTrue(output.startswith("6 passed, 1 failed"))
+        self.assertNotIn("FLAKY", output)
+
+    @patch("src.config.TEST_SELECTION", "impacted")
+    def test_select_tests_runs_only_impacted_tests(self):
+        """
+        Test that a feature branch only runs the tests importing modules changed since the last green build.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        origin = self._init_origin(tmp_dir)
+        os.makedirs(os.path.join(origin.working_dir, "app"))
+        os.makedirs(os.path.join(origin.working_dir, "tests"))
+        self._commit_file(origin, "app/__init__.py", "")
+        self._commit_file(origin, "app/a.py", "A = 1\n")
+        self._commit_file(origin, "app/b.py", "B = 1\n")
+        self._commit_file(origin, "tests/__init__.py", "")
+        self._commit_file(origin, "tests/test_a.py", "from app.a import A\n\ndef test_a():\n    assert A == 2\n")
+        green_commit = self._commit_file(origin, "tests/test_b.py", "from app.b import B\n\ndef test_b():\n    assert B == 1\n")
+        self.pipeline.record_green_build(repo_url, "main", green_commit)
+        self._commit_file(origin, "app/a.py", "A = 2\n")
+
+        test_files = self.pipeline.select_tests(self.test_build_id, origin.working_dir, repo_url, "feature")
+        self.assertEqual(test_files, [os.path.join(origin.working_dir, "tests", "test_a.py")])
+        self.assertIsNone(self.pipeline.select_tests(self.test_build_id, origin.working_dir, repo_url, "main"))
+
+        self._commit_file(origin, "app/b.py", "B = 2\n")
+        output, success = self.pipeline.run_tests(self.test_build_id, origin.working_dir, repo_url=repo_url, test_files=test_files)
+        self.assertTrue(success)
+
+    @patch("src.config.TEST_SELECTION", "impacted")
+    def test_select_tests_without_green_build_runs_full_suite(self):
+        """
+        Test that the full suite runs when there is no green build to compare with.
+        """
+        self.assertIsNone(self.pipeline.select_tests(self.test_build_id, self.test_repo_dir, repo_url, "feature"))
+
+    @patch('subprocess.Popen')
+    def test_run_tests_cancelled(self, mock_popen):
+        """
+        Test that a running pytest process is killed when the build is superseded.
+        """
+        os.makedirs(os.path.join(self.test_repo_dir, "tests"))
+        process = mock_popen.return_value
+        process.wait.side_effect = [subprocess.TimeoutExpired("pytest", 0.5), None]
+        process.poll.return_value = None
+        cancel_event = threading.Event()
+        cancel_event.set()
+
+        output, success = self.pipeline.run_tests(self.test_build_id, self.test_repo_dir, cancel_event)
+
+        self.assertFalse(success)
+        process.kill.assert_called_once()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest.mock import patch
+from src.env_cache import EnvironmentCache, python_path
+
+
+class TestEnvironmentCache(unittest.TestCase):
+    def setUp(self):
+        """
+        Set up an empty cache and a requirements file. Installing packages is skipped,
+        so the tests do not need network access.
+        """
+        self.test_dir = tempfile.mkdtemp()
+        self.cache = EnvironmentCache(os.path.join(self.test_dir, "envs"))
+        self.requirements = os.path.join(self.test_dir, "requirements.txt")
+        with open(self.requirements, "w") as f:
+            f.write("requests==2.32.3\n")
+        patcher = patch.object(EnvironmentCache, "_install")
+        self.mock_install = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """
+        Clean up after each test.
+        """
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_environment_is_built_once_and_materialized_per_build(self):
+        """
+        Test that builds with the same requirements share one cached environment.
+        """
+        first = self.cache.materialize(self.requirements, os.path.join(self.test_dir, "build1"))
+        second = self.cache.materialize(self.requirements, os.path.join(self.test_dir, "build2"))
+
+        self.assertEqual(self.mock_install.call_count, 1)
+        self.assertEqual(first, python_path(os.path.join(self.test_dir, "build1")))
+        prefix = subprocess.run([second, "-c", "import sys; print(sys.prefix)"], capture_output=True, text=True).stdout.strip()
+        self.assertEqual(os.path.realpath(prefix), os.path.realpath(os.path.join(self.test_dir, "build2")))
+
+    def test_changed_requirements_get_a_new_environment(self):
+        """
+        Test that the cache key follows the content of the requirements file.
+        """
+        first_key = self.cache.environment_key(self.requirements)
+        with open(self.requirements, "a") as f:
+            f.write("flask==3.0.0\n")
+
+        self.assertNotEqual(self.cache.environment_key(self.requirements), first_key)
+
+    def test_least_recently_used_environment_is_evicted(self):
+        """
+        Test that older environments are deleted when the cache is over its disk budget.
+        """
+        self.cache.materialize(self.requirements, os.path.join(self.test_dir, "build1"))
+        old_key = self.cache.environment_key(self.requirements)
+        with open(self.requirements, "w") as f:
+            f.write("flask==3.0.0\n")
+        self.cache.max_bytes = 1
+
+        self.cache.materialize(self.requirements, os.path.join(self.test_dir, "build2"))
+
+        self.assertEqual(os.listdir(self.cache.cache_dir), [self.cache.environment_key(self.requirements)])
+        self.assertNotEqual(old_key, self.cache.environment_key(self.requirements))
+
+
+if __name__ == "__main__":
+    unittest.main()
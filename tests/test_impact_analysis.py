@@ -0,0 +1,75 @@
+import unittest
+import os
+import shutil
+import tempfile
+from src.impact_analysis import module_names, build_import_graph, impacted_files
+
+
+class TestImpactAnalysis(unittest.TestCase):
+    def setUp(self):
+        """
+        Set up a small repository: tests import app.service, which imports app.models.
+        """
+        self.repo_dir = tempfile.mkdtemp()
+        self.files = {
+            "app/__init__.py": "",
+            "app/models.py": "class Model:\n    pass\n",
+            "app/service.py": "from .models import Model\n",
+            "app/unused.py": "import json\n",
+            "tests/test_service.py": "from app.service import Model\n",
+            "tests/test_unused.py": "import app.unused\n",
+        }
+        for path, content in self.files.items():
+            file_path = os.path.join(self.repo_dir, *path.split("/"))
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "w") as f:
+                f.write(content)
+        self.graph = build_import_graph(
+            self.repo_dir, [os.path.join(self.repo_dir, *path.split("/")) for path in self.files]
+        )
+
+    def tearDown(self):
+        """
+        Clean up after each test.
+        """
+        shutil.rmtree(self.repo_dir, ignore_errors=True)
+
+    def test_module_names(self):
+        """
+        Test that a file can be imported by every dotted suffix of its path.
+        """
+        self.assertEqual(module_names("src/pkg/mod.py"), ["src.pkg.mod", "pkg.mod", "mod"])
+        self.assertEqual(module_names("src/pkg/__init__.py"), ["src.pkg", "pkg"])
+
+    def test_change_impacts_transitive_importers(self):
+        """
+        Test that a change to a module impacts the tests that import it through another module.
+        """
+        impacted = impacted_files(self.graph, ["app/models.py"])
+
+        self.assertIn("app/service.py", impacted)
+        self.assertIn("tests/test_service.py", impacted)
+        self.assertNotIn("tests/test_unused.py", impacted)
+
+    def test_package_init_impacts_all_importers(self):
+        """
+        Test that a change to a package's __init__.py impacts everything importing from the package.
+        """
+        impacted = impacted_files(self.graph, ["app/__init__.py"])
+
+        self.assertIn("tests/test_service.py", impacted)
+        self.assertIn("tests/test_unused.py", impacted)
+
+    def test_deleted_module_impacts_importers(self):
+        """
+        Test that deleting a module impacts the tests that imported it.
+        """
+        os.remove(os.path.join(self.repo_dir, "app", "unused.py"))
+
+        impacted = impacted_files(self.graph, ["app/unused.py"])
+
+        self.assertEqual(impacted, {"app/unused.py", "tests/test_unused.py"})
+
+
+if __name__ == "__main__":
+    unittest.main()
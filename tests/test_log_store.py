@@ -0,0 +1,82 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import patch
+from src.log_store import LogStore, FRAME_BYTES
+
+
+class TestLogStore(unittest.TestCase):
+    def setUp(self):
+        """
+        Set up an empty log store for each test.
+        """
+        self.test_dir = tempfile.mkdtemp()
+        self.store_dir = os.path.join(self.test_dir, "archive")
+
+    def tearDown(self):
+        """
+        Clean up after each test.
+        """
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_logs_are_compressed_and_read_back_per_build(self):
+        """
+        Test that each build's logs are read back exactly, and that repetitive logs are stored compressed.
+        """
+        store = LogStore(self.store_dir)
+        log = "".join(f"line {i} of a pytest run\n" for i in range(100000))
+        store.append("a", "build_a.log", log)
+        store.append("b", "build_b.log", "other build\n")
+        store.append("a", "build_a.log", "more\n")
+
+        reopened = LogStore(self.store_dir)
+
+        self.assertEqual(reopened.read("a", "build_a.log"), log + "more\n")
+        self.assertEqual(reopened.read("b", "build_b.log"), "other build\n")
+        self.assertIsNone(reopened.read("a", "build_a_tests.out"))
+        self.assertEqual(reopened.names("a"), ["build_a.log"])
+        self.assertLess(reopened.size(), len(log) / 10)
+
+    def test_large_file_is_split_into_frames_and_segments(self):
+        """
+        Test that a file larger than a frame is stored as several frames spread over new segments.
+        """
+        path = os.path.join(self.test_dir, "build_a_tests.out")
+        with open(path, "wb") as f:
+            f.write(os.urandom(FRAME_BYTES * 2 + 10))
+        store = LogStore(self.store_dir, segment_max_bytes=FRAME_BYTES)
+
+        store.append_file("a", "build_a_tests.out", path)
+
+        segments = [name for name in os.listdir(self.store_dir) if name.endswith(".gz")]
+        self.assertEqual(len(segments), 3)
+        with open(path, "rb") as f:
+            self.assertEqual(store.read("a", "build_a_tests.out"), f.read().decode("utf-8", errors="replace"))
+
+    def test_retention_deletes_oldest_segments(self):
+        """
+        Test that segments above the size budget or past the age limit are deleted, oldest first,
+        and that the segment being written to is kept.
+        """
+        store = LogStore(self.store_dir, segment_max_bytes=1, max_bytes=0, max_age_days=0)
+        for build_id in ["a", "b", "c"]:
+            store.append(build_id, "log", os.urandom(1000).hex())
+
+        store.max_bytes = store.size() - 1
+        expired_builds = []
+        self.assertEqual(store.enforce_retention(expired_builds), 1)
+        self.assertEqual(expired_builds, ["a"])
+        self.assertIsNone(store.read("a", "log"))
+        self.assertIsNotNone(store.read("b", "log"))
+
+        store.max_bytes, store.max_age_days = 0, 1
+        with patch("src.log_store.time.time", return_value=time.time() + 2 * 86400):
+            self.assertEqual(store.enforce_retention(), 1)
+        self.assertIsNone(store.read("b", "log"))
+        self.assertIsNotNone(store.read("c", "log"))
+
+
+if __name__ == "__main__":
+    unittest.main()
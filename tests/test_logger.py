@@ -0,0 +1,136 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from src.build_index import BuildIndex
+from src.logger import BuildLogger, LogWriter
+
+
+class TestBuildLogger(unittest.TestCase):
+    def setUp(self):
+        """
+        Set up a log directory and a writer of its own for each test.
+        """
+        self.test_dir = tempfile.mkdtemp()
+        self.writer = LogWriter(flush_interval=60, buffer_records=1000, max_open_files=2)
+        self.logger = BuildLogger(self.test_dir, writer=self.writer)
+
+    def tearDown(self):
+        """
+        Stop the writer and clean up after each test.
+        """
+        self.writer.close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _read_log(self, build_id):
+        path = os.path.join(self.test_dir, f"build_{build_id}.log")
+        if not os.path.exists(path):
+            return ""
+        with open(path, "r") as f:
+            return f.read()
+
+    def test_records_are_written_in_order_on_flush(self):
+        """
+        Test that queued records reach the log file, in order, once the logger is flushed.
+        """
+        self.logger.log_build_result("1", "git", "success", "cloned")
+        self.logger.log_build_result("1", "tests", "failure", "1 failed")
+
+        self.assertTrue(self.logger.flush(timeout=10))
+        log = self._read_log("1")
+
+        self.assertRegex(log, r"^\[[\d\- :]+\] git: success\nDetails: cloned\n\n")
+        self.assertLess(log.index("git: success"), log.index("tests: failure"))
+
+    def test_full_buffer_is_written_before_the_interval(self):
+        """
+        Test that a full buffer is written without waiting for the flush interval.
+        """
+        writer = LogWriter(flush_interval=60, buffer_records=2)
+        self.addCleanup(writer.close)
+        logger = BuildLogger(self.test_dir, writer=writer)
+
+        logger.log_build_result("2", "git", "success", "a")
+        logger.log_build_result("2", "tests", "success", "b")
+
+        deadline = time.monotonic() + 10
+        while "tests: success" not in self._read_log("2") and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertIn("tests: success", self._read_log("2"))
+
+    def test_open_files_are_capped(self):
+        """
+        Test that the writer keeps at most max_open_files log files open and still writes every record.
+        """
+        for build_id in ["a", "b", "c", "a"]:
+            self.logger.log_build_result(build_id, "tests", "success", build_id)
+            self.logger.flush(timeout=10)
+            self.assertLessEqual(len(self.writer._files), 2)
+
+        self.assertEqual(self._read_log("a").count("tests: success"), 2)
+        self.assertIn("tests: success", self._read_log("c"))
+
+    def test_close_writes_pending_records(self):
+        """
+        Test that closing the writer writes the records still queued.
+        """
+        for i in range(100):
+            self.logger.log_build_result("3", "tests", "success", str(i))
+
+        self.writer.close()
+
+        self.assertEqual(self._read_log("3").count("tests: success"), 100)
+
+    def test_archive_build_moves_logs_into_the_store(self):
+        """
+        Test that archiving a finished build compresses its log and output files away and keeps them readable.
+        """
+        self.logger.log_build_result("4", "tests", "failure", "1 failed")
+        with open(self.logger.output_path("4", "tests"), "w") as f:
+            f.write("FAILED test_x\n" * 1000)
+
+        self.logger.archive_build("4")
+
+        self.assertEqual(os.listdir(self.test_dir), ["archive"])
+        self.assertIn("tests: failure", self.logger.read_log("4"))
+        self.assertEqual(self.logger.read_log("4", "tests"), "FAILED test_x\n" * 1000)
+        self.assertIsNone(self.logger.read_log("5"))
+
+    def test_records_are_searchable(self):
+        """
+        Test that logged records reach the full-text index with their build's branch.
+        """
+        writer = LogWriter(flush_interval=60, index=BuildIndex(os.path.join(self.test_dir, "build_index.db")))
+        self.addCleanup(writer.close)
+        logger = BuildLogger(self.test_dir, writer=writer)
+
+        logger.start_build("6", "https://example.com/repo.git", "feature", "abc")
+        logger.log_build_result("6", "tests", "failure", "Error cause: assert 1 == 2")
+        results = logger.search("assert", status="failure")
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual((results[0]["build_id"], results[0]["branch_name"]), ("6", "feature"))
+
+    def test_index_forgets_builds_whose_logs_expired(self):
+        """
+        Test that builds whose archived logs are deleted by retention are removed from the index.
+        """
+        writer = LogWriter(flush_interval=60, index=BuildIndex(os.path.join(self.test_dir, "build_index.db")))
+        self.addCleanup(writer.close)
+        logger = BuildLogger(self.test_dir, writer=writer)
+        logger.store.segment_max_bytes = 1
+
+        for build_id in ["7", "8"]:
+            logger.start_build(build_id, "https://example.com/repo.git", "main", build_id)
+            logger.log_build_result(build_id, "tests", "failure", "Error cause: assert 1 == 2")
+            logger.flush()
+            logger.archive_build(build_id)
+        logger.store.max_bytes = 1
+        logger.archive_build("9")
+
+        self.assertEqual([r["build_id"] for r in logger.search("assert")], ["8"])
+
+
+if __name__ == "__main__":
+    unittest.main()
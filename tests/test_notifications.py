@@ -1,9 +1,17 @@
 import unittest
 from unittest.mock import patch
 import smtplib
+import socketserver
+import sqlite3
+import shutil
 import sys
 import os
-from  src.notifications import send_email_notification
+import tempfile
+import threading
+import time
+from  src.notifications import send_email_notification, NotificationDispatcher, SMTPConnectionPool, build_email, summarize_log
+import email
+import gzip
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
 
@@ -37,6 +45,257 @@ class TestNotifications(unittest.TestCase):
         self.assertIn(commit_id, email_content)
         self.assertIn(log_content, email_content)
 
+    def test_long_log_is_cut_down_to_failures(self):
+        """
+        Tests that a log above the size limit keeps the counts and failures and stays within the limit.
+        """
+        lines = ["3 passed, 2 failed, 0 skipped in 1.00s"]
+        lines += [f"captured output line {i}" for i in range(10000)]
+        lines += ["FAILED tests/test_a.py::test_x", "Error cause: assert " + "x" * 5000,
+                  "FAILED tests/test_a.py::test_y", "Error cause: KeyError: 'y'"]
+
+        summary, truncated = summarize_log("\n".join(lines), max_bytes=2048)
+
+        self.assertTrue(truncated)
+        self.assertLessEqual(len(summary.encode()), 2048 + 100)
+        self.assertTrue(summary.startswith("3 passed, 2 failed"))
+        self.assertIn("FAILED tests/test_a.py::test_y\nError cause: KeyError: 'y'", summary)
+        self.assertIn("more line(s) not shown", summary)
+        self.assertEqual(summarize_log(["Syntax error in a.py", "Syntax error in b.py"]),
+                         ("Syntax error in a.py\nSyntax error in b.py", False))
+
+    @patch("src.config.PUBLIC_URL", "https://ci.example.com")
+    @patch("src.config.NOTIFY_MAX_LOG_BYTES", 4096)
+    def test_long_log_is_attached_compressed_and_linked(self):
+        """
+        Tests that an email with a cut-down log stays small, links the log endpoint and attaches the full log gzipped.
+        """
+        log_output = "1 passed, 1 failed\nFAILED t::x\n" + "noise line\n" * 100000
+
+        msg = email.message_from_string(build_email("b1", "abc1234", "dev@example.com", "failed", log_output, "dev", "main").as_string())
+        parts = [part for part in msg.walk() if not part.is_multipart()]
+
+        self.assertLess(len(msg.as_string()), 64 * 1024)
+        self.assertIn("https://ci.example.com/logs/b1", parts[0].get_payload())
+        self.assertIn("FAILED t::x", parts[0].get_payload())
+        self.assertEqual(parts[1].get_filename(), "build_b1.log.gz")
+        self.assertEqual(gzip.decompress(parts[1].get_payload(decode=True)).decode(), log_output)
+
+
+class _StandInSMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Speaks just enough SMTP for smtplib, refusing the next server.fail_next emails.
+    """
+    def _reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self._reply("220 localhost stand-in SMTP server")
+        in_data, lines, recipients = False, [], []
+        for raw in self.rfile:
+            line = raw.decode().rstrip("\r\n")
+            if in_data:
+                if line == ".":
+                    self.server.messages.append((recipients, "\n".join(lines)))
+                    in_data, lines = False, []
+                    self._reply("250 OK")
+                else:
+                    lines.append(line)
+                continue
+
+            command = line[:4].upper()
+            if command in ("EHLO", "HELO"):
+                self._reply("250 localhost")
+            elif command == "MAIL" and self.server.fail_next > 0:
+                self.server.fail_next -= 1
+                self._reply("451 Try again later")
+            elif command == "MAIL":
+                recipients = []
+                self._reply("250 OK")
+            elif command == "RCPT":
+                recipients.append(line[8:].strip("<>"))
+                self._reply("250 OK")
+            elif command == "DATA":
+                in_data = True
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("250 OK")
+
+
+class TestNotificationDispatcher(unittest.TestCase):
+    def setUp(self):
+        """
+        Start a local stand-in SMTP server and set up a fresh outbox for each test.
+        """
+        self.smtp = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _StandInSMTPHandler)
+        self.smtp.daemon_threads = True
+        self.smtp.connections, self.smtp.messages, self.smtp.fail_next = 0, [], 0
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, "outbox.db")
+        sender_patch = patch("src.notifications.sender", "ci@example.com")
+        sender_patch.start()
+        self.addCleanup(sender_patch.stop)
+
+    def tearDown(self):
+        """
+        Stop the stand-in SMTP server and clean up after each test.
+        """
+        self.smtp.shutdown()
+        self.smtp.server_close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _dispatcher(self, **kwargs):
+        pool = SMTPConnectionPool("127.0.0.1", self.smtp.server_address[1], password="", size=1, use_tls=False)
+        dispatcher = NotificationDispatcher(pool, db_path=self.db_path, **kwargs)
+        self.addCleanup(dispatcher.stop, 5)
+        return dispatcher
+
+    def _wait_for(self, dispatcher, key, count):
+        deadline = time.monotonic() + 10
+        while dispatcher.stats()[key] < count and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return dispatcher.stats()
+
+    def test_emails_are_sent_over_one_reused_connection(self):
+        """
+        Test that queued notifications are sent in the background over a single pooled connection.
+        """
+        dispatcher = self._dispatcher()
+        dispatcher.start()
+        for commit_id in ["aaa1111", "bbb2222", "ccc3333"]:
+            dispatcher.notify("1", commit_id, "dev@example.com", "failed", "log", "dev", "main")
+
+        stats = self._wait_for(dispatcher, "sent", 3)
+
+        self.assertEqual(stats["sent"], 3)
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual(stats["smtp_connections_opened"], 1)
+        self.assertEqual([recipients for recipients, _ in self.smtp.messages], [["dev@example.com"]] * 3)
+        self.assertIn("Commit: bbb2222", self.smtp.messages[1][1])
+
+    def test_failed_sends_are_retried_with_backoff(self):
+        """
+        Test that an email refused by the server is retried until it is sent.
+        """
+        self.smtp.fail_next = 2
+        dispatcher = self._dispatcher(backoff_seconds=0.05)
+        dispatcher.start()
+        email_id = dispatcher.notify("1", "abc1234", "dev@example.com", "succeeded", "log", "dev", "main")
+
+        stats = self._wait_for(dispatcher, "sent", 1)
+
+        self.assertEqual(stats["sent"], 1)
+        with sqlite3.connect(self.db_path) as conn:
+            attempts = conn.execute("SELECT attempts FROM outbox WHERE id = ?", (email_id,)).fetchone()[0]
+        self.assertEqual(attempts, 3)
+
+    def test_email_is_given_up_after_max_attempts(self):
+        """
+        Test that an email that keeps failing is marked failed after the last attempt.
+        """
+        self.smtp.fail_next = 100
+        dispatcher = self._dispatcher(max_attempts=2, backoff_seconds=0.01)
+        dispatcher.start()
+        dispatcher.notify("1", "abc1234", "dev@example.com", "failed", "log", "dev", "main")
+
+        stats = self._wait_for(dispatcher, "failed", 1)
+
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(stats["sent"], 0)
+
+    def test_build_without_receiver_is_not_queued(self):
+        """
+        Test that a pusher without an email address is skipped instead of breaking the outbox.
+        """
+        dispatcher = self._dispatcher()
+
+        with self.assertLogs(level="WARNING"):
+            self.assertIsNone(dispatcher.notify("1", "abc1234", None, "failed", "log", "stranger", "main"))
+        self.assertEqual(dispatcher.stats()["pending"], 0)
+
+    def test_outbox_survives_restart(self):
+        """
+        Test that emails queued before a restart are sent by the next dispatcher on the same outbox.
+        """
+        self._dispatcher().notify("1", "abc1234", "dev@example.com", "failed", "log", "dev", "main")
+
+        dispatcher = self._dispatcher()
+        dispatcher.start()
+        stats = self._wait_for(dispatcher, "sent", 1)
+
+        self.assertEqual(stats["sent"], 1)
+        self.assertEqual(len(self.smtp.messages), 1)
+
+    def test_only_starting_recovers_emails_being_sent(self):
+        """
+        Test that opening the outbox leaves emails another dispatcher is sending alone, and starting it recovers them.
+        """
+        email_id = self._dispatcher().notify("1", "abc1234", "dev@example.com", "failed", "log", "dev", "main")
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE outbox SET status = 'sending' WHERE id = ?", (email_id,))
+
+        dispatcher = self._dispatcher()
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(conn.execute("SELECT status FROM outbox WHERE id = ?", (email_id,)).fetchone()[0], "sending")
+
+        dispatcher.start()
+        self.assertEqual(self._wait_for(dispatcher, "sent", 1)["sent"], 1)
+
+    def test_digest_coalesces_results_per_recipient(self):
+        """
+        Test that in digest mode a recipient's results are sent as one email, failures first.
+        """
+        dispatcher = self._dispatcher(digest=True, digest_window=0.3, urgent_branches=["main"])
+        dispatcher.notify("1", "aaa1111", "dev@example.com", "succeeded", "ok", "dev", "feature")
+        dispatcher.notify("2", "bbb2222", "dev@example.com", "failed", "FAILED test_x", "dev", "feature")
+        dispatcher.notify("3", "ccc3333", "dev@example.com", "succeeded", "ok", "dev", "feature")
+        dispatcher.notify("4", "ddd4444", "other@example.com", "succeeded", "ok", "other", "feature")
+        self.assertEqual(dispatcher.stats()["results_in_digests"], 4)
+
+        dispatcher.start()
+        stats = self._wait_for(dispatcher, "sent", 2)
+
+        self.assertEqual(stats["sent"], 2)
+        self.assertEqual(stats["results_in_digests"], 0)
+        digest = next(message for recipients, message in self.smtp.messages if recipients == ["dev@example.com"])
+        self.assertIn("CI Digest: 3 build(s), 1 failed", digest)
+        self.assertLess(digest.index("bbb2222"), digest.index("aaa1111"))
+        self.assertIn("FAILED test_x", digest)
+
+    def test_digest_lists_syntax_errors_line_by_line(self):
+        """
+        Test that a list of syntax errors is stored in the digest as lines, not as a Python list.
+        """
+        dispatcher = self._dispatcher(digest=True, digest_window=3600, urgent_branches=[])
+        dispatcher.notify("1", "aaa1111", "dev@example.com", "failed", ["a.py:1 invalid syntax", "b.py:2 invalid syntax"],
+                          "dev", "feature")
+
+        with sqlite3.connect(self.db_path) as conn:
+            log_output = conn.execute("SELECT log_output FROM digest_items").fetchone()[0]
+        self.assertEqual(log_output, "a.py:1 invalid syntax\nb.py:2 invalid syntax")
+
+    def test_urgent_failure_bypasses_digest(self):
+        """
+        Test that a failure on a protected branch is sent straight away in digest mode.
+        """
+        dispatcher = self._dispatcher(digest=True, digest_window=3600, urgent_branches=["main"])
+        dispatcher.start()
+        dispatcher.notify("1", "aaa1111", "dev@example.com", "succeeded", "ok", "dev", "main")
+        dispatcher.notify("2", "bbb2222", "dev@example.com", "failed", "FAILED test_x", "dev", "main")
+
+        stats = self._wait_for(dispatcher, "sent", 1)
+
+        self.assertEqual(stats["sent"], 1)
+        self.assertEqual(stats["results_in_digests"], 1)
+        self.assertIn("CI Build: failed, Commit: bbb2222", self.smtp.messages[0][1])
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,75 @@
+import unittest
+import os
+import shutil
+import tempfile
+from src.path_rules import changed_paths, load_path_rules, plan_build
+
+repo_url = "https://github.com/willeStjerna/Group4_2.git"
+
+
+class TestPathRules(unittest.TestCase):
+    def setUp(self):
+        """
+        Set up rules narrowing the tests of one repository for each test.
+        """
+        self.rules = {
+            repo_url: {"skip": ["docs/**", "*.md"], "stages": {"tests": ["*.py", "requirements*.txt"]}},
+            "*": {"skip": ["*.md"]}
+        }
+
+    def test_changed_paths_from_payload(self):
+        """
+        Test that the added, modified and removed paths of every commit are collected.
+        """
+        payload = {"commits": [
+            {"added": ["docs/new.md"], "modified": ["README.md"], "removed": []},
+            {"added": [], "modified": ["src/app.py"], "removed": ["old.py"]}
+        ]}
+        self.assertEqual(changed_paths(payload), {"docs/new.md", "README.md", "src/app.py", "old.py"})
+
+    def test_changed_paths_unknown_for_incomplete_payload(self):
+        """
+        Test that payloads without commits, or with as many as GitHub lists, give no paths.
+        """
+        self.assertIsNone(changed_paths({}))
+        self.assertIsNone(changed_paths({"commits": [{"modified": ["a.md"]}] * 20}))
+
+    def test_docs_only_push_is_skipped(self):
+        """
+        Test that a push changing only documentation needs no build.
+        """
+        self.assertEqual(plan_build(repo_url, {"docs/guide/setup.txt", "README.md"}, self.rules), [])
+
+    def test_stages_are_narrowed_by_changed_paths(self):
+        """
+        Test that stages whose globs match no changed path are left out, and a full build is None.
+        """
+        self.assertEqual(plan_build(repo_url, {"README.md", ".github/workflows/ci.yml"}, self.rules), ["syntax_check"])
+        self.assertIsNone(plan_build(repo_url, {"README.md", "src/app.py"}, self.rules))
+        self.assertIsNone(plan_build(repo_url, None, self.rules))
+
+    def test_other_repositories_use_the_default_rule(self):
+        """
+        Test that repositories without rules of their own fall back to the "*" rule.
+        """
+        other = "https://example.com/other.git"
+        self.assertEqual(plan_build(other, {"CHANGES.md"}, self.rules), [])
+        self.assertIsNone(plan_build(other, {"docs/index.rst"}, self.rules))
+
+    def test_load_path_rules_ignores_invalid_file(self):
+        """
+        Test that an unreadable rules file means full builds rather than an error.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        path = os.path.join(tmp_dir, "path_rules.json")
+        with open(path, "w") as f:
+            f.write("{not json")
+
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(load_path_rules(path), {})
+        self.assertEqual(load_path_rules(os.path.join(tmp_dir, "missing.json")), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
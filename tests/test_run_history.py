@@ -0,0 +1,67 @@
+import unittest
+import os
+import shutil
+import tempfile
+from src.run_history import TestHistory, DURATION_WEIGHT
+
+repo_url = "https://example.com/repo.git"
+
+
+class TestRunHistory(unittest.TestCase):
+    def setUp(self):
+        """
+        Set up a fresh history database for each test.
+        """
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, "test_history.db")
+
+    def tearDown(self):
+        """
+        Clean up after each test.
+        """
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_history_survives_restart(self):
+        """
+        Test that recorded results are found by a new history on the same database.
+        """
+        TestHistory(self.db_path).record(repo_url, [
+            {"nodeid": "tests/test_a.py::test_ok", "outcome": "passed", "duration": 0.5},
+            {"nodeid": "tests/test_a.py::test_bad", "outcome": "failed", "duration": 2.0},
+        ])
+
+        history = TestHistory(self.db_path).lookup(repo_url)
+
+        self.assertEqual(history["tests/test_a.py::test_ok"], {"duration": 0.5, "failed": False})
+        self.assertEqual(history["tests/test_a.py::test_bad"], {"duration": 2.0, "failed": True})
+        self.assertEqual(TestHistory(self.db_path).lookup("https://example.com/other.git"), {})
+
+    def test_duration_is_moving_average_and_outcome_is_latest(self):
+        """
+        Test that durations are averaged over runs and only the latest outcome is kept.
+        """
+        history = TestHistory(self.db_path)
+        history.record(repo_url, [{"nodeid": "t::x", "outcome": "failed", "duration": 1.0}])
+        history.record(repo_url, [{"nodeid": "t::x", "outcome": "passed", "duration": 3.0}])
+
+        entry = history.lookup(repo_url)["t::x"]
+
+        self.assertAlmostEqual(entry["duration"], 1.0 * (1 - DURATION_WEIGHT) + 3.0 * DURATION_WEIGHT)
+        self.assertFalse(entry["failed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+    def test_flake_rate_counts_runs_that_passed_on_retry(self):
+        """
+        Test that the flake rate of a test is its share of flaky runs, and that a flaky run is not a failure.
+        """
+        history = TestHistory(self.db_path)
+        history.record(repo_url, [{"nodeid": "t::x", "outcome": "passed", "duration": 1.0},
+                                  {"nodeid": "t::y", "outcome": "passed", "duration": 1.0}])
+        history.record(repo_url, [{"nodeid": "t::x", "outcome": "flaky", "duration": 1.0},
+                                  {"nodeid": "t::y", "outcome": "passed", "duration": 1.0}])
+
+        self.assertEqual(history.flake_rates(repo_url), {"t::x": 0.5})
+        self.assertFalse(history.lookup(repo_url)["t::x"]["failed"])
@@ -1,6 +1,15 @@
 import os
 import sys
+import shutil
+import tempfile
 import unittest
+from unittest.mock import patch
+from src import server
+from src.build_index import BuildIndex
+from src.build_queue import BuildQueue
+from src.ci_pipeline import CIPipeline
+from src.logger import BuildLogger, LogWriter
+from src.notifications import NotificationDispatcher
 from src.server import app
 
 class ServerConnectionTest(unittest.TestCase):
@@ -12,11 +21,36 @@ class ServerConnectionTest(unittest.TestCase):
 
     def setUp(self):
         """
-        Configure the Flask test client before each test.
+        Configure the Flask test client before each test. The server's queue, outbox, logs and
+        workspaces live in a temporary directory, so the tests never touch the real ci_data.
         """
+        self.test_dir = tempfile.mkdtemp()
+        self.writer = LogWriter(flush_interval=60, index=BuildIndex(os.path.join(self.test_dir, "build_index.db")))
+        pipeline = CIPipeline(mirror_dir=os.path.join(self.test_dir, "mirrors"),
+                              syntax_cache_db=os.path.join(self.test_dir, "syntax_cache.db"),
+                              test_history_db=os.path.join(self.test_dir, "test_history.db"),
+                              env_cache_dir=os.path.join(self.test_dir, "envs"),
+                              logger=BuildLogger(os.path.join(self.test_dir, "logs"), writer=self.writer))
+        services = {
+            "ci_server": server.CIServer(os.path.join(self.test_dir, "workspaces"), pipeline=pipeline),
+            "notifier": NotificationDispatcher(db_path=os.path.join(self.test_dir, "outbox.db")),
+            "build_queue": BuildQueue(server.run_ci, db_path=os.path.join(self.test_dir, "build_queue.db"))
+        }
+        for name, service in services.items():
+            patcher = patch.object(server, name, service)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
         self.client = app.test_client()
         self.client.testing = True
 
+    def tearDown(self):
+        """
+        Stop the log writer and clean up after each test.
+        """
+        self.writer.close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
     def test_root_endpoint_status_code(self):
         """
         Verify that GET / returns HTTP 200 OK.
@@ -39,6 +73,52 @@ class ServerConnectionTest(unittest.TestCase):
         self.assertEqual(data.get("message"), expected_message, 
                          msg=f"Expected JSON 'message' to be {expected_message}")
 
+    def test_queue_endpoint(self):
+        """
+        Check that GET /queue reports the depth of the build queue.
+        """
+        response = self.client.get("/queue")
+        self.assertEqual(response.status_code, 200)
+
+        data = response.get_json()
+        self.assertIn("queued", data)
+        self.assertIn("avg_wait_seconds", data)
+
+    def test_build_of_repo_without_tests_succeeds(self):
+        """
+        Check that a build of a repository without a tests directory succeeds.
+        """
+        def checkout(repo_url, repo_dir, *args, **kwargs):
+            os.makedirs(repo_dir, exist_ok=True)
+            with open(os.path.join(repo_dir, "main.py"), "w") as f:
+                f.write("print('hello')\n")
+            return True
+
+        with patch.object(server.ci_server.pipeline, "checkout_from_mirror", side_effect=checkout):
+            build_id, status, output = server.ci_server.process_build(
+                "https://example.com/repo.git", "main", "abc123", "dev@example.com", "dev")
+
+        self.assertEqual(status, "succeeded")
+        self.assertEqual(output, "No tests directory found.")
+
+    def test_logs_endpoint_unknown_build(self):
+        """
+        Check that GET /logs/<build_id> answers 404 for a build without logs.
+        """
+        response = self.client.get("/logs/no-such-build")
+        self.assertEqual(response.status_code, 404)
+
+    def test_search_endpoint(self):
+        """
+        Check that GET /search needs search text and answers with a list of results.
+        """
+        self.assertEqual(self.client.get("/search").status_code, 400)
+        self.assertEqual(self.client.get("/search?q=x&since=last-tuesday").status_code, 400)
+
+        response = self.client.get("/search?q=no-such-error-anywhere&status=failure&since=2026-01-01")
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.get_json()["results"], list)
+
     def test_webhook_post_correct(self):
         """
         Test that a correct POST request with JSON data to /webhook
@@ -71,6 +151,28 @@ class ServerConnectionTest(unittest.TestCase):
             200,
             msg="Expected 200 when POSTing valid JSON, but got {}".format(response.status_code)
         )
+        self.assertEqual(server.build_queue.stats()["queued"], 1)
+
+    def test_webhook_skips_docs_only_push(self):
+        """
+        Test that a push changing only documentation is acknowledged without queueing a build.
+        """
+        test_payload = {
+            "ref": "refs/heads/main",
+            "repository": {"clone_url": "https://github.com/my_username/test_webhook.git"},
+            "head_commit": {
+                "id": "2f1d5a9c0e4b7a8d3c6f1e2b5a4d7c8e9f0a1b2c",
+                "message": "Fix typo in README",
+                "url": "https://github.com/my_username/test_webhook/commit/2f1d5a9c0e4b7a8d3c6f1e2b5a4d7c8e9f0a1b2c",
+                "author": {"name": "Firstname Lastname", "email": "dev@example.com", "username": "my_username"}
+            },
+            "commits": [{"added": [], "modified": ["README.md", "docs/setup.md"], "removed": []}]
+        }
+
+        response = self.client.post("/webhook", json=test_payload, content_type="application/json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("queue_id", response.get_json())
 
     def test_webhook_post_no_data(self):
         """
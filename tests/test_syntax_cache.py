@@ -0,0 +1,56 @@
+import unittest
+import os
+import shutil
+import tempfile
+from src.syntax_cache import SyntaxCache, blob_sha
+
+
+class TestSyntaxCache(unittest.TestCase):
+    def setUp(self):
+        """
+        Set up a fresh cache database for each test.
+        """
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, "syntax_cache.db")
+
+    def tearDown(self):
+        """
+        Clean up after each test.
+        """
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_blob_sha_matches_git(self):
+        """
+        Test that the content hash is the SHA git gives the same blob.
+        """
+        # git hash-object of "hello\n"
+        self.assertEqual(blob_sha(b"hello\n"), "ce013625030ba8dba906f756967f9e9ca394464a")
+
+    def test_results_survive_restart(self):
+        """
+        Test that stored results are found by a new cache on the same database.
+        """
+        first = SyntaxCache(self.db_path)
+        first.put_many({"aaa": (None, None), "bbb": ("invalid syntax", 3)})
+
+        second = SyntaxCache(self.db_path)
+        results = second.get_many(["aaa", "bbb", "ccc"])
+
+        self.assertEqual(results, {"aaa": (None, None), "bbb": ("invalid syntax", 3)})
+
+    def test_least_recently_used_results_are_evicted(self):
+        """
+        Test that the cache keeps at most max_entries results, dropping the least recently used.
+        """
+        cache = SyntaxCache(self.db_path, max_entries=2)
+        cache.put_many({"old": (None, None)})
+        cache.put_many({"used": (None, None)})
+        cache.get_many(["used"])
+        cache.put_many({"new": (None, None)})
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(set(cache.get_many(["old", "used", "new"])), {"used", "new"})
+
+
+if __name__ == "__main__":
+    unittest.main()
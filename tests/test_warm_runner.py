@@ -0,0 +1,58 @@
+import unittest
+import os
+import shutil
+import tempfile
+from src.warm_runner import WarmRunner
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "The warm runner needs os.fork")
+class TestWarmRunner(unittest.TestCase):
+    def setUp(self):
+        """
+        Set up a directory with a small test suite and a warm runner.
+        """
+        self.test_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.test_dir, "test_sample.py"), "w") as f:
+            f.write("import os\n\ndef test_env():\n    assert os.environ['SAMPLE'] == 'yes'\n")
+        self.output_path = os.path.join(self.test_dir, "output.log")
+        self.runner = WarmRunner(preload=["json"])
+
+    def tearDown(self):
+        """
+        Stop the warm runner and clean up after each test.
+        """
+        self.runner.stop()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_runs_are_forked_with_their_own_environment(self):
+        """
+        Test that each run gets the environment it was started with and reports its exit code.
+        """
+        env = dict(os.environ, SAMPLE="yes")
+        passing = self.runner.run(["-q", self.test_dir], env, self.test_dir, self.output_path)
+        self.assertEqual(passing.wait(timeout=60), 0)
+
+        env["SAMPLE"] = "no"
+        failing = self.runner.run(["-q", self.test_dir], env, self.test_dir, self.output_path)
+        self.assertEqual(failing.wait(timeout=60), 1)
+
+        with open(self.output_path) as f:
+            output = f.read()
+        self.assertIn("1 passed", output)
+        self.assertIn("1 failed", output)
+
+    def test_run_can_be_killed(self):
+        """
+        Test that a hanging run is killed.
+        """
+        with open(os.path.join(self.test_dir, "test_sample.py"), "w") as f:
+            f.write("import time\n\ndef test_hang():\n    time.sleep(60)\n")
+
+        run = self.runner.run(["-q", self.test_dir], dict(os.environ), self.test_dir, self.output_path)
+        run.kill()
+
+        self.assertNotEqual(run.wait(timeout=10), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from src.workspace_gc import WorkspaceCollector
+
+
+class TestWorkspaceCollector(unittest.TestCase):
+    def setUp(self):
+        """
+        Set up an empty workspace directory for each test.
+        """
+        self.base_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """
+        Clean up after each test.
+        """
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def _workspace(self, name, size=1000):
+        path = os.path.join(self.base_dir, name)
+        os.makedirs(path)
+        with open(os.path.join(path, "file.bin"), "wb") as f:
+            f.write(b"x" * size)
+        return path
+
+    def test_released_workspace_is_moved_away_and_deleted_in_background(self):
+        """
+        Test that release moves the workspace out at once and the collector thread reclaims it.
+        """
+        collector = WorkspaceCollector(self.base_dir, interval=60)
+        self.addCleanup(collector.stop, 5)
+        path = os.path.join(self.base_dir, "build-1")
+        collector.acquire(path)
+        self._workspace("build-1")
+        collector.start()
+
+        collector.release(path)
+        self.assertFalse(os.path.exists(path))
+
+        deadline = time.monotonic() + 10
+        while collector.stats()["reclaimed_bytes"] < 1000 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(collector.stats()["reclaimed_workspaces"], 1)
+        self.assertEqual(os.listdir(collector.trash_dir), [])
+
+    def test_sweep_reclaims_orphans_and_keeps_held_workspaces(self):
+        """
+        Test that a sweep deletes workspaces left over from a crash and keeps those of running builds.
+        """
+        self._workspace("crashed-build", size=500)
+        running = self._workspace("running-build", size=2000)
+        collector = WorkspaceCollector(self.base_dir, quota_bytes=1000)
+        collector.acquire(running)
+
+        with self.assertLogs(level="WARNING"):
+            collector.sweep()
+
+        self.assertEqual(sorted(os.listdir(self.base_dir)), [".trash", "running-build", "running-build.owner"])
+        stats = collector.stats()
+        self.assertEqual((stats["reclaimed_workspaces"], stats["reclaimed_bytes"]), (1, 500))
+        self.assertEqual((stats["active_workspaces"], stats["usage_bytes"]), (1, 2000))
+
+    def test_sweep_evicts_oldest_retained_workspaces_above_quota(self):
+        """
+        Test that retained workspaces survive a sweep until the quota is exceeded, least recently retained first.
+        """
+        older = self._workspace("older", size=1000)
+        newer = self._workspace("newer", size=1000)
+        collector = WorkspaceCollector(self.base_dir, quota_bytes=1500)
+        collector.retain(older)
+        time.sleep(0.01)
+        collector.retain(newer)
+
+        collector.sweep()
+
+        self.assertEqual(sorted(os.listdir(self.base_dir)), [".trash", "newer", "newer.owner"])
+        self.assertFalse(collector.claim(older))
+        self.assertTrue(collector.claim(newer))
+        self.assertEqual(collector.stats()["active_workspaces"], 1)
+
+    def test_sweep_leaves_workspaces_of_other_live_processes(self):
+        """
+        Test that a sweep keeps workspaces whose owner file names another live process,
+        and reclaims those of processes that have exited.
+        """
+        parent = self._workspace("other-server-build")
+        with open(parent + ".owner", "w") as f:
+            f.write(str(os.getppid()))
+        dead = self._workspace("crashed-server-build")
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        with open(dead + ".owner", "w") as f:
+            f.write(str(exited.pid))
+
+        WorkspaceCollector(self.base_dir).sweep()
+
+        self.assertEqual(sorted(os.listdir(self.base_dir)), [".trash", "other-server-build", "other-server-build.owner"])
+
+    def test_held_workspaces_are_recorded_on_disk(self):
+        """
+        Test that acquiring a workspace writes its owner file and releasing it removes the file.
+        """
+        collector = WorkspaceCollector(self.base_dir)
+        path = os.path.join(self.base_dir, "build-1")
+        collector.acquire(path)
+        with open(path + ".owner") as f:
+            self.assertEqual(f.read(), str(os.getpid()))
+
+        collector.release(path)
+        self.assertFalse(os.path.exists(path + ".owner"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from src.workspace_gc import WorkspaceCollector
+from src.workspace_pool import WorkspacePool
+
+repo_url = "https://github.com/willeStjerna/Group4_2"
+
+
+class TestWorkspacePool(unittest.TestCase):
+    def setUp(self):
+        """
+        Set up a collector and a pool keeping one workspace per branch for each test.
+        """
+        self.base_dir = tempfile.mkdtemp()
+        self.collector = WorkspaceCollector(self.base_dir)
+        self.pool = WorkspacePool(self.base_dir, self.collector, size=1)
+
+    def tearDown(self):
+        """
+        Clean up after each test.
+        """
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def _checkout(self, path):
+        os.makedirs(os.path.join(path, ".git"))
+
+    def test_workspace_is_reused_for_same_branch(self):
+        """
+        Test that a returned checkout is leased again for the same branch only.
+        """
+        path, reused = self.pool.lease(repo_url, "main")
+        self.assertFalse(reused)
+        self._checkout(path)
+        self.pool.give_back(repo_url, "main", path)
+
+        other, reused = self.pool.lease(repo_url, "feature")
+        self.assertNotEqual(other, path)
+        self.assertFalse(reused)
+
+        self.assertEqual(self.pool.lease(repo_url, "main"), (path, True))
+        self.assertEqual(self.collector.stats()["active_workspaces"], 2)
+
+    def test_workspace_without_checkout_or_beyond_size_is_released(self):
+        """
+        Test that failed checkouts and workspaces beyond the pool size are handed to the collector for deletion.
+        """
+        first, _ = self.pool.lease(repo_url, "main")
+        second, _ = self.pool.lease(repo_url, "main")
+        failed, _ = self.pool.lease(repo_url, "main")
+        self._checkout(first)
+        self._checkout(second)
+        os.makedirs(failed)
+
+        for path in (first, second, failed):
+            self.pool.give_back(repo_url, "main", path)
+
+        self.assertTrue(os.path.exists(first))
+        self.assertFalse(os.path.exists(second))
+        self.assertFalse(os.path.exists(failed))
+        self.assertEqual(self.pool.stats()["idle_workspaces"], 1)
+
+    def test_concurrent_leases_get_distinct_workspaces(self):
+        """
+        Test that builds leasing at the same time never share a workspace.
+        """
+        path, _ = self.pool.lease(repo_url, "main")
+        self._checkout(path)
+        self.pool.give_back(repo_url, "main", path)
+
+        leased = []
+        barrier = threading.Barrier(8)
+
+        def lease():
+            barrier.wait()
+            leased.append(self.pool.lease(repo_url, "main"))
+
+        threads = [threading.Thread(target=lease) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        paths = [path for path, _ in leased]
+        self.assertEqual(len(set(paths)), 8)
+        self.assertEqual(sum(reused for _, reused in leased), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()